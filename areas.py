@@ -0,0 +1,38 @@
+"""بيانات المناطق والمدن المرجعية المشتركة بين التطبيق وأدوات البيانات"""
+
+# ---------- المناطق الافتراضية ----------
+# تضاف إلى جدول areas عند إنشائه (أو عند إضافة المدن الافتراضية)، وبعدها تدار من قاعدة البيانات
+DEFAULT_AREAS = {
+    "دمشق": [
+        "المزة", "كفرسوسة", "الميدان", "القدم", "القصاع", "المالكي", "أبو رمانة",
+        "البرامكة", "ركن الدين", "الصالحية", "الشعلان", "المهاجرين", "العدوي",
+        "القنوات", "باب توما", "باب شرقي", "ساروجة", "العفيف", "الجسر الأبيض",
+        "الزاهرة", "الرحمانية", "دمر", "السبينة", "جوبر", "حرستا", "دوما",
+        "داريا", "معضمية الشام", "صحنايا", "الكسوة", "التضامن", "الهامة",
+        "قدسيا", "يملك", "القابون", "برزة", "القطيفة", "الخضيري",
+        "الزبداني", "بلد", "جرمانا", "سقبا", "معربا", "عربين", "حزة", "ببيلا",
+    ],
+}
+
+# المناطق المفعلة: المدينة التي فيها مناطق مفعلة تقبل الإعلانات في هذه المناطق فقط
+DEFAULT_ACTIVE_AREAS = {
+    "دمشق": ["المزة", "كفرسوسة", "الميدان"],
+}
+
+# ---------- مراكز المدن الافتراضية (تقريبية) ----------
+CITY_CENTERS = {
+    "دمشق": (33.5138, 36.2765),
+    "حلب": (36.2021, 37.1343),
+    "حمص": (34.7324, 36.7137),
+    "حماة": (35.1318, 36.7578),
+    "اللاذقية": (35.5317, 35.7901),
+    "طرطوس": (34.8890, 35.8866),
+    "دير الزور": (35.3359, 40.1408),
+    "الرقة": (35.9594, 39.0079),
+    "الحسكة": (36.5024, 40.7477),
+    "ريف دمشق": (33.5700, 36.4000),
+    "درعا": (32.6189, 36.1021),
+    "القنيطرة": (33.1260, 35.8245),
+    "سويدا": (32.7094, 36.5695),
+    "إدلب": (35.9306, 36.6339),
+}
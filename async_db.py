@@ -0,0 +1,77 @@
+"""واجهة غير متزامنة لـ db.py لمعالجات أحداث Flet
+
+كل دالة عامة في db.py لها هنا نسخة awaitable بنفس الاسم والمعاملات، تنفذ على مجمع
+خيوط محدود بدلاً من حلقة الأحداث، فلا يتجمد عرض الجلسة أثناء استعلام بطيء:
+
+    props, cursor = await async_db.get_properties_page_by_area(area_id)
+
+يحدد عدد الخيوط بـ CITY_MOVER_DB_WORKERS (الافتراضي 4). كل خيط يحجز اتصاله الخاص من
+مجمع الاتصالات، لذلك لا تتجاوز الاتصالات المفتوحة عدد الخيوط.
+
+التعديلات (add_property وغيرها) تنتظر خيط الكاتب في db من أحد هذه الخيوط؛ write(job)
+تنتظره مباشرة من حلقة الأحداث دون حجز خيط.
+"""
+import asyncio
+import functools
+import inspect
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+DB_WORKERS = int(os.environ.get("CITY_MOVER_DB_WORKERS", 4))
+
+# الاتصال المعاد من get_connection مرتبط بالخيط الذي حجزه، والمولد يقرأ بشكل كسول؛
+# هذه تستخدم مباشرة من db داخل run()
+SYNC_ONLY = {"get_connection", "connection", "iter_properties_for_export", "register_functions"}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """مجمع الخيوط المشترك بين كل جلسات العملية (ينشأ عند أول استخدام)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+    return _executor
+
+
+def shutdown(wait: bool = True):
+    """إيقاف مجمع الخيوط؛ الاستدعاء التالي ينشئ مجمعاً جديداً"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+async def run(fn, *args, **kwargs):
+    """تنفيذ أي دالة متزامنة (مثلاً عدة استدعاءات db معاً) على مجمع الخيوط"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def _make_async(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run(fn, *args, **kwargs)
+    return wrapper
+
+
+__all__ = ["DB_WORKERS", "get_executor", "shutdown", "run"]
+
+for _name, _fn in inspect.getmembers(db, inspect.isfunction):
+    if _name.startswith("_") or _name in SYNC_ONLY or _fn.__module__ != db.__name__:
+        continue
+    globals()[_name] = _make_async(_fn)
+    __all__.append(_name)
+
+
+# تستبدل النسخة المولدة أعلاه (التي كانت ستحجز خيطاً لتعيد Future فقط)
+async def write(job, *args, **kwargs):
+    """db.write دون حجز خيط من المجمع أثناء انتظار الكاتب"""
+    return await asyncio.wrap_future(db.write(job, *args, **kwargs))
@@ -0,0 +1,1800 @@
+"""قياس أداء طبقة قاعدة البيانات
+
+التشغيل:
+    python bench.py pool [--seconds 2]
+    python bench.py plans
+    python bench.py owner-refresh [--listings 300]
+    python bench.py owner-updates [--listings 300]
+    python bench.py city-cache [--browses 1000]
+    python bench.py pagination [--sizes 100 1000 10000 100000]
+    python bench.py search [--listings 100000] [--repeat 50] [--max-p95-ms 10]
+    python bench.py spatial [--sizes 1000 10000 100000 1000000]
+    python bench.py bulk [--rows 50000]
+    python bench.py suite [--scales 1000 10000 100000] [--output results.json]
+    python bench.py compare old.json new.json [--threshold 0.2]   (suite أو views)
+    python bench.py ui-latency [--listings 100000] [--seconds 3] [--slow-tasks 4]
+    python bench.py scheduler [--listings 100000] [--changes 20] [--interval-ms 40]
+    python bench.py area-stats [--sizes 10000 100000] [--writes 2000]
+    python bench.py tiles [--views 300] [--cache-mb 64 1] [--upstream-ms 20]
+    python bench.py cluster [--sizes 10000 100000]
+    python bench.py list-render [--sizes 50 500 5000]
+    python bench.py startup [--runs 3] [--sessions 5]
+    python bench.py views [--scales 1000 10000] [--repeat 5] [--output views.json]
+    python bench.py writes [--writers 8 32 64] [--seconds 3]
+    python bench.py stats-access
+
+يعمل كل قياس على قاعدة بيانات مؤقتة (عبر CITY_MOVER_DB) حتى لا يلمس city_app.db
+"""
+import argparse
+import ast
+import asyncio
+import contextlib
+import datetime
+import inspect
+import json
+import math
+import os
+import platform
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def use_temp_db(directory: str):
+    """توجيه db.py إلى ملف قاعدة بيانات مؤقت وإعادة تهيئته"""
+    path = str(Path(directory) / "bench_city_app.db")
+    os.environ["CITY_MOVER_DB"] = path
+
+    import db
+    db.close_pool()
+    db.init_db()
+    return db
+
+
+@contextmanager
+def count_statements(db):
+    """تسجيل كل عبارة SQL تنفذ على اتصال الخيط الحالي داخل الكتلة"""
+    statements = []
+    with db.connection() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            yield statements
+        finally:
+            conn.set_trace_callback(None)
+
+
+def seed_properties(db, owner_id: int, count: int, city_id=None, area="المزة"):
+    """إدخال عدد كبير من العقارات دفعة واحدة"""
+    db.add_properties_bulk([
+        (owner_id, city_id or 1 + i % 14, area, f"عقار {i}", None, 1000 + i, None, None, None)
+        for i in range(count)
+    ])
+
+
+def area_id_of(db, city_id: int, name: str):
+    """معرف منطقة حسب اسمها في مدينة"""
+    return next(f["area_id"] for f in db.get_area_facets(city_id) if f["area"] == name)
+
+
+def best_of(fn, repeat: int = 5):
+    """أفضل زمن تنفيذ (بالميلي ثانية) من عدة محاولات"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def rate(fn, seconds: float):
+    """عدد الاستدعاءات في الثانية خلال المدة المحددة"""
+    calls = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        fn()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def bench_pool(args):
+    """اتصال جديد لكل استعلام (السلوك القديم) مقابل مجمع الاتصالات"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = use_temp_db(tmp)
+        path = db.get_pool().db_path
+
+        def legacy_get_cities():
+            # نفس ما كان يفعله get_connection القديم: تحديد المسار + فتح + إغلاق
+            db_path = os.environ.get("CITY_MOVER_DB") or path
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            conn = sqlite3.connect(db_path)
+            conn.row_factory = sqlite3.Row
+            cur = conn.cursor()
+            cur.execute("SELECT id, name FROM cities ORDER BY name")
+            cities = [{"id": r[0], "name": r[1]} for r in cur.fetchall()]
+            conn.close()
+            return cities
+
+        def pooled_get_cities():
+            with db.connection() as conn:
+                cur = conn.execute("SELECT id, name FROM cities ORDER BY name")
+                return [{"id": r[0], "name": r[1]} for r in cur.fetchall()]
+
+        before = rate(legacy_get_cities, args.seconds)
+        after = rate(pooled_get_cities, args.seconds)
+        db.close_pool()
+
+    print(f"connect-per-call : {before:10.0f} queries/sec")
+    print(f"pooled           : {after:10.0f} queries/sec")
+    print(f"speedup          : {after / before:10.1f}x")
+
+
+SOURCE_FILES = ["db.py", "main.py"]
+SQL_START = re.compile(r"^\s*(/\*.*?\*/\s*)?(SELECT|UPDATE|DELETE)\b", re.IGNORECASE)
+# أجسام triggers تشير إلى new/old ولا تنفذ كاستعلامات مستقلة
+TRIGGER_REF = re.compile(r"\b(new|old)\.\w+")
+
+# استعلامات تبنى ديناميكياً (f-string) ولا يمكن استخراجها من الشيفرة مباشرة
+DYNAMIC_QUERIES = [
+    ("db.update_property", "UPDATE properties SET rent=? WHERE id=? AND owner_id=?"),
+    ("db._search_rows", "SELECT p.id, p.title, a.name AS area, p.description, p.rent, p.lat, p.lon, p.services, "
+                        "u.username as owner_username FROM properties p JOIN users u ON p.owner_id = u.id "
+                        "LEFT JOIN areas a ON a.id = p.area_id WHERE p.id IN (?, ?, ?)"),
+]
+
+
+# مسح مقصود: البدائل عند عدم توفر FTS5 و R*Tree، التصدير الكامل، إعادة حساب مراكز كل المناطق،
+# إعادة بناء area_stats وفحصها، وفحص جدول النظام sqlite_master؛ وعبارات الترحيلات تشير إلى
+# أعمدة المخطط القديم
+PLAN_EXEMPT = ("LIKE ?", "p.lat BETWEEN ?", "export: full scan", "centroids: every area", "area stats: full",
+               "sqlite_master", "migration:")
+
+
+def _concat_parts(node):
+    """أجزاء سلسلة مبنية بـ + (المتغيرات مثل شروط التصفية الاختيارية تعامل كنص فارغ)"""
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        return _concat_parts(node.left) + _concat_parts(node.right)
+    return [node]
+
+
+def collect_queries():
+    """استخراج كل استعلامات القراءة والتعديل الثابتة من db.py و main.py"""
+    queries = []
+    root = Path(__file__).parent
+    for name in SOURCE_FILES:
+        tree = ast.parse((root / name).read_text(encoding="utf-8"))
+        # أجزاء الـ f-string ليست استعلامات كاملة، وأجزاء السلاسل المجمعة تفحص معاً
+        fragments = {
+            id(part)
+            for node in ast.walk(tree) if isinstance(node, ast.JoinedStr)
+            for part in node.values
+        }
+        candidates = []
+        for node in ast.walk(tree):
+            if id(node) in fragments:
+                continue
+            if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+                parts = _concat_parts(node)
+                fragments.update(id(p) for p in parts)
+                fragments.update(id(n) for n in ast.walk(node) if n is not node)
+                texts = [p.value if isinstance(p, ast.Constant) else "" for p in parts]
+                if all(isinstance(t, str) for t in texts):
+                    candidates.append((node.lineno, "".join(texts)))
+            elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+                candidates.append((node.lineno, node.value))
+        for lineno, text in candidates:
+            # كلمة مفردة ("UPDATE" كنوع حدث trigger مثلاً) ليست استعلاماً
+            if len(text.split()) < 2:
+                continue
+            if SQL_START.match(text) and not TRIGGER_REF.search(text):
+                queries.append((f"{name}:{lineno}", " ".join(text.split())))
+    return queries + DYNAMIC_QUERIES
+
+
+def plan_problems(conn, sql):
+    """تفاصيل خطة التنفيذ التي لا تستخدم فهرساً (مسح كامل أو ترتيب مؤقت)"""
+    problems = []
+    params = (None,) * sql.count("?")
+    plan = [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    # الاستعلامات الفرعية المحسوبة مسبقاً محدودة الحجم (LIMIT) وخطتها الداخلية مفحوصة أيضاً
+    subqueries = {d.split()[1] for d in plan if d.startswith(("MATERIALIZE", "CO-ROUTINE"))}
+    for detail in plan:
+        # SCAN CONSTANT ROW: SELECT بدون جدول (نتيجته من استعلامات فرعية مفحوصة بدورها)
+        if (detail.startswith("SCAN") and "USING" not in detail and "VIRTUAL TABLE" not in detail
+                and detail != "SCAN CONSTANT ROW"):
+            if detail.split()[1] not in subqueries:
+                problems.append(detail)
+        if "TEMP B-TREE" in detail and not subqueries:
+            problems.append(detail)
+    return problems
+
+
+def check_plans(args):
+    """التأكد من أن كل استعلام في db.py و main.py يستخدم فهرساً"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = use_temp_db(tmp)
+        failures = 0
+        with db.connection() as conn:
+            for location, sql in collect_queries():
+                if any(marker in sql for marker in PLAN_EXEMPT):
+                    continue
+                problems = plan_problems(conn, sql)
+                status = "FAIL" if problems else "ok"
+                print(f"{status:4}  {location:18} {sql[:70]}")
+                for detail in problems:
+                    print(f"        -> {detail}")
+                failures += bool(problems)
+        db.close_pool()
+
+    if failures:
+        print(f"❌ {failures} queries without an index")
+        sys.exit(1)
+    print("✅ All queries use an index")
+
+
+def check_owner_refresh(args):
+    """عدد العبارات المنفذة عند تحديث لوحة المالك (يجب أن يكون ثابتاً = 1)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = use_temp_db(tmp)
+        owner = db.get_user_by_credentials("owner1", "123456")
+        seed_properties(db, owner["id"], args.listings)
+
+        # نفس استدعاءات load_owner_properties في main.py
+        with count_statements(db) as statements:
+            props, _ = db.get_properties_page_by_owner(owner["id"])
+            city_names = [p["city_name"] for p in props]
+        db.close_pool()
+
+    print(f"listings: {len(props)}  cities resolved: {sum(1 for c in city_names if c)}")
+    print(f"statements per refresh: {len(statements)}")
+    if len(statements) != 1:
+        print("❌ Owner refresh should run exactly one statement")
+        sys.exit(1)
+    print("✅ Owner refresh runs a single statement")
+
+
+def check_owner_updates(args):
+    """البطاقات المبنية والعناصر المرسلة لكل إضافة وتعديل وحذف في لوحة المالك (بطاقة واحدة على الأكثر)"""
+    import cards
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = use_temp_db(tmp)
+        owner = db.get_user_by_credentials("owner1", "123456")
+        seed_properties(db, owner["id"], args.listings)
+        owned = cards.KeyedCardList(cards.OwnerCardTemplate(lambda e: None, lambda e: None).build)
+
+        start = time.perf_counter()
+        owned.set_items(db.get_properties_by_owner(owner["id"]))
+        full_controls, full_bytes = _control_payload(owned.view)
+        full_ms = (time.perf_counter() - start) * 1000
+        print(f"full rebuild: {owned.built} cards, {full_controls} controls, "
+              f"{full_bytes / 1024:.1f} KB, {full_ms:.1f} ms")
+
+        # لوحة المالك في main.py تبني الصفحة الأولى فقط، والمزيد عند الطلب
+        paged = cards.KeyedCardList(cards.OwnerCardTemplate(lambda e: None, lambda e: None).build)
+        start = time.perf_counter()
+        first_page, cursor = db.get_properties_page_by_owner(owner["id"])
+        paged.set_items(first_page)
+        page_controls, page_bytes = _control_payload(paged.view)
+        page_ms = (time.perf_counter() - start) * 1000
+        print(f"first page:   {paged.built} cards, {page_controls} controls, "
+              f"{page_bytes / 1024:.1f} KB, {page_ms:.1f} ms")
+        before_built = paged.built
+        paged.append_items(db.get_properties_page_by_owner(owner["id"], before_id=cursor)[0])
+        print(f"next page:    {paged.built - before_built} cards built")
+
+        # نفس تسلسل refresh_owner_card في main.py بعد كل عملية
+        def refresh(property_id):
+            p = db.get_owner_property(property_id, owner["id"])
+            if p is None:
+                owned.remove(property_id)
+            else:
+                owned.upsert(p)
+
+        added_id = None
+
+        def add():
+            nonlocal added_id
+            added_id = db.add_property(owner["id"], 1, "المزة", "عقار جديد", "", 1_500_000, None, None, "")
+            refresh(added_id)
+
+        def edit():
+            db.update_property(added_id, owner["id"], title="عقار معدل", rent=1_750_000)
+            refresh(added_id)
+
+        def delete():
+            db.delete_property(added_id, owner["id"])
+            refresh(added_id)
+
+        failures = []
+        print(f"{'operation':>10} {'cards built':>12} {'controls sent':>14} {'KB':>7} {'ms':>7}")
+        for name, operation, expected in (("add", add, 1), ("edit", edit, 1), ("delete", delete, 0)):
+            before_built = owned.built
+            previous = {id(c) for c in owned.view.controls}
+            start = time.perf_counter()
+            operation()
+            # ما يرسله update() للعمود: البطاقات الجديدة فقط (الباقية نفس الكائنات)
+            sent = [_control_payload(c) for c in owned.view.controls if id(c) not in previous]
+            ms = (time.perf_counter() - start) * 1000
+            built = owned.built - before_built
+            controls = sum(n for n, _ in sent)
+            print(f"{name:>10} {built:>12} {controls:>14} {sum(b for _, b in sent) / 1024:>7.1f} {ms:>7.2f}")
+            if built != expected or len(sent) != expected:
+                failures.append(f"{name} rebuilt {built} cards and sent {len(sent)} (expected {expected})")
+        db.close_pool()
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Each owner change rebuilds at most one card")
+
+
+def check_city_cache(args):
+    """التصفح المستقر (تغيير المسار والقوائم) يجب ألا يلمس SQLite لبيانات المدن"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = use_temp_db(tmp)
+        db.get_cities()  # تسخين الذاكرة
+
+        with count_statements(db) as statements:
+            for i in range(args.browses):
+                cities = db.get_cities()
+                db.get_city_by_id(cities[i % len(cities)]["id"])
+        stats = db.city_cache_stats()
+        db.close_pool()
+
+    print(f"browses: {args.browses}  statements: {len(statements)}  cache: {stats}")
+    if statements:
+        print("❌ Steady-state browsing queried the cities table")
+        sys.exit(1)
+    print("✅ Cities served from cache")
+
+
+def bench_pagination(args):
+    """زمن أول صفحة (ترقيم بالمؤشر) مقابل جلب كل العقارات في منطقة مكتظة"""
+    print(f"{'listings':>10} {'full fetch ms':>14} {'first page ms':>14} {'next page ms':>13}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = use_temp_db(tmp)
+            owner = db.get_user_by_credentials("owner1", "123456")
+            seed_properties(db, owner["id"], size, city_id=1)
+            area_id = area_id_of(db, 1, "المزة")
+            _, cursor = db.get_properties_page_by_area(area_id)
+
+            full = best_of(lambda: db.get_properties_by_area(area_id), repeat=3)
+            first = best_of(lambda: db.get_properties_page_by_area(area_id))
+            following = best_of(lambda: db.get_properties_page_by_area(area_id, before_id=cursor))
+            db.close_pool()
+        print(f"{size:>10} {full:>14.2f} {first:>14.2f} {following:>13.2f}")
+
+
+SEARCH_WORDS = [
+    "شقة", "منزل", "بيت", "مفروشة", "طابق", "إطلالة", "هادئة", "واسعة", "مطبخ", "حديقة",
+    "شرفة", "مصعد", "تدفئة", "مدرسة", "مشفى", "جامع", "فرن", "سوبرماركت", "مواصلات", "جامعة",
+    "صيدلية", "حديقة", "موقف", "سيارات", "غرفتين", "ثلاث", "غرف", "حمامين", "جديدة", "مكسوة",
+]
+
+
+def bench_search(args):
+    """زمن البحث النصي FTS5 مقابل مسح LIKE على عدد كبير من الإعلانات؛ يفشل إذا تجاوز p95 الحد"""
+    rng = random.Random(42)
+
+    def sentence(n):
+        return " ".join(rng.choice(SEARCH_WORDS) for _ in range(n))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = use_temp_db(tmp)
+        owner = db.get_user_by_credentials("owner1", "123456")
+        start = time.perf_counter()
+        db.add_properties_bulk([
+            (owner["id"], 1 + i % 14, "المزة", sentence(4), sentence(20), 1000 + i, None, None, sentence(6))
+            # كلمة نادرة في إعلان واحد من كل ألف
+            if i % 1000 else
+            (owner["id"], 1 + i % 14, "المزة", "شقة نادرة", sentence(20), 1000 + i, None, None, "ياسمين")
+            for i in range(args.listings)
+        ])
+        print(f"seeded {args.listings} listings in {time.perf_counter() - start:.1f}s")
+
+        def like_scan(word):
+            pattern = f"%{word}%"
+            with db.connection() as conn:
+                return conn.execute(
+                    """
+                    SELECT p.id FROM properties p
+                    WHERE p.title LIKE ? OR p.description LIKE ? OR p.services LIKE ?
+                    ORDER BY p.id DESC LIMIT 20
+                    """,
+                    (pattern, pattern, pattern),
+                ).fetchall()
+
+        # كلمة نادرة، وشائعة (في نحو نصف الإعلانات)، وكلمتان وثلاث، وبادئة؛ مع مدينة كما ترسلها الواجهة وبدونها
+        slow = []
+        print(f"{'query':>12} {'city':>5} {'p50 ms':>8} {'p95 ms':>8} {'like ms':>9} {'capped':>7}")
+        for word in ["ياسمين", "مفروشة", "مدرسة مصعد", "مدرس", "شقة مفروشة مطبخ"]:
+            like = best_of(lambda: like_scan(word.split()[0]), repeat=3)
+            for city_id in (None, 1):
+                _, capped = db.search_properties(word, city_id=city_id)
+                times = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    db.search_properties(word, city_id=city_id)
+                    times.append((time.perf_counter() - start) * 1000)
+                times.sort()
+                p95 = _percentile(times, 0.95)
+                print(f"{word:>12} {city_id or '-':>5} {_percentile(times, 0.5):>8.2f} {p95:>8.2f} "
+                      f"{like:>9.2f} {'yes' if capped else 'no':>7}")
+                if p95 > args.max_p95_ms:
+                    slow.append(word if city_id is None else f"{word} (city {city_id})")
+        db.close_pool()
+
+    if slow:
+        print(f"❌ search p95 above {args.max_p95_ms:g} ms: {', '.join(slow)}")
+        sys.exit(1)
+    print(f"✅ search p95 under {args.max_p95_ms:g} ms (ranking the newest {db.SEARCH_WINDOW} matches)")
+
+
+def bench_spatial(args):
+    """استعلامات نطاق الخريطة ونصف القطر عبر R*Tree مقابل مسح lat/lon"""
+    import geo
+
+    center_lat, center_lon = 33.5138, 36.2765
+    viewport = geo.viewport_bounds(center_lat, center_lon, 14, 400, 300)
+    print(f"{'points':>9} {'viewport rtree ms':>18} {'viewport scan ms':>17} {'2km radius ms':>14} {'hits':>6}")
+    for size in args.sizes:
+        rng = random.Random(7)
+        with tempfile.TemporaryDirectory() as tmp:
+            db = use_temp_db(tmp)
+            owner = db.get_user_by_credentials("owner1", "123456")
+            db.add_properties_bulk([
+                (owner["id"], 1, "المزة", "", None, None,
+                 center_lat + rng.uniform(-0.5, 0.5), center_lon + rng.uniform(-0.5, 0.5), None)
+                for _ in range(size)
+            ])
+
+            def scan():
+                with db.connection() as conn:
+                    return conn.execute(
+                        "SELECT id FROM properties WHERE lat BETWEEN ? AND ? AND lon BETWEEN ? AND ? LIMIT ?",
+                        (viewport[0], viewport[2], viewport[1], viewport[3], db.MAP_MARKER_LIMIT),
+                    ).fetchall()
+
+            hits = len(db.get_properties_in_bounds(*viewport))
+            rtree = best_of(lambda: db.get_properties_in_bounds(*viewport))
+            full = best_of(scan, repeat=3)
+            radius = best_of(lambda: db.get_properties_near(center_lat, center_lon, 2))
+            db.close_pool()
+        print(f"{size:>9} {rtree:>18.2f} {full:>17.2f} {radius:>14.2f} {hits:>6}")
+
+
+def bench_bulk(args):
+    """الاستيراد الجماعي على دفعات مقابل add_property لكل صف"""
+    import csv
+    import bulk
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = use_temp_db(tmp)
+        source = str(Path(tmp) / "listings.csv")
+        with open(source, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["owner", "city", "area", "title", "description", "rent", "lat", "lon", "services"])
+            for i in range(args.rows):
+                writer.writerow(["owner1", "دمشق", "المزة", f"عقار {i}", "شقة مفروشة", 1000 + i, 33.5, 36.27, "مدرسة"])
+
+        owner = db.get_user_by_credentials("owner1", "123456")
+        single_rows = max(args.rows // 50, 100)
+        start = time.perf_counter()
+        for i in range(single_rows):
+            db.add_property(owner["id"], 1, "المزة", f"عقار {i}", "شقة مفروشة", 1000 + i, 33.5, 36.27, "مدرسة")
+        single = single_rows / (time.perf_counter() - start)
+
+        summary = bulk.import_file(source, progress=lambda state: None)
+        batched = summary["imported"] / summary["seconds"]
+        db.close_pool()
+
+    print(f"add_property per row : {single:10.0f} rows/sec ({single_rows} rows)")
+    print(f"bulk import (batched): {batched:10.0f} rows/sec ({summary['imported']} rows)")
+
+
+# دوال البنية التحتية (المسار، المجمع، الاتصالات، السجل والمحلل) تقاس ضمناً في كل استدعاء آخر
+SUITE_INFRASTRUCTURE = {
+    "get_db_path", "resolve_db_path", "get_pool", "close_pool", "get_connection",
+    "connection", "register_functions", "city_cache_stats", "area_facet_stats", "configure_logging",
+    "enable_profiling", "disable_profiling", "get_profiler", "profile_report", "bootstrap",
+    "data_version", "watch_changes", "get_writer", "write", "write_stats",
+}
+
+# معاملات الاستعلامات المكتوبة مباشرة في main.py (تطابق بنص الاستعلام لا برقم السطر)؛
+# كل الاستعلامات الآن في db.py، وأي استعلام جديد في main.py يفشل suite حتى يضاف هنا
+# بالشكل: ("main:name", re.compile(r"^SELECT ..."), lambda ctx: (params,))
+MAIN_QUERIES = []
+
+
+def _percentile(sorted_values, fraction: float):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(fn, seconds: float, min_calls: int = 3, max_calls: int = 1000):
+    """زمن كل استدعاء على حدة خلال المدة المحددة: mean/p50/p95 بالميلي ثانية"""
+    times = []
+    deadline = time.perf_counter() + seconds
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        while len(times) < min_calls or (len(times) < max_calls and time.perf_counter() < deadline):
+            start = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    mean = sum(times) / len(times)
+    return {
+        "iterations": len(times),
+        "mean_ms": round(mean, 4),
+        "p50_ms": round(_percentile(times, 0.50), 4),
+        "p95_ms": round(_percentile(times, 0.95), 4),
+        "ops_per_sec": round(1000 / mean, 1) if mean else None,
+    }
+
+
+def suite_context(db):
+    """قيم حقيقية من البيانات المولدة تستخدمها حالات القياس"""
+    with db.connection() as conn:
+        owner_id = conn.execute(
+            "SELECT owner_id FROM properties GROUP BY owner_id ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()[0]
+        area_id = conn.execute(
+            "SELECT area_id FROM properties WHERE city_id = 1 GROUP BY area_id ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()[0]
+        property_id, edit_owner_id = conn.execute(
+            "SELECT id, owner_id FROM properties WHERE city_id = 1 AND lat IS NOT NULL ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+    _, area_cursor = db.get_properties_page_by_area(area_id)
+    _, owner_cursor = db.get_properties_page_by_owner(owner_id)
+    return {
+        "owner_id": owner_id,
+        "city_id": 1,
+        "area_id": area_id,
+        "property_id": property_id,
+        "edit_owner_id": edit_owner_id,
+        "area_cursor": area_cursor,
+        "owner_cursor": owner_cursor,
+    }
+
+
+def suite_cases(db, ctx):
+    """(اسم الحالة، الدالة المقاسة في db، الاستدعاء) لكل دالة عامة في db.py"""
+    import geo
+    from areas import CITY_CENTERS
+
+    counter = iter(range(10 ** 9))
+    lat, lon = CITY_CENTERS["دمشق"]
+    bounds = geo.viewport_bounds(lat, lon, 14, 400, 300)
+    # حالات الكتابة تضيف عقاراتها بعيداً عن مركز المدينة ومناطقها
+    write_row = (ctx["owner_id"], 1, "قياس", "شقة للقياس", "وصف", 1_000_000, lat + 1, lon + 1, "مدرسة")
+    added = []
+    source = "bench-suite-checkpoint"
+
+    def add_property():
+        added.append(db.add_property(*write_row))
+
+    def delete_property():
+        # تحذف ما أضافته حالة add_property (تنفذ بعدها مباشرة)
+        db.delete_property(added.pop() if added else -1, ctx["owner_id"])
+
+    def add_properties_bulk():
+        db.add_properties_bulk([write_row] * 100)
+
+    def set_checkpoint():
+        db.add_properties_bulk([], checkpoint={"source": source, "line": 1, "imported": 0, "errors": 0})
+
+    def export_all():
+        for _ in db.iter_properties_for_export(city_id=ctx["city_id"]):
+            pass
+
+    def migrate():
+        with db.connection() as conn:
+            db.migrate(conn)
+
+    def schema_version():
+        with db.connection() as conn:
+            db.get_schema_version(conn)
+
+    def cold_cities():
+        db.invalidate_city_cache()
+        db.get_cities()
+
+    def cold_area_facets():
+        db.invalidate_area_facets()
+        db.get_area_facets(ctx["city_id"])
+
+    def toggle_area():
+        # تفعيل ثم إلغاء تفعيل منطقة الكتابة (لا تؤثر على المناطق المقاسة)
+        if "write_area_id" not in ctx:
+            ctx["write_area_id"] = area_id_of(db, ctx["city_id"], write_row[2])
+        area_id = ctx["write_area_id"]
+        db.set_area_active(area_id, True)
+        db.set_area_active(area_id, False)
+
+    rents = iter(range(10 ** 9))
+    # القراءات أولاً حتى لا تؤثر الصفوف التي تضيفها حالات الكتابة على نتائجها
+    return [
+        ("init_db", "init_db", db.init_db),
+        ("migrate", "migrate", migrate),
+        ("get_schema_version", "get_schema_version", schema_version),
+        ("normalize_arabic", "normalize_arabic", lambda: db.normalize_arabic("والمزة فيلات غربية مفروشة")),
+        ("build_fts_query", "build_fts_query", lambda: db.build_fts_query("شقة مفروشة", prefix=True)),
+        ("get_user_by_credentials", "get_user_by_credentials",
+         lambda: db.get_user_by_credentials("owner1", "123456")),
+        ("get_user_id_by_username", "get_user_id_by_username", lambda: db.get_user_id_by_username("owner1")),
+        ("user_exists", "user_exists", lambda: db.user_exists(ctx["owner_id"])),
+        ("get_cities", "get_cities", db.get_cities),
+        ("get_cities (cold)", "invalidate_city_cache", cold_cities),
+        ("get_city_by_id", "get_city_by_id", lambda: db.get_city_by_id(ctx["city_id"])),
+        ("get_property", "get_property", lambda: db.get_property(ctx["property_id"])),
+        ("get_area_facets", "get_area_facets", lambda: db.get_area_facets(ctx["city_id"])),
+        ("get_area_facets (cold)", "invalidate_area_facets", cold_area_facets),
+        ("get_properties_by_city", "get_properties_by_city", lambda: db.get_properties_by_city(ctx["city_id"])),
+        ("get_properties_by_owner", "get_properties_by_owner",
+         lambda: db.get_properties_by_owner(ctx["owner_id"])),
+        ("get_properties_by_area", "get_properties_by_area", lambda: db.get_properties_by_area(ctx["area_id"])),
+        ("get_properties_page_by_area", "get_properties_page_by_area",
+         lambda: db.get_properties_page_by_area(ctx["area_id"])),
+        ("get_properties_page_by_area (next)", "get_properties_page_by_area",
+         lambda: db.get_properties_page_by_area(ctx["area_id"], before_id=ctx["area_cursor"])),
+        ("is_area_open", "is_area_open", lambda: db.is_area_open(ctx["city_id"], "القدم")),
+        ("get_properties_page_by_owner", "get_properties_page_by_owner",
+         lambda: db.get_properties_page_by_owner(ctx["owner_id"])),
+        ("get_properties_page_by_owner (next)", "get_properties_page_by_owner",
+         lambda: db.get_properties_page_by_owner(ctx["owner_id"], before_id=ctx["owner_cursor"])),
+        ("search_properties (common)", "search_properties", lambda: db.search_properties("شقة")),
+        ("search_properties (rare, city)", "search_properties",
+         lambda: db.search_properties("فيلا حديقة", city_id=ctx["city_id"])),
+        ("get_properties_in_bounds", "get_properties_in_bounds", lambda: db.get_properties_in_bounds(*bounds)),
+        ("get_properties_near (2 km)", "get_properties_near", lambda: db.get_properties_near(lat, lon, 2)),
+        ("get_owner_property", "get_owner_property",
+         lambda: db.get_owner_property(ctx["property_id"], ctx["edit_owner_id"])),
+        ("get_property_points (city)", "get_property_points", lambda: db.get_property_points(ctx["city_id"])),
+        ("get_property_points (area)", "get_property_points",
+         lambda: db.get_property_points(ctx["city_id"], ctx["area_id"])),
+        ("set import checkpoint", "add_properties_bulk", set_checkpoint),
+        ("get_import_checkpoint", "get_import_checkpoint", lambda: db.get_import_checkpoint(source)),
+        ("clear_import_checkpoint", "clear_import_checkpoint", lambda: db.clear_import_checkpoint(source)),
+        ("iter_properties_for_export (city)", "iter_properties_for_export", export_all),
+        ("create_user", "create_user", lambda: db.create_user(f"bench_{next(counter)}", "123456", "user")),
+        ("create_users_bulk", "create_users_bulk",
+         lambda: db.create_users_bulk([(f"bench_{next(counter)}", "123456", "user") for _ in range(100)])),
+        ("check_area_stats", "check_area_stats", db.check_area_stats),
+        ("add_property", "add_property", add_property),
+        ("set_area_active (x2)", "set_area_active", toggle_area),
+        ("refresh_area_centroids", "refresh_area_centroids", db.refresh_area_centroids),
+        ("rebuild_area_stats", "rebuild_area_stats", db.rebuild_area_stats),
+        ("delete_property", "delete_property", delete_property),
+        ("add_properties_bulk (100 rows)", "add_properties_bulk", add_properties_bulk),
+        ("update_property", "update_property",
+         lambda: db.update_property(ctx["property_id"], ctx["edit_owner_id"], rent=1_000_000 + next(rents))),
+    ]
+
+
+def main_query_cases(db, ctx):
+    """حالات قياس للاستعلامات المكتوبة مباشرة في main.py، والاستعلامات التي لا معاملات لها"""
+    cases, unmatched, seen = [], [], set()
+    for location, sql in collect_queries():
+        if not location.startswith("main.py:") or sql in seen:
+            continue
+        seen.add(sql)
+        match = next((entry for entry in MAIN_QUERIES if entry[1].search(sql)), None)
+        if match is None:
+            unmatched.append(f"{location} {sql[:60]}")
+            continue
+        name, _, params = match
+
+        def run(sql=sql, params=params):
+            # اتصالات المجمع للقراءة فقط؛ التعديلات تمر بخيط الكاتب
+            if sql.startswith("UPDATE"):
+                db.write(lambda conn: conn.execute(sql, params(ctx)).rowcount).result()
+                return
+            with db.connection() as conn:
+                conn.execute(sql, params(ctx)).fetchall()
+
+        cases.append((name, None, run))
+    return cases, unmatched
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_suite(args):
+    """قياس كل دالة عامة في db.py واستعلامات main.py على عدة أحجام من البيانات المولدة"""
+    import datagen
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "seconds_per_case": args.seconds,
+        },
+        "scales": {},
+    }
+    uncovered = []
+    for scale in args.scales:
+        users = max(30, scale // 100)
+        with tempfile.TemporaryDirectory() as tmp:
+            db = use_temp_db(tmp)
+            generated = datagen.generate(users, scale, seed=args.seed)
+            ctx = suite_context(db)
+
+            cases = suite_cases(db, ctx)
+            main_cases, unmatched = main_query_cases(db, ctx)
+            covered = {function for _, function, _ in cases}
+            public = {
+                name for name, obj in inspect.getmembers(db, inspect.isfunction)
+                if not name.startswith("_") and obj.__module__ == db.__name__
+            }
+            uncovered = sorted(public - covered - SUITE_INFRASTRUCTURE) + unmatched
+
+            print(f"\n📏 {scale} properties, {users} users (generated in {generated['seconds']:.1f}s)")
+            print(f"{'case':46} {'calls':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'ops/sec':>10}")
+            measured = {}
+            for name, _, fn in cases + main_cases:
+                stats = measure(fn, args.seconds)
+                measured[name] = stats
+                print(f"{name:46} {stats['iterations']:>6} {stats['mean_ms']:>9.3f} "
+                      f"{stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['ops_per_sec']:>10.0f}")
+            results["scales"][str(scale)] = {
+                "users": users,
+                "properties": scale,
+                "generate_seconds": round(generated["seconds"], 3),
+                "cases": measured,
+            }
+            db.close_pool()
+
+    results["uncovered"] = uncovered
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+    if uncovered:
+        print("❌ Not benchmarked (add a case to suite_cases or MAIN_QUERIES):")
+        for name in uncovered:
+            print(f"   - {name}")
+        sys.exit(1)
+
+
+def compare_results(args):
+    """مقارنة نتيجتي suite وإظهار التراجعات في الزمن الوسيط (p50)"""
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"old: {old['meta'].get('commit')}  new: {new['meta'].get('commit')}  "
+          f"threshold: +{args.threshold:.0%} and +{args.min_ms} ms")
+    regressions = 0
+    for scale, new_scale in new["scales"].items():
+        old_cases = old["scales"].get(scale, {}).get("cases", {})
+        print(f"\n📏 {scale} properties")
+        print(f"{'case':46} {'old p50':>9} {'new p50':>9} {'change':>8}")
+        for name, stats in new_scale["cases"].items():
+            if name not in old_cases:
+                print(f"{name:46} {'-':>9} {stats['p50_ms']:>9.3f} {'new':>8}")
+                continue
+            before, after = old_cases[name]["p50_ms"], stats["p50_ms"]
+            change = (after - before) / before if before else 0.0
+            regressed = change > args.threshold and after - before > args.min_ms
+            regressions += regressed
+            flag = "  ⚠️" if regressed else ""
+            print(f"{name:46} {before:>9.3f} {after:>9.3f} {change:>+8.0%}{flag}")
+
+    if regressions:
+        print(f"\n❌ {regressions} regressions")
+        sys.exit(1)
+    print("\n✅ No regressions")
+
+
+def _lag_stats(lags):
+    lags = sorted(lags)
+    return {
+        "events": len(lags),
+        "p50_ms": _percentile(lags, 0.50),
+        "p95_ms": _percentile(lags, 0.95),
+        "max_ms": lags[-1],
+    }
+
+
+async def _ui_lag(seconds: float, slow_tasks: int, slow_query, interval: float = 0.01):
+    """تأخر أحداث واجهة وهمية (كل 10ms) بينما تعمل slow_tasks مهام بطيئة على نفس الحلقة"""
+    lags = []
+    stop = asyncio.Event()
+
+    async def ui_events():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + seconds
+        while loop.time() < deadline:
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lags.append((loop.time() - expected) * 1000)
+        stop.set()
+
+    queries = 0
+
+    async def background():
+        nonlocal queries
+        while not stop.is_set():
+            await slow_query()
+            queries += 1
+            # إفساح المجال للحلقة بين الاستعلامات كما يحدث بين أحداث المستخدم
+            await asyncio.sleep(0)
+
+    tasks = [asyncio.create_task(background()) for _ in range(slow_tasks)]
+    await ui_events()
+    await asyncio.gather(*tasks)
+    return _lag_stats(lags), queries
+
+
+def bench_ui_latency(args):
+    """تأخر أحداث الواجهة أثناء استعلامات بطيئة: استدعاء db مباشرة مقابل async_db"""
+    import async_db
+    import datagen
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = use_temp_db(tmp)
+        datagen.generate(max(30, args.listings // 100), args.listings)
+        city_id = 1
+
+        async def idle():
+            await asyncio.sleep(0.05)
+
+        async def blocking():
+            # ما كانت تفعله المعالجات: استعلام متزامن داخل حلقة الأحداث
+            db.get_properties_by_city(city_id)
+
+        async def offloaded():
+            await async_db.get_properties_by_city(city_id)
+
+        start = time.perf_counter()
+        db.get_properties_by_city(city_id)
+        query_ms = (time.perf_counter() - start) * 1000
+
+        print(f"slow query: get_properties_by_city at {args.listings} listings = {query_ms:.0f} ms")
+        print(f"{'mode':12} {'ui events':>10} {'p50 lag ms':>11} {'p95 lag ms':>11} {'max lag ms':>11} {'queries':>8}")
+        for name, query in (("idle", idle), ("blocking", blocking), ("async_db", offloaded)):
+            stats, queries = asyncio.run(_ui_lag(args.seconds, args.slow_tasks, query))
+            print(f"{name:12} {stats['events']:>10} {stats['p50_ms']:>11.1f} {stats['p95_ms']:>11.1f} "
+                  f"{stats['max_ms']:>11.1f} {queries if name != 'idle' else '-':>8}")
+        async_db.shutdown()
+        db.close_pool()
+
+
+async def _flip_filters(db, selections, interval: float, scheduler=None):
+    """تبديل المدينة/المنطقة بسرعة كما يفعل المستخدم؛ بدون scheduler يكتمل كل تبديل ويرسم"""
+    import async_db
+
+    counts = {"queries": 0, "renders": 0}
+    shown = {}
+    last_change = [0.0]
+
+    async def fetch_areas(city_id):
+        counts["queries"] += 1
+        return await async_db.get_area_facets(city_id)
+
+    async def fetch_page(city_id, area_id):
+        counts["queries"] += 1
+        return await async_db.get_properties_page_by_area(area_id)
+
+    def render(kind, value):
+        counts["renders"] += 1
+        shown[kind] = value
+        shown["at"] = time.perf_counter()
+
+    async def change(city_id, area):
+        if scheduler is None:
+            render("areas", (city_id, await fetch_areas(city_id)))
+            render("list", (city_id, area, await fetch_page(city_id, area)))
+            return
+        rendered = await scheduler.request(
+            "areas", city_id, lambda: fetch_areas(city_id), lambda r: render("areas", (city_id, r))
+        )
+        if rendered:
+            await scheduler.request(
+                "list", (city_id, area), lambda: fetch_page(city_id, area),
+                lambda r: render("list", (city_id, area, r)), debounce=False,
+            )
+
+    tasks = []
+    for city_id, area in selections:
+        last_change[0] = time.perf_counter()
+        tasks.append(asyncio.create_task(change(city_id, area)))
+        await asyncio.sleep(interval)
+    await asyncio.gather(*tasks)
+    settle_ms = (shown["at"] - last_change[0]) * 1000
+    return counts, shown, settle_ms
+
+
+def bench_scheduler(args):
+    """تبديل سريع للفلاتر: كل تغيير حتى النهاية مقابل RequestScheduler (تأخير، الأحدث يفوز، دمج)"""
+    import async_db
+    import datagen
+    from scheduler import RequestScheduler
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = use_temp_db(tmp)
+        datagen.generate(max(30, args.listings // 100), args.listings)
+        rng = random.Random(7)
+        area_ids = {c: sorted(f["area_id"] for f in db.get_area_facets(c)) for c in range(1, 15)}
+        selections = []
+        for _ in range(args.changes):
+            city_id = rng.randint(1, 14)
+            selections.append((city_id, rng.choice(area_ids[city_id])))
+        interval = args.interval_ms / 1000
+
+        naive, naive_shown, naive_settle = asyncio.run(_flip_filters(db, selections, interval))
+        scheduler = RequestScheduler()
+        scheduled, shown, settle = asyncio.run(_flip_filters(db, selections, interval, scheduler))
+        stats = scheduler.stats()
+
+        # تمرير متكرر يطلب نفس الصفحة التالية عدة مرات قبل وصولها
+        async def scroll_storm():
+            storm = RequestScheduler()
+            area_id = area_id_of(db, 1, "المزة")
+            _, cursor = db.get_properties_page_by_area(area_id)
+            fetch = lambda: async_db.get_properties_page_by_area(area_id, before_id=cursor)
+            await asyncio.gather(*[
+                storm.request("page", (area_id, cursor), fetch, lambda r: None, debounce=False)
+                for _ in range(10)
+            ])
+            return storm.stats()
+
+        storm = asyncio.run(scroll_storm())
+        async_db.shutdown()
+        db.close_pool()
+
+    last = selections[-1]
+    assert shown["list"][:2] == last and naive_shown["list"][:2] == last, "final selection not shown"
+    print(f"{args.changes} filter changes, {args.interval_ms} ms apart ({args.listings} listings)")
+    print(f"{'':22} {'queries':>8} {'renders':>8} {'settle ms':>10}")
+    print(f"{'run every change':22} {naive['queries']:>8} {naive['renders']:>8} {naive_settle:>10.1f}")
+    print(f"{'RequestScheduler':22} {scheduled['queries']:>8} {scheduled['renders']:>8} {settle:>10.1f}")
+    print(f"avoided: {stats['queries_avoided']} queries ({stats['debounced']} debounced, "
+          f"{stats['coalesced']} coalesced), {stats['renders_avoided']} renders; "
+          f"wasted queries: {stats['wasted_queries']}")
+    print(f"scroll storm: 10 identical next-page requests -> {storm['executed']} query, "
+          f"{storm['rendered']} render")
+
+
+def _external_area_writes(path: str, owner_id: int):
+    """تعديلات من اتصال sqlite3 عادي كأداة خارجية (بدون دوال التطبيق المسجلة على اتصالاته)"""
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            area_id = conn.execute(
+                "INSERT INTO areas (city_id, name, normalized_name) VALUES (1, 'منطقة خارجية', 'منطقه خارجيه')"
+            ).lastrowid
+            ids = [
+                conn.execute(
+                    "INSERT INTO properties (owner_id, city_id, area_id, title, rent) VALUES (?, 1, ?, 'عقار', ?)",
+                    (owner_id, area_id, rent),
+                ).lastrowid
+                for rent in (400_000, 3_000_000)
+            ]
+            conn.execute("UPDATE properties SET rent = 900000 WHERE id = ?", (ids[0],))
+            conn.execute("UPDATE properties SET area_id = (SELECT MIN(id) FROM areas) WHERE id = ?", (ids[1],))
+            conn.execute("DELETE FROM properties WHERE id = ?", (ids[0],))
+            conn.execute("DELETE FROM areas WHERE id = ?", (area_id,))
+    finally:
+        conn.close()
+
+
+def bench_area_stats(args):
+    """إحصائيات المناطق: تجميع عند الطلب مقابل قراءة area_stats، وكلفة triggers على الكتابة"""
+    import datagen
+
+    print(f"{'listings':>9} {'aggregate ms':>13} {'area_stats ms':>14} {'writes/sec':>11} {'mismatches':>11}")
+    for size in args.sizes:
+        rng = random.Random(3)
+        with tempfile.TemporaryDirectory() as tmp:
+            db = use_temp_db(tmp)
+            datagen.generate(max(30, size // 100), size)
+
+            def aggregate():
+                # ما كانت تفعله get_area_facets قبل area_stats
+                with db.connection() as conn:
+                    return conn.execute(
+                        """
+                        SELECT a.id, COUNT(p.id), COUNT(p.rent), SUM(p.rent), MIN(p.rent), MAX(p.rent)
+                        FROM areas a
+                        LEFT JOIN properties p ON p.area_id = a.id
+                        WHERE a.city_id = 1
+                        GROUP BY a.id
+                        """
+                    ).fetchall()
+
+            def stored():
+                db.invalidate_area_facets()
+                return db.get_area_facets(1)
+
+            before = best_of(aggregate)
+            after = best_of(stored)
+
+            # كتابات عشوائية: إضافة، تعديل الإيجار أو المنطقة، وحذف
+            with db.connection() as conn:
+                rows = conn.execute("SELECT id, owner_id FROM properties").fetchall()
+            start = time.perf_counter()
+            for i in range(args.writes):
+                property_id, owner_id = rows[rng.randrange(len(rows))]
+                op = i % 4
+                if op == 0:
+                    db.add_property(owner_id, 1, rng.choice(["المزة", "الميدان", "قياس"]), "عقار", "",
+                                    rng.choice([None, rng.randint(1, 80) * 100_000]), None, None, "")
+                elif op == 1:
+                    db.update_property(property_id, owner_id, rent=rng.choice([None, rng.randint(1, 80) * 100_000]))
+                elif op == 2:
+                    db.update_property(property_id, owner_id, area=rng.choice(["المزة", "كفرسوسة"]))
+                else:
+                    db.delete_property(property_id, owner_id)
+            writes = args.writes / (time.perf_counter() - start)
+            _external_area_writes(db.resolve_db_path(), owner_id)
+            mismatches = len(db.check_area_stats())
+            db.close_pool()
+        print(f"{size:>9} {before:>13.2f} {after:>14.2f} {writes:>11.0f} {mismatches:>11}")
+        if mismatches:
+            print("❌ area_stats drifted from the listings")
+            sys.exit(1)
+    print("✅ area_stats stayed consistent")
+
+
+def _standin_upstream(latency_ms: float, tile_bytes: int):
+    """خادم مربعات بديل لـ OpenStreetMap: بيانات ثابتة لكل مربع مع تأخير وعداد طلبات"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import threading
+
+    state = {"requests": 0, "up": True, "truncate": False}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                state["requests"] += 1
+            if not state["up"]:
+                self.send_error(503)
+                return
+            time.sleep(latency_ms / 1000)
+            body = (self.path.encode() * (tile_bytes // len(self.path) + 1))[:tile_bytes]
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if state["truncate"]:
+                # قطع الاتصال في منتصف المربع: العميل يرى IncompleteRead
+                self.wfile.write(body[:len(body) // 2])
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}/{{z}}/{{x}}/{{y}}.png"
+
+
+def _map_session(views: int, seed: int, width: int = 400, height: int = 400):
+    """مربعات كل عرض في جلسة تصفح: تحريك وتكبير حول دمشق مع عودة أحياناً إلى مناطق سابقة"""
+    import geo
+    from areas import CITY_CENTERS
+
+    rng = random.Random(seed)
+    lat, lon = CITY_CENTERS["دمشق"]
+    zoom = 13
+    visited = [(lat, lon, zoom)]
+    for _ in range(views):
+        bounds = geo.viewport_bounds(lat, lon, zoom, width, height)
+        yield [(zoom, x, y) for x, y in geo.tiles_in_bounds(*bounds, zoom)]
+        action = rng.random()
+        if action < 0.6:
+            # تحريك بنصف عرض الشاشة تقريباً
+            lat += (bounds[2] - bounds[0]) * rng.uniform(-0.5, 0.5)
+            lon += (bounds[3] - bounds[1]) * rng.uniform(-0.5, 0.5)
+        elif action < 0.85:
+            zoom = min(16, max(11, zoom + rng.choice((-1, 1))))
+        else:
+            lat, lon, zoom = rng.choice(visited)
+        visited.append((lat, lon, zoom))
+
+
+def _get_tile(template: str, z: int, x: int, y: int):
+    import urllib.request
+
+    start = time.perf_counter()
+    with urllib.request.urlopen(template.format(z=z, x=x, y=y), timeout=10) as response:
+        response.read()
+        source = response.headers.get("X-Tile-Source")
+    return (time.perf_counter() - start) * 1000, source
+
+
+def bench_tiles(args):
+    """وسيط المربعات: نسبة الإصابة وزمن المربع مقابل خادم أصلي بديل، والعمل دون اتصال"""
+    import http.client
+    import urllib.error
+
+    import tiles
+
+    session = list(_map_session(args.views, seed=7))
+    requested = sum(len(view) for view in session)
+    print(f"{args.views} map views, {requested} tile requests, upstream {args.upstream_ms:.0f} ms/tile")
+    print(f"{'cache MB':>9} {'hit rate':>9} {'upstream':>9} {'hit p50 ms':>11} {'miss p50 ms':>12} "
+          f"{'cached MB':>10} {'evictions':>10}")
+    upstream, state, template = _standin_upstream(args.upstream_ms, args.tile_kb * 1024)
+    failures = []
+    try:
+        for cache_mb in args.cache_mb:
+            with tempfile.TemporaryDirectory() as tmp:
+                max_bytes = int(cache_mb * 1024 * 1024)
+                state["requests"] = 0
+                proxy = tiles.TileProxy(tiles.TileCache(tmp, max_bytes), upstream=template).start()
+                lags = {"cache": [], "upstream": []}
+                for view in session:
+                    for tile in view:
+                        ms, source = _get_tile(proxy.url_template, *tile)
+                        lags[source].append(ms)
+                stats = proxy.stats()
+                proxy.stop()
+            hit = sorted(lags["cache"])
+            miss = sorted(lags["upstream"])
+            print(f"{cache_mb:>9g} {stats['hit_rate']:>9.1%} {state['requests']:>9} "
+                  f"{_percentile(hit, 0.5) if hit else 0:>11.2f} {_percentile(miss, 0.5) if miss else 0:>12.2f} "
+                  f"{stats['cache_bytes'] / 1024 / 1024:>10.2f} {stats['evictions']:>10}")
+            if stats["cache_bytes"] > max_bytes:
+                failures.append(f"cache of {cache_mb} MB grew to {stats['cache_bytes']} bytes")
+            if state["requests"] != stats["misses"]:
+                failures.append(f"{state['requests']} upstream requests for {stats['misses']} misses")
+
+        # خادم أصلي يقطع الاتصال أثناء الإرسال: الوسيط يرد 502 ويعد الخطأ بدل أن يسقط المعالج
+        with tempfile.TemporaryDirectory() as tmp:
+            state["truncate"] = True
+            proxy = tiles.TileProxy(tiles.TileCache(tmp, 1024 * 1024), upstream=template).start()
+            try:
+                _get_tile(proxy.url_template, 18, 1, 1)
+                status = 200
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except (OSError, http.client.HTTPException) as e:
+                # الوسيط أسقط الاتصال دون رد
+                status = type(e).__name__
+            stats = proxy.stats()
+            proxy.stop()
+            state["truncate"] = False
+            print(f"truncated upstream: HTTP {status}, {stats['upstream_errors']} upstream error(s) counted")
+            if status != 502 or stats["upstream_errors"] != 1:
+                failures.append(f"truncated upstream tile answered {status} "
+                                f"with {stats['upstream_errors']} upstream errors counted")
+
+        # تحميل مسبق إلى MBTiles ثم إيقاف الخادم الأصلي: كل مربعات المدينة تخدم دون اتصال
+        with tempfile.TemporaryDirectory() as tmp:
+            out = os.path.join(tmp, "offline.mbtiles")
+            result = tiles.prefetch(out, ["دمشق"], template, zooms=(11, 14), radius_km=6)
+            state["up"] = False
+            proxy = tiles.TileProxy(tiles.TileCache(os.path.join(tmp, "cache"), 1024 * 1024),
+                                    upstream=template, offline=tiles.MBTiles(out)).start()
+            offline_tiles = list(tiles.city_tiles(["دمشق"], (11, 14), 6))
+            sources = [_get_tile(proxy.url_template, *tile)[1] for tile in offline_tiles]
+            proxy.stop()
+            served = sources.count("offline")
+            print(f"offline: prefetched {result['tiles']} tiles in {result['seconds']:.1f}s, "
+                  f"{served}/{len(offline_tiles)} served with the upstream down")
+            if served != len(offline_tiles):
+                failures.append(f"only {served}/{len(offline_tiles)} tiles served offline")
+    finally:
+        upstream.shutdown()
+        upstream.server_close()
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Tile cache stayed within its limit and served the city offline")
+
+
+def bench_cluster(args):
+    """تجميع علامات الخريطة: زمن بناء الفهرس وعدد العلامات لكل مستوى تكبير"""
+    import cluster
+    import geo
+    from areas import CITY_CENTERS
+
+    lat, lon = CITY_CENTERS["دمشق"]
+    zooms = range(10, 18)
+    print(f"{'points':>8} {'build ms':>9} {'query ms':>9}  markers per zoom (whole city / 3x3 screens around the centre)")
+    for size in args.sizes:
+        # نفس توزيع datagen: مناطق حول المركز وعقارات حول كل منطقة
+        rng = random.Random(size)
+        centers = [(lat + abs(rng.gauss(0, 0.04)) * math.sin(a), lon + abs(rng.gauss(0, 0.04)) * math.cos(a))
+                   for a in (rng.uniform(0, 2 * math.pi) for _ in range(46))]
+        weights = [1.0 / rank for rank in range(1, len(centers) + 1)]
+        points = []
+        for i in range(size):
+            area_lat, area_lon = rng.choices(centers, weights)[0]
+            points.append((i, rng.gauss(area_lat, 0.006), rng.gauss(area_lon, 0.006), "شقة"))
+
+        start = time.perf_counter()
+        index = cluster.ClusterIndex(points)
+        build = (time.perf_counter() - start) * 1000
+        regions = {z: geo.viewport_bounds(lat, lon, z, 1200, 900) for z in zooms}
+        query = best_of(lambda: [index.clusters(regions[z], z) for z in zooms]) / len(zooms)
+        counts = "  ".join(f"z{z}:{index.count(z)}/{len(index.clusters(regions[z], z))}" for z in zooms)
+        print(f"{size:>8} {build:>9.1f} {query:>9.3f}  {counts}")
+
+
+def _control_payload(control):
+    """عدد العناصر وحجم أوامر إضافتها كما يرسلها Flet للعميل (JSON)"""
+    from flet.core.protocol import CommandEncoder
+
+    commands = control._build_add_commands(index={"page": None}, added_controls=[])
+    return len(commands), len(json.dumps(commands, cls=CommandEncoder, separators=(",", ":")).encode())
+
+
+def bench_list_render(args):
+    """قائمة النتائج: حجم أوامر التحكم المرسلة وزمن الرسم لكل البطاقات مقابل القائمة الافتراضية"""
+    import cards
+    import flet as ft
+
+    rng = random.Random(5)
+    template = cards.PropertyCardTemplate(lambda e: None, lambda e: None, lambda e: None)
+    print(f"{'results':>8} {'all controls':>13} {'all KB':>9} {'all ms':>8} "
+          f"{'virtual controls':>17} {'virtual KB':>11} {'virtual ms':>11} {'scroll ms/step':>15}")
+    for size in args.sizes:
+        props = [
+            {
+                "id": i, "title": f"شقة مفروشة طابق ثاني {i}", "area": "المزة",
+                "rent": rng.randint(5, 80) * 100_000, "owner_username": f"owner42_{i % 50}",
+                "description": "غرفتين، صالون واسع، مطبخ حديث، مصعد", "services": "مدرسة، فرن، مواصلات",
+            }
+            for i in range(size)
+        ]
+
+        start = time.perf_counter()
+        full = ft.ListView([template.build(p) for p in props])
+        full_controls, full_bytes = _control_payload(full)
+        full_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        virtual = cards.VirtualList(template.build, viewport_height=600)
+        virtual.set_items(props)
+        virtual_controls, virtual_bytes = _control_payload(virtual.view)
+        virtual_ms = (time.perf_counter() - start) * 1000
+
+        # التمرير حتى نهاية القائمة عنصراً عنصراً: كل خطوة تبني بطاقة وتحذف أخرى
+        start = time.perf_counter()
+        for first in range(size):
+            virtual.scroll_to_index(first)
+        scroll_ms = (time.perf_counter() - start) * 1000 / size
+        print(f"{size:>8} {full_controls:>13} {full_bytes / 1024:>9.1f} {full_ms:>8.1f} "
+              f"{virtual_controls:>17} {virtual_bytes / 1024:>11.1f} {virtual_ms:>11.1f} {scroll_ms:>15.3f}")
+        if virtual.built > 2 * cards.OVERSCAN + 600 // cards.CARD_HEIGHT + 1:
+            print(f"❌ {virtual.built} cards built for one screen")
+            sys.exit(1)
+
+
+def _startup_probe(args):
+    """(داخل عملية جديدة) زمن واجهة الدخول منذ بدء العملية ثم لجلسات لاحقة فيها، كسطر JSON"""
+    import db
+    import headless
+    import main as app
+
+    imported = time.time()
+
+    def open_login():
+        page = headless.new_page()
+        app.main(page)
+        page.connection.wait_for(lambda: headless.current_route(page) == "/login")
+
+    open_login()
+    first = time.time()
+    map_loaded = "flet_map" in sys.modules
+    warm = []
+    for _ in range(args.sessions):
+        start = time.perf_counter()
+        open_login()
+        warm.append((time.perf_counter() - start) * 1000)
+    # ما كانت كل جلسة تدفعه قبل فصل تهيئة العملية، وما أجل إلى أول واجهة فيها خريطة
+    init_db_ms = best_of(db.init_db, repeat=3)
+    start = time.perf_counter()
+    app.load_map()
+    map_ms = (time.perf_counter() - start) * 1000
+    print(json.dumps({
+        "import_ms": (imported - args.t0) * 1000,
+        "process_ms": (first - args.t0) * 1000,
+        "warm_ms": sorted(warm)[len(warm) // 2],
+        "init_db_ms": init_db_ms,
+        "map_ms": map_ms,
+        "map_loaded": map_loaded,
+        "db_path": db.get_pool().db_path,
+    }))
+
+
+def bench_startup(args):
+    """زمن ظهور واجهة الدخول: عملية جديدة (أول تشغيل وإعادة تشغيل) وجلسة جديدة في عملية قائمة"""
+    if args.probe:
+        _startup_probe(args)
+        return
+
+    def probe(env):
+        out = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "startup", "--probe",
+             "--sessions", str(args.sessions), "--t0", repr(time.time())],
+            env=env, cwd=Path(__file__).parent, capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(out.strip().splitlines()[-1])
+
+    print(f"{'platform':9} {'process':12} {'import ms':>10} {'login ms':>9} {'next session ms':>16} "
+          f"{'init_db ms':>11} {'map import ms':>14}  db")
+    failed = False
+    for target in ("desktop", "android"):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {k: v for k, v in os.environ.items() if k not in (
+                "CITY_MOVER_DB", "ANDROID_RUNTIME", "ANDROID_DATA", "FLET_APP_STORAGE_DATA",
+                "PYKINATOR", "PYTHONPATH")}
+            if target == "desktop":
+                # مسار سطح المكتب الحقيقي هو city_app.db في المستودع، فنستخدم ملفاً مؤقتاً بدلاً منه
+                env["CITY_MOVER_DB"] = str(Path(tmp) / "city_app.db")
+            else:
+                # فرع الأندرويد في get_db_path كما في تطبيق مبني بـ flet build
+                env["ANDROID_DATA"] = "/data"
+                env["FLET_APP_STORAGE_DATA"] = tmp
+            for label in ("first run", "cold"):
+                runs = []
+                for _ in range(args.runs):
+                    if label == "first run":
+                        for path in Path(tmp).glob("city_app.db*"):
+                            path.unlink()
+                    runs.append(probe(env))
+                middle = lambda key: sorted(r[key] for r in runs)[len(runs) // 2]
+                print(f"{target:9} {label:12} {middle('import_ms'):>10.0f} {middle('process_ms'):>9.0f} "
+                      f"{middle('warm_ms'):>16.1f} {middle('init_db_ms'):>11.2f} {middle('map_ms'):>14.1f}  "
+                      f"{runs[0]['db_path']}")
+                if any(r["map_loaded"] for r in runs):
+                    print("❌ flet_map imported before the login view")
+                    failed = True
+    if failed:
+        sys.exit(1)
+
+
+def _session_user(db, user_id: int):
+    with db.connection() as conn:
+        row = conn.execute("SELECT id, username, role FROM users WHERE id = ?", (user_id,)).fetchone()
+    return {"id": row[0], "username": row[1], "role": row[2]}
+
+
+def view_cases(driver, db, ctx):
+    """(اسم الحالة، التحضير، التفاعل المقاس) لكل واجهة وتفاعل أساسي في main.py"""
+    import flet as ft
+    import flet_map
+
+    page = driver.page
+    user = _session_user(db, ctx["user_id"])
+    owner = _session_user(db, ctx["owner_id"])
+    empty_owner = _session_user(db, ctx["empty_owner_id"])
+
+    def as_user(account, route=None):
+        """الدخول بحساب من واجهة الدخول (Flet يتجاهل go() إلى المسار الحالي)، ثم فتح route"""
+        def setup():
+            driver.go("/login")
+            page.session.set("user", account)
+            if route:
+                driver.go(route)
+        return setup
+
+    def logged_out():
+        as_user(user, "/user")()
+        page.session.set("user", None)
+
+    def user_city():
+        as_user(user, "/user")()
+        driver.select(driver.find(ft.Dropdown, label="اختر المدينة التي ترغب بالانتقال إليها"), str(ctx["city_id"]))
+
+    def city_dropdown():
+        return driver.find(ft.Dropdown, label="اختر المدينة التي ترغب بالانتقال إليها")
+
+    return [
+        ("login_view", logged_out, lambda: driver.go("/login")),
+        ("login -> user_view", as_user(None), lambda: driver.login(user["username"], "123456")),
+        ("user_view", as_user(user), lambda: driver.go("/user")),
+        ("show_properties (city)", as_user(user, "/user"),
+         lambda: driver.select(city_dropdown(), str(ctx["city_id"]))),
+        ("show_properties (area)", user_city,
+         lambda: driver.select(driver.find(ft.Dropdown, label="اختر المنطقة"), str(ctx["area_id"]))),
+        ("run_search", user_city,
+         lambda: driver.submit(driver.find(ft.TextField, label="ابحث في العناوين والوصف والخدمات"), "شقة")),
+        ("owner_view", as_user(empty_owner), lambda: driver.go("/owner")),
+        ("owner_view + load_owner_properties", as_user(owner), lambda: driver.go("/owner")),
+        ("owner map tap", as_user(empty_owner, "/owner"),
+         lambda: driver.tap_map(driver.find(flet_map.Map), 33.51, 36.28)),
+    ]
+
+
+def bench_views(args):
+    """زمن بناء واجهات main.py وتفاعلاتها عبر جلسة بلا عميل على عدة أحجام من البيانات المولدة"""
+    import datagen
+    import headless
+    import main as app
+
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "scales": {},
+    }
+    for scale in args.scales:
+        users = max(30, scale // 100)
+        with tempfile.TemporaryDirectory() as tmp:
+            db = use_temp_db(tmp)
+            generated = datagen.generate(users, scale, seed=args.seed)
+            ctx = suite_context(db)
+            ctx["user_id"] = db.get_user_id_by_username(f"user{args.seed}_0")
+            ctx["empty_owner_id"] = db.create_user("owner_without_listings", "123456", "owner")
+            listings = len(db.get_properties_by_owner(ctx["owner_id"]))
+
+            driver = headless.Driver(app.main)
+            driver.start()
+            print(f"\n📏 {scale} properties, {users} users, busiest owner has {listings} listings "
+                  f"(generated in {generated['seconds']:.1f}s)")
+            print(f"{'case':36} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'SQL':>5} {'controls':>9} "
+                  f"{'commands':>9} {'KB':>8}")
+            measured = {}
+            for name, setup, action in view_cases(driver, db, ctx):
+                runs = []
+                for _ in range(args.repeat):
+                    setup()
+                    runs.append(action())
+                times = sorted(r["ms"] for r in runs)
+                last = runs[-1]
+                stats = measured[name] = {
+                    "iterations": len(runs),
+                    "mean_ms": round(sum(times) / len(times), 4),
+                    "p50_ms": round(_percentile(times, 0.50), 4),
+                    "p95_ms": round(_percentile(times, 0.95), 4),
+                    "statements": sorted(r["statements"] for r in runs)[len(runs) // 2],
+                    "controls": last["controls"],
+                    "commands": last["commands"],
+                    "bytes": last["bytes"],
+                }
+                print(f"{name:36} {len(runs):>5} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+                      f"{stats['statements']:>5} {stats['controls']:>9} {stats['commands']:>9} "
+                      f"{stats['bytes'] / 1024:>8.1f}")
+            results["scales"][str(scale)] = {
+                "users": users,
+                "properties": scale,
+                "owner_listings": listings,
+                "cases": measured,
+            }
+            driver.close()
+            db.disable_profiling()
+            db.close_pool()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+
+def _write_contention(db, writers: int, seconds: float, owner_ids, queued: bool, seed: int):
+    """writers خيطاً يضيف ويعدل ويحذف عقاراته لمدة seconds؛ يعيد أزمنة النجاح وعدد الأخطاء"""
+    import threading
+
+    path = db.get_pool().db_path
+    barrier = threading.Barrier(writers)
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def legacy_connection():
+        # ما كانت تفعله دوال التعديل: اتصال لكل خيط يكتب ويلتزم بنفسه وينتظر القفل في busy_timeout
+        conn = sqlite3.connect(path, check_same_thread=False)
+        db.register_functions(conn)
+        conn.execute(f"PRAGMA busy_timeout={db.BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def writer(number):
+        rng = random.Random(seed + number)
+        owner_id = owner_ids[number % len(owner_ids)]
+        conn = None if queued else legacy_connection()
+        mine, times, failed = [], [], []
+        barrier.wait()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            roll = rng.random()
+            if roll < 0.5 or not mine:
+                job, job_args = db._insert_property, (
+                    owner_id, 1, "المزة", f"عقار {number}", "شقة", rng.randrange(500_000, 3_000_000),
+                    33.5 + rng.uniform(-0.01, 0.01), 36.27 + rng.uniform(-0.01, 0.01), "مدرسة",
+                )
+            elif roll < 0.85:
+                job, job_args = db._update_property, (rng.choice(mine), owner_id, {"rent": rng.randrange(500_000, 3_000_000)})
+            else:
+                job, job_args = db._delete_property, (mine.pop(), owner_id)
+            start = time.perf_counter()
+            try:
+                if queued:
+                    result = db.write(job, *job_args).result()
+                else:
+                    result = job(conn, *job_args)
+                    conn.commit()
+            except sqlite3.OperationalError as e:
+                failed.append(str(e))
+                if conn is not None:
+                    conn.rollback()
+                continue
+            times.append((time.perf_counter() - start) * 1000)
+            if job is db._insert_property:
+                mine.append(result)
+        if conn is not None:
+            conn.close()
+        with lock:
+            latencies.extend(times)
+            errors.extend(failed)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), errors
+
+
+def bench_writes(args):
+    """تعديلات متزامنة من عشرات الخيوط: commit لكل تعديل (السلوك القديم) مقابل خيط الكاتب"""
+    import datagen
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = use_temp_db(tmp)
+        generated = datagen.generate(max(30, 3 * max(args.writers)), args.listings, seed=args.seed)
+        print(f"{'mode':8} {'writers':>7} {'writes/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'max ms':>8} {'errors':>7} {'batch':>6}")
+        for writers in args.writers:
+            for mode in ("direct", "queued"):
+                before = db.write_stats()
+                times, errors = _write_contention(
+                    db, writers, args.seconds, generated["owner_ids"], mode == "queued", args.seed)
+                after = db.write_stats()
+                batches = after["batches"] - before["batches"]
+                batch = f"{(after['writes'] - before['writes']) / batches:.1f}" if mode == "queued" and batches else "-"
+                print(f"{mode:8} {writers:>7} {len(times) / args.seconds:>9.0f} {_percentile(times, 0.5):>8.2f} "
+                      f"{_percentile(times, 0.95):>8.2f} {_percentile(times, 0.99):>8.2f} {times[-1]:>8.1f} "
+                      f"{len(errors):>7} {batch:>6}")
+                for message in sorted(set(errors))[:3]:
+                    print(f"         ❌ {message}")
+        db.close_pool()
+
+
+def _raw_http(host: str, port: int, request: bytes, timeout: float = 10.0):
+    """إرسال بايتات طلب كما هي وقراءة الرد حتى يغلق الاتصال (أو تنتهي المهلة)"""
+    import socket
+
+    chunks = []
+    with socket.create_connection((host, port), timeout=timeout) as conn:
+        conn.sendall(request)
+        try:
+            while data := conn.recv(65536):
+                chunks.append(data)
+        except socket.timeout:
+            pass
+    return b"".join(chunks)
+
+
+def _outside_address():
+    """عنوان الجهاز على الشبكة (غير 127.0.0.1) ليبدو الطلب قادماً من الخارج، أو None"""
+    import socket
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        try:
+            s.connect(("192.0.2.1", 9))
+            address = s.getsockname()[0]
+        except OSError:
+            return None
+    return None if address.startswith("127.") else address
+
+
+def check_stats_access(args):
+    """/stats عبر supervisor.py: محلياً يجاب، ومن الخارج لا يتسرب بأي صيغة للمسار أو عبر keep-alive"""
+    import datagen
+    import loadtest
+    import server
+
+    here = Path(__file__).parent
+    leaks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db = use_temp_db(tmp)
+        datagen.generate(30, args.listings, seed=42)
+        db.close_pool()
+        port = loadtest._free_port()
+        log_path = Path(tmp) / "supervisor.log"
+        with open(log_path, "w") as log:
+            process = subprocess.Popen(
+                [sys.executable, str(here / "supervisor.py"), "--workers", "1", "--host", "0.0.0.0",
+                 "--port", str(port)],
+                cwd=here, env=dict(os.environ), stdout=log, stderr=subprocess.STDOUT,
+            )
+        try:
+            loadtest._wait_ready(f"http://127.0.0.1:{port}", process)
+
+            def check(name, host, target_port, request, expect_stats):
+                response = _raw_http(host, target_port, request)
+                got = b'"rss_bytes"' in response
+                status = response.split(b"\r\n", 1)[0].decode("latin-1", "replace")
+                ok = got == expect_stats
+                print(f"{'✅' if ok else '❌'} {name:38} {status}")
+                if not ok:
+                    leaks.append(name)
+
+            def get(target, extra=b""):
+                return b"GET " + target + b" HTTP/1.1\r\nHost: x\r\n" + extra + b"Connection: close\r\n\r\n"
+
+            check("local GET /stats", "127.0.0.1", port, get(b"/stats"), True)
+            # العامل خلف الموزع لا يثق بعنوان 127.0.0.1 بل بالرمز وحده
+            check("worker port /stats without token", "127.0.0.1", port + 1, get(b"/stats"), False)
+            outside = _outside_address()
+            if outside is None:
+                print("⚠️  no non-loopback address; remote cases skipped")
+            else:
+                for target in (b"/stats", b"/stats?x=1", b"//stats", b"/%73tats", b"/./stats",
+                               b"/x/../stats", f"http://{outside}:{port}/stats".encode()):
+                    check(f"remote GET {target.decode()}", outside, port, get(target), False)
+                check("remote GET /stats X-Forwarded-For local", outside, port,
+                      get(b"/stats", b"X-Forwarded-For: 127.0.0.1\r\n"), False)
+                check(f"remote GET /stats with empty {server.STATS_TOKEN_HEADER}", outside, port,
+                      get(b"/stats", f"{server.STATS_TOKEN_HEADER}: \r\n".encode()), False)
+                keep_alive = (b"GET / HTTP/1.1\r\nHost: x\r\nConnection: keep-alive\r\n\r\n" + get(b"/stats"))
+                check("remote keep-alive GET / then /stats", outside, port, keep_alive, False)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=20)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if leaks:
+            print(log_path.read_text()[-2000:])
+    if leaks:
+        print(f"❌ /stats answered where it should not: {', '.join(leaks)}")
+        sys.exit(1)
+    print("✅ /stats answers local requests only")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="City Mover DB benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    pool = sub.add_parser("pool", help="connect-per-call vs pooled connections")
+    pool.add_argument("--seconds", type=float, default=2.0)
+    pool.set_defaults(func=bench_pool)
+
+    plans = sub.add_parser("plans", help="assert every query uses an index")
+    plans.set_defaults(func=check_plans)
+
+    owner_refresh = sub.add_parser("owner-refresh", help="statements per owner dashboard refresh")
+    owner_refresh.add_argument("--listings", type=int, default=300)
+    owner_refresh.set_defaults(func=check_owner_refresh)
+
+    owner_updates = sub.add_parser("owner-updates", help="cards rebuilt per owner add, edit and delete")
+    owner_updates.add_argument("--listings", type=int, default=300)
+    owner_updates.set_defaults(func=check_owner_updates)
+
+    city_cache = sub.add_parser("city-cache", help="statements for steady-state city lookups")
+    city_cache.add_argument("--browses", type=int, default=1000)
+    city_cache.set_defaults(func=check_city_cache)
+
+    pagination = sub.add_parser("pagination", help="first-page latency vs full fetch")
+    pagination.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    pagination.set_defaults(func=bench_pagination)
+
+    search = sub.add_parser("search", help="FTS5 search p50/p95 vs LIKE scan; fails above --max-p95-ms")
+    search.add_argument("--listings", type=int, default=100000)
+    search.add_argument("--repeat", type=int, default=50)
+    search.add_argument("--max-p95-ms", type=float, default=10.0)
+    search.set_defaults(func=bench_search)
+
+    spatial = sub.add_parser("spatial", help="R*Tree viewport and radius queries")
+    spatial.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    spatial.set_defaults(func=bench_spatial)
+
+    bulk_import = sub.add_parser("bulk", help="batched import vs per-row add_property")
+    bulk_import.add_argument("--rows", type=int, default=50000)
+    bulk_import.set_defaults(func=bench_bulk)
+
+    suite = sub.add_parser("suite", help="benchmark every public db function on generated data")
+    suite.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 100000])
+    suite.add_argument("--seconds", type=float, default=0.5, help="time budget per case")
+    suite.add_argument("--seed", type=int, default=42)
+    suite.add_argument("--output", help="write results as JSON")
+    suite.set_defaults(func=bench_suite)
+
+    compare = sub.add_parser("compare", help="flag p50 regressions between two suite results")
+    compare.add_argument("old")
+    compare.add_argument("new")
+    compare.add_argument("--threshold", type=float, default=0.2, help="relative slowdown to flag")
+    compare.add_argument("--min-ms", type=float, default=0.05, help="ignore smaller absolute slowdowns")
+    compare.set_defaults(func=compare_results)
+
+    ui_latency = sub.add_parser("ui-latency", help="UI event lag while slow queries run")
+    ui_latency.add_argument("--listings", type=int, default=100000)
+    ui_latency.add_argument("--seconds", type=float, default=3.0)
+    ui_latency.add_argument("--slow-tasks", type=int, default=4)
+    ui_latency.set_defaults(func=bench_ui_latency)
+
+    scheduler = sub.add_parser("scheduler", help="rapid filter changes with and without RequestScheduler")
+    scheduler.add_argument("--listings", type=int, default=100000)
+    scheduler.add_argument("--changes", type=int, default=20)
+    scheduler.add_argument("--interval-ms", type=float, default=40)
+    scheduler.set_defaults(func=bench_scheduler)
+
+    area_stats = sub.add_parser("area-stats", help="on-demand aggregate vs trigger-maintained area_stats")
+    area_stats.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    area_stats.add_argument("--writes", type=int, default=2000)
+    area_stats.set_defaults(func=bench_area_stats)
+
+    tile_cache = sub.add_parser("tiles", help="tile proxy hit rate against a stand-in upstream server")
+    tile_cache.add_argument("--views", type=int, default=300)
+    tile_cache.add_argument("--cache-mb", type=float, nargs="+", default=[64, 1])
+    tile_cache.add_argument("--upstream-ms", type=float, default=20)
+    tile_cache.add_argument("--tile-kb", type=int, default=15)
+    tile_cache.set_defaults(func=bench_tiles)
+
+    clustering = sub.add_parser("cluster", help="map marker clustering time and marker counts")
+    clustering.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    clustering.set_defaults(func=bench_cluster)
+
+    list_render = sub.add_parser("list-render", help="control payload and render time of the results list")
+    list_render.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    list_render.set_defaults(func=bench_list_render)
+
+    startup = sub.add_parser("startup", help="time to the login view for new processes and new sessions")
+    startup.add_argument("--runs", type=int, default=3)
+    startup.add_argument("--sessions", type=int, default=5)
+    startup.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    startup.add_argument("--t0", type=float, help=argparse.SUPPRESS)
+    startup.set_defaults(func=bench_startup)
+
+    views = sub.add_parser("views", help="view build and interaction latency through a headless session")
+    views.add_argument("--scales", type=int, nargs="+", default=[1000, 10000])
+    views.add_argument("--repeat", type=int, default=5)
+    views.add_argument("--seed", type=int, default=42)
+    views.add_argument("--output")
+    views.set_defaults(func=bench_views)
+
+    writes = sub.add_parser("writes", help="concurrent writers: commit per write vs the writer queue")
+    writes.add_argument("--writers", type=int, nargs="+", default=[8, 32, 64])
+    writes.add_argument("--seconds", type=float, default=3.0)
+    writes.add_argument("--listings", type=int, default=10000)
+    writes.add_argument("--seed", type=int, default=42)
+    writes.set_defaults(func=bench_writes)
+
+    stats_access = sub.add_parser("stats-access", help="/stats through supervisor.py is local only")
+    stats_access.add_argument("--listings", type=int, default=200)
+    stats_access.set_defaults(func=check_stats_access)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""استيراد وتصدير العقارات بشكل جماعي (CSV / JSONL)
+
+التشغيل:
+    python bulk.py import listings.csv [--batch-size 5000] [--restart] [--errors errors.jsonl]
+    python bulk.py export listings.jsonl [--city دمشق]
+    python bulk.py stats [--rebuild]
+
+الاستيراد يقرأ الملف سطراً بسطر، ويتحقق من كل صف، ويدخل الصفوف الصحيحة على دفعات
+كبيرة بمعاملة واحدة لكل دفعة. نقطة الاستئناف تحفظ في قاعدة البيانات مع كل دفعة، لذلك
+إعادة تشغيل نفس الأمر بعد أي فشل تكمل من آخر دفعة محفوظة دون تكرار.
+
+الأعمدة المقبولة: owner أو owner_id، city أو city_id، area، title، description، rent،
+lat، lon، services
+
+stats يفحص تطابق جدول area_stats (الذي تحدثه triggers) مع العقارات الفعلية، و --rebuild
+يعيد حسابه بالكامل إذا وجد اختلاف.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import db
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+class RowError(ValueError):
+    """صف غير صالح في ملف الاستيراد"""
+
+
+def detect_format(path: str, fmt: str = None):
+    if fmt:
+        return fmt
+    return "jsonl" if path.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def read_rows(path: str, fmt: str):
+    """قراءة الصفوف واحداً تلو الآخر مع رقم السطر: (line, dict أو RowError)"""
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_num, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_num, RowError(f"JSON غير صالح: {e.msg}")
+                    continue
+                if not isinstance(row, dict):
+                    yield line_num, RowError("كل سطر يجب أن يكون كائن JSON")
+                    continue
+                yield line_num, row
+
+
+class Resolver:
+    """تحويل أسماء المدن والمالكين إلى معرفات مع ذاكرة مؤقتة طوال الاستيراد"""
+
+    def __init__(self):
+        self.cities_by_name = {}
+        self.city_ids = set()
+        for city in db.get_cities():
+            self.cities_by_name[city["name"]] = city["id"]
+            self.cities_by_name[db.normalize_arabic(city["name"])] = city["id"]
+            self.city_ids.add(city["id"])
+        self.owner_ids = {}
+        self.known_owner_ids = {}
+
+    def city_id(self, row: dict):
+        value = row.get("city_id")
+        if value not in (None, ""):
+            city_id = _to_int(value, "city_id")
+            if city_id not in self.city_ids:
+                raise RowError(f"مدينة غير موجودة: {city_id}")
+            return city_id
+        name = (row.get("city") or "").strip()
+        if not name:
+            raise RowError("المدينة مطلوبة (city أو city_id)")
+        city_id = self.cities_by_name.get(name) or self.cities_by_name.get(db.normalize_arabic(name))
+        if city_id is None:
+            raise RowError(f"مدينة غير معروفة: {name}")
+        return city_id
+
+    def owner_id(self, row: dict):
+        value = row.get("owner_id")
+        if value not in (None, ""):
+            owner_id = _to_int(value, "owner_id")
+            if owner_id not in self.known_owner_ids:
+                self.known_owner_ids[owner_id] = db.user_exists(owner_id)
+            if not self.known_owner_ids[owner_id]:
+                raise RowError(f"مالك غير موجود: {owner_id}")
+            return owner_id
+        username = (row.get("owner") or "").strip()
+        if not username:
+            raise RowError("المالك مطلوب (owner أو owner_id)")
+        if username not in self.owner_ids:
+            self.owner_ids[username] = db.get_user_id_by_username(username)
+        if self.owner_ids[username] is None:
+            raise RowError(f"مالك غير معروف: {username}")
+        return self.owner_ids[username]
+
+
+def _to_int(value, field: str):
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise RowError(f"{field} يجب أن يكون رقماً صحيحاً: {value!r}")
+
+
+def _to_float(value, field: str, low: float, high: float):
+    if value in (None, ""):
+        return None
+    try:
+        number = float(str(value).strip())
+    except ValueError:
+        raise RowError(f"{field} يجب أن يكون رقماً: {value!r}")
+    if not low <= number <= high:
+        raise RowError(f"{field} خارج المجال [{low}, {high}]: {number}")
+    return number
+
+
+def _text(row: dict, field: str):
+    value = row.get(field)
+    return str(value).strip() if value is not None else ""
+
+
+def validate_row(row: dict, resolver: Resolver):
+    """التحقق من صف وتحويله إلى tuple بترتيب db.PROPERTY_COLUMNS"""
+    title = _text(row, "title")
+    if not title:
+        raise RowError("العنوان مطلوب")
+    rent = row.get("rent")
+    rent = _to_int(rent, "rent") if rent not in (None, "") else None
+    if rent is not None and rent < 0:
+        raise RowError(f"الإيجار لا يمكن أن يكون سالباً: {rent}")
+    lat = _to_float(row.get("lat"), "lat", -90.0, 90.0)
+    lon = _to_float(row.get("lon"), "lon", -180.0, 180.0)
+    if (lat is None) != (lon is None):
+        raise RowError("يجب تحديد lat و lon معاً")
+    return (
+        resolver.owner_id(row),
+        resolver.city_id(row),
+        _text(row, "area") or None,
+        title,
+        _text(row, "description"),
+        rent,
+        lat,
+        lon,
+        _text(row, "services"),
+    )
+
+
+def import_file(path: str, fmt: str = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                restart: bool = False, errors_path: str = None, progress=None):
+    """استيراد ملف عقارات على دفعات مع الاستئناف من آخر دفعة محفوظة
+
+    يعيد ملخصاً: {"imported", "errors", "skipped_lines", "seconds"}
+    """
+    source = os.path.abspath(path)
+    fmt = detect_format(path, fmt)
+    if restart:
+        db.clear_import_checkpoint(source)
+
+    checkpoint = db.get_import_checkpoint(source)
+    if checkpoint and checkpoint["done"]:
+        print(f"ℹ️  {path} was already imported ({checkpoint['imported']} rows). Use --restart to import again.")
+        return {"imported": 0, "errors": 0, "skipped_lines": checkpoint["line"], "seconds": 0.0}
+
+    resume_line = checkpoint["line"] if checkpoint else 0
+    imported = checkpoint["imported"] if checkpoint else 0
+    errors = checkpoint["errors"] if checkpoint else 0
+    if resume_line:
+        print(f"⏩ Resuming {path} after line {resume_line} ({imported} rows already imported)")
+
+    resolver = Resolver()
+    errors_file = open(errors_path, "a", encoding="utf-8") if errors_path else None
+    start = time.perf_counter()
+    batch = []
+    line_num = resume_line
+
+    def flush(done=False):
+        nonlocal imported, batch
+        state = {"source": source, "line": line_num, "imported": imported + len(batch),
+                 "errors": errors, "done": done}
+        db.add_properties_bulk(batch, checkpoint=state)
+        imported += len(batch)
+        batch = []
+        if progress:
+            progress(state)
+        else:
+            print(f"📦 {imported} rows imported, {errors} errors (line {line_num})")
+
+    try:
+        for line_num, row in read_rows(path, fmt):
+            if line_num <= resume_line:
+                continue
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                batch.append(validate_row(row, resolver))
+            except RowError as e:
+                errors += 1
+                if errors_file:
+                    errors_file.write(json.dumps({"line": line_num, "error": str(e)}, ensure_ascii=False) + "\n")
+                elif errors <= 10:
+                    print(f"⚠️  line {line_num}: {e}")
+            if len(batch) >= batch_size:
+                flush()
+        flush(done=True)
+    finally:
+        if errors_file:
+            errors_file.close()
+
+    # المناطق الجديدة أنشئت بإحداثيات أول عقار فيها
+    db.refresh_area_centroids()
+
+    seconds = time.perf_counter() - start
+    print(f"✅ Imported {imported} rows from {path} in {seconds:.1f}s ({errors} errors)")
+    return {"imported": imported, "errors": errors, "skipped_lines": resume_line, "seconds": seconds}
+
+
+def export_file(path: str, fmt: str = None, city_id: int = None):
+    """تصدير العقارات إلى CSV أو JSONL بذاكرة ثابتة؛ يعيد عدد الصفوف"""
+    fmt = detect_format(path, fmt)
+    fields = ["id", "owner", "city", "area", "title", "description", "rent", "lat", "lon", "services"]
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields) if fmt == "csv" else None
+        if writer:
+            writer.writeheader()
+        for prop in db.iter_properties_for_export(city_id=city_id):
+            if writer:
+                writer.writerow(prop)
+            else:
+                f.write(json.dumps(prop, ensure_ascii=False) + "\n")
+            count += 1
+    print(f"✅ Exported {count} rows to {path}")
+    return count
+
+
+def check_stats(rebuild: bool = False):
+    """فحص area_stats وإصلاحه عند الطلب؛ يعيد عدد المناطق المختلفة قبل الإصلاح"""
+    mismatches = db.check_area_stats()
+    for m in mismatches[:10]:
+        print(f"⚠️  area {m['area_id']}: expected {m['expected']}, stored {m['actual']}")
+    if not mismatches:
+        print("✅ area_stats matches the listings")
+    elif rebuild:
+        db.rebuild_area_stats()
+        remaining = len(db.check_area_stats())
+        print(f"🔧 Rebuilt area_stats ({len(mismatches)} areas differed, {remaining} after rebuild)")
+    else:
+        print(f"❌ {len(mismatches)} areas differ - run with --rebuild to repair")
+    return len(mismatches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="City Mover bulk import/export")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="stream listings from CSV/JSONL into the database")
+    imp.add_argument("path")
+    imp.add_argument("--format", choices=["csv", "jsonl"])
+    imp.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    imp.add_argument("--restart", action="store_true", help="ignore the saved checkpoint")
+    imp.add_argument("--errors", help="append rejected rows to this JSONL file")
+
+    exp = sub.add_parser("export", help="stream listings to CSV/JSONL")
+    exp.add_argument("path")
+    exp.add_argument("--format", choices=["csv", "jsonl"])
+    exp.add_argument("--city", help="city name to export")
+
+    stats = sub.add_parser("stats", help="check the per-area statistics table")
+    stats.add_argument("--rebuild", action="store_true", help="recompute area_stats from the listings")
+
+    args = parser.parse_args()
+    db.configure_logging()
+    db.init_db()
+
+    if args.command == "import":
+        summary = import_file(args.path, args.format, args.batch_size, args.restart, args.errors)
+        sys.exit(1 if summary["errors"] and not summary["imported"] else 0)
+    elif args.command == "stats":
+        mismatches = check_stats(args.rebuild)
+        sys.exit(1 if mismatches and not args.rebuild else 0)
+    else:
+        city_id = None
+        if args.city:
+            city = next((c for c in db.get_cities() if c["name"] == args.city), None)
+            if city is None:
+                sys.exit(f"❌ Unknown city: {args.city}")
+            city_id = city["id"]
+        export_file(args.path, args.format, city_id)
+
+
+if __name__ == "__main__":
+    main()
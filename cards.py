@@ -0,0 +1,291 @@
+"""بطاقات العقارات، وقائمة افتراضية لا تبني إلا البطاقات الظاهرة، وقائمة مفهرسة تحدث بطاقة واحدة
+
+    template = PropertyCardTemplate(on_map, on_google, on_contact)
+    results = VirtualList(template.build, viewport_height=600, on_end=load_next_page)
+    results.set_items(props)          # أو results.append_items(next_page)
+
+    owned = KeyedCardList(OwnerCardTemplate(on_edit, on_delete).build, empty=empty_card)
+    owned.set_items(first_page)       # مرة عند فتح الواجهة
+    owned.append_items(next_page)     # عرض المزيد: بطاقات الصفحة الجديدة فقط
+    owned.upsert(p)                   # بعد إضافة أو تعديل: بطاقة واحدة تبنى
+    owned.remove(property_id)         # بعد الحذف: لا تبنى أي بطاقة
+
+البطاقة بارتفاع ثابت CARD_HEIGHT ونحو عشرة عناصر، ومعالجات أزرارها مشتركة بين كل
+البطاقات (العقار يعرف من data في الزر) بدل ثلاث دوال لكل بطاقة.
+القائمة تحفظ بيانات كل النتائج لكنها لا تضع في ft.ListView إلا بطاقات النافذة الظاهرة
+(مع هامش)، وقبلها وبعدها مسافتان فارغتان بارتفاع العناصر غير المبنية، فيبقى طول التمرير
+صحيحاً ولا يرسل للعميل إلا ما يظهر.
+"""
+import flet as ft
+
+CARD_HEIGHT = 200
+# بطاقات إضافية تبنى قبل النافذة الظاهرة وبعدها حتى لا يظهر فراغ أثناء التمرير
+OVERSCAN = 4
+# المسافة (بالبكسل) من نهاية القائمة التي يطلب عندها المزيد
+END_THRESHOLD = 3 * CARD_HEIGHT
+
+
+class PropertyCardTemplate:
+    """قالب بطاقة عقار في نتائج البحث: الألوان والمعالجات تحدد مرة لكل واجهة"""
+
+    def __init__(self, on_map, on_google, on_contact, primary="#1E40AF", secondary="#0EA5E9",
+                 success="#10B981", surface="#FFFFFF"):
+        self.on_map = on_map
+        self.on_google = on_google
+        self.on_contact = on_contact
+        self.primary = primary
+        self.secondary = secondary
+        self.success = success
+        self.surface = surface
+
+    def _button(self, text, icon, color, on_click, property_id):
+        return ft.TextButton(text, icon=icon, icon_color=color, on_click=on_click, data=property_id)
+
+    def build(self, p):
+        rent = f"{p['rent']:,} ل.س" if p["rent"] else "الإيجار غير محدد"
+        return ft.Container(
+            content=ft.Column(
+                [
+                    ft.Text(p["title"], size=16, weight=ft.FontWeight.BOLD, color=self.primary,
+                            max_lines=1, overflow=ft.TextOverflow.ELLIPSIS),
+                    ft.Text(f"📍 {p['area'] or 'غير محدد'}  ·  💰 {rent}  ·  👤 {p['owner_username']}", size=13),
+                    ft.Text(p["description"] or "", size=13, color=ft.Colors.GREY_700,
+                            max_lines=2, overflow=ft.TextOverflow.ELLIPSIS),
+                    ft.Text(f"الخدمات القريبة: {p['services'] or 'غير مذكورة'}", size=12, color=ft.Colors.GREY_600,
+                            max_lines=1, overflow=ft.TextOverflow.ELLIPSIS),
+                    ft.Row(
+                        [
+                            self._button("الخريطة", ft.Icons.MAP, self.secondary, self.on_map, p["id"]),
+                            self._button("جوجل", ft.Icons.OPEN_IN_NEW, self.primary, self.on_google, p["id"]),
+                            self._button("تواصل", ft.Icons.CONTACT_PHONE, self.success, self.on_contact, p["id"]),
+                        ],
+                        alignment=ft.MainAxisAlignment.CENTER,
+                        spacing=0,
+                    ),
+                ],
+                spacing=6,
+            ),
+            height=CARD_HEIGHT - 12,
+            padding=12,
+            margin=ft.margin.symmetric(vertical=6, horizontal=8),
+            border_radius=12,
+            bgcolor=self.surface,
+            border=ft.border.all(1, ft.Colors.GREY_200),
+        )
+
+
+class VirtualList:
+    """ft.ListView بعناصر ثابتة الارتفاع لا تبنى بطاقاتها إلا داخل النافذة الظاهرة"""
+
+    def __init__(self, build_item, viewport_height: float, item_height: float = CARD_HEIGHT,
+                 overscan: int = OVERSCAN, on_end=None):
+        self.build_item = build_item
+        self.item_height = item_height
+        self.viewport_height = viewport_height
+        self.overscan = overscan
+        self.on_end = on_end
+        self.items = []
+        self.by_id = {}
+        self._built = {}
+        self._window = (0, 0)
+        self._first = 0
+        self._top = ft.Container(height=0)
+        self._bottom = ft.Container(height=0)
+        self.view = ft.ListView(
+            controls=[self._top, self._bottom],
+            height=viewport_height,
+            spacing=0,
+            on_scroll=self._on_scroll,
+            on_scroll_interval=50,
+        )
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def built(self):
+        """عدد البطاقات المبنية حالياً"""
+        return len(self._built)
+
+    def _visible_window(self, first: int):
+        visible = int(self.viewport_height // self.item_height) + 1
+        start = max(0, first - self.overscan)
+        end = min(len(self.items), first + visible + self.overscan)
+        return start, end
+
+    def _render(self):
+        """وضع بطاقات النافذة بين المسافتين؛ البطاقات التي بقيت في النافذة لا يعاد بناؤها"""
+        start, end = self._window = self._visible_window(self._first)
+        built = {}
+        for i in range(start, end):
+            built[i] = self._built.get(i) or self.build_item(self.items[i])
+        self._built = built
+        self._top.height = start * self.item_height
+        self._bottom.height = (len(self.items) - end) * self.item_height
+        self.view.controls = [self._top, *(built[i] for i in range(start, end)), self._bottom]
+
+    def set_items(self, items):
+        """استبدال كل العناصر والعودة إلى أول القائمة (يتبعه update)"""
+        self.items = list(items)
+        self.by_id = {item["id"]: item for item in self.items}
+        self._built = {}
+        self._first = 0
+        self._render()
+        if self.view.page:
+            self.view.scroll_to(offset=0, duration=0)
+
+    def append_items(self, items):
+        """إلحاق عناصر (صفحة تالية) دون إعادة بناء البطاقات الظاهرة"""
+        for item in items:
+            self.items.append(item)
+            self.by_id[item["id"]] = item
+        self._render()
+
+    def show_message(self, control):
+        """عرض عنصر واحد (رسالة) بدل النتائج"""
+        self.items = []
+        self.by_id = {}
+        self._built = {}
+        self._first = 0
+        self._window = (0, 0)
+        self._top.height = self._bottom.height = 0
+        self.view.controls = [self._top, control, self._bottom]
+
+    def scroll_to_index(self, first: int):
+        """نقل النافذة بحيث يكون العنصر first أول الظاهر؛ يعيد True إذا تغيرت البطاقات المبنية"""
+        self._first = max(0, min(first, len(self.items) - 1))
+        if self._visible_window(self._first) == self._window:
+            return False
+        self._render()
+        return True
+
+    def _on_scroll(self, e: ft.OnScrollEvent):
+        if self.scroll_to_index(int(e.pixels // self.item_height)):
+            self.view.update()
+        if self.on_end and self.items and e.max_scroll_extent - e.pixels < END_THRESHOLD:
+            self.on_end()
+
+
+class OwnerCardTemplate:
+    """قالب بطاقة عقار في لوحة المالك مع زري التعديل والحذف"""
+
+    def __init__(self, on_edit, on_delete, primary="#1E40AF", success="#10B981", error="#EF4444",
+                 surface="#FFFFFF"):
+        self.on_edit = on_edit
+        self.on_delete = on_delete
+        self.primary = primary
+        self.success = success
+        self.error = error
+        self.surface = surface
+
+    def build(self, p):
+        rent = f"{p['rent']:,} ل.س" if p["rent"] else "الإيجار غير محدد"
+        title = [ft.Text(p["title"], size=16, weight=ft.FontWeight.BOLD, color=self.primary, expand=True,
+                         max_lines=1, overflow=ft.TextOverflow.ELLIPSIS)]
+        if p["area_active"]:
+            title.append(ft.Container(
+                content=ft.Text("✓ مفعل", size=12, color="white"),
+                bgcolor=self.success,
+                padding=ft.padding.symmetric(horizontal=8, vertical=4),
+                border_radius=20,
+            ))
+        return ft.Container(
+            content=ft.Column(
+                [
+                    ft.Row(title),
+                    ft.Text(f"🏙️ {p['city_name'] or ''}  ·  📍 {p['area'] or 'غير محدد'}  ·  💰 {rent}", size=13),
+                    ft.Text(p["description"] or "", size=13, color=ft.Colors.GREY_700,
+                            max_lines=2, overflow=ft.TextOverflow.ELLIPSIS),
+                    ft.Text(f"الخدمات القريبة: {p['services'] or 'غير مذكورة'}", size=12, color=ft.Colors.GREY_600),
+                    ft.Row(
+                        [
+                            ft.TextButton("تعديل البيانات", icon=ft.Icons.EDIT, icon_color=self.primary,
+                                          on_click=self.on_edit, data=p["id"]),
+                            ft.TextButton("حذف", icon=ft.Icons.DELETE_OUTLINE, icon_color=self.error,
+                                          on_click=self.on_delete, data=p["id"]),
+                        ],
+                        alignment=ft.MainAxisAlignment.CENTER,
+                    ),
+                ],
+                spacing=6,
+            ),
+            padding=12,
+            margin=ft.margin.symmetric(vertical=6, horizontal=8),
+            border_radius=12,
+            bgcolor=self.surface,
+            border=ft.border.all(1, ft.Colors.GREY_200),
+        )
+
+
+class KeyedCardList:
+    """عمود بطاقات مفهرس بمعرف العقار (الأحدث أولاً)
+
+    الإضافة والتعديل والحذف تغير بطاقة واحدة في مكانها ثم تستدعي update() للعمود وحده،
+    فيرسل Flet البطاقة المتغيرة فقط بدل القائمة كلها.
+    """
+
+    def __init__(self, build_card, empty=None, spacing: float = 15):
+        self.build_card = build_card
+        self.empty = empty
+        self.cards = {}
+        # عدد البطاقات المبنية منذ الإنشاء (لقياس كلفة كل تعديل)
+        self.built = 0
+        self.loaded = False
+        self.view = ft.Column(spacing=spacing)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def _build(self, item):
+        self.built += 1
+        return self.build_card(item)
+
+    def _show_empty(self):
+        if self.empty and not self.cards:
+            self.view.controls = [self.empty()]
+
+    def _update(self):
+        if self.view.page:
+            self.view.update()
+
+    def set_items(self, items):
+        """بناء بطاقات الصفحة الأولى (عند فتح الواجهة)"""
+        self.cards = {item["id"]: self._build(item) for item in items}
+        self.view.controls = list(self.cards.values())
+        self._show_empty()
+        self.loaded = True
+        self._update()
+
+    def append_items(self, items):
+        """إلحاق بطاقات صفحة تالية في آخر العمود (العقارات المعروضة مسبقاً لا تكرر)"""
+        added = [item for item in items if item["id"] not in self.cards]
+        if not added:
+            return
+        if not self.cards:
+            self.view.controls.clear()
+        for item in added:
+            card = self.cards[item["id"]] = self._build(item)
+            self.view.controls.append(card)
+        self._update()
+
+    def upsert(self, item):
+        """استبدال بطاقة عقار معدل في مكانها، أو إضافة عقار جديد في أول القائمة"""
+        card = self._build(item)
+        old = self.cards.get(item["id"])
+        if old is not None:
+            self.view.controls[self.view.controls.index(old)] = card
+        else:
+            if not self.cards:
+                self.view.controls.clear()
+            self.view.controls.insert(0, card)
+        self.cards[item["id"]] = card
+        self._update()
+
+    def remove(self, item_id):
+        card = self.cards.pop(item_id, None)
+        if card is None:
+            return False
+        self.view.controls.remove(card)
+        self._show_empty()
+        self._update()
+        return True
@@ -0,0 +1,111 @@
+"""تجميع علامات الخريطة على شبكة لكل مستوى تكبير (على طريقة supercluster)
+
+يبنى الفهرس مرة واحدة لكل مجموعة نقاط (عقارات مدينة أو منطقة):
+
+    index = ClusterIndex(points)              # [(id, lat, lon, title), ...]
+    for c in index.clusters(bounds, zoom):    # bounds = (min_lat, min_lon, max_lat, max_lon)
+        ...                                   # c.count == 1 عقار منفرد، وإلا مجموعة
+
+لكل مستوى تكبير من max_zoom نزولاً إلى min_zoom تجمع مجموعات المستوى الأعلى في خلايا
+شبكة عرضها radius_px بكسل، فالبناء O(n) للمستوى الأعمق ثم تتناقص الكلفة مع كل مستوى.
+فوق max_zoom تعرض العقارات منفردة. الاستعلام بحث ثنائي على x ثم تصفية y.
+"""
+import bisect
+import math
+
+import geo
+
+DEFAULT_RADIUS_PX = 60
+DEFAULT_MIN_ZOOM = 5
+DEFAULT_MAX_ZOOM = 16
+
+
+class Cluster:
+    """مجموعة عقارات (أو عقار منفرد إذا count == 1) في مستوى تكبير واحد"""
+
+    __slots__ = ("x", "y", "count", "id", "title", "expansion_zoom")
+
+    def __init__(self, x: float, y: float, count: int = 1, id: int = None, title: str = None,
+                 expansion_zoom: int = None):
+        self.x = x
+        self.y = y
+        self.count = count
+        self.id = id
+        self.title = title
+        # أول مستوى تكبير تنقسم فيه المجموعة (للتكبير عند الضغط عليها)
+        self.expansion_zoom = expansion_zoom
+
+    @property
+    def lat(self):
+        return geo.mercator_latlon(self.x, self.y)[0]
+
+    @property
+    def lon(self):
+        return geo.mercator_latlon(self.x, self.y)[1]
+
+
+class ClusterIndex:
+    """مجموعات كل مستويات التكبير لمجموعة نقاط ثابتة"""
+
+    def __init__(self, points, radius_px: int = DEFAULT_RADIUS_PX,
+                 min_zoom: int = DEFAULT_MIN_ZOOM, max_zoom: int = DEFAULT_MAX_ZOOM):
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.radius_px = radius_px
+        level = []
+        for point_id, lat, lon, title in points:
+            if lat is None or lon is None:
+                continue
+            x, y = geo.mercator_xy(lat, lon)
+            level.append(Cluster(x, y, 1, point_id, title))
+        self.size = len(level)
+        self._levels = {max_zoom + 1: self._sorted(level)}
+        for zoom in range(max_zoom, min_zoom - 1, -1):
+            level = self._cluster(level, zoom)
+            self._levels[zoom] = self._sorted(level)
+
+    @staticmethod
+    def _sorted(level):
+        level.sort(key=lambda c: c.x)
+        return level, [c.x for c in level]
+
+    def _cluster(self, children, zoom: int):
+        """دمج مجموعات المستوى zoom + 1 الواقعة في نفس خلية الشبكة"""
+        cell = self.radius_px / (geo.TILE_SIZE * 2 ** zoom)
+        cells = {}
+        for c in children:
+            cells.setdefault((int(c.x / cell), int(c.y / cell)), []).append(c)
+        level = []
+        for members in cells.values():
+            if len(members) == 1:
+                level.append(members[0])
+                continue
+            count = sum(m.count for m in members)
+            level.append(Cluster(
+                sum(m.x * m.count for m in members) / count,
+                sum(m.y * m.count for m in members) / count,
+                count,
+                expansion_zoom=zoom + 1,
+            ))
+        return level
+
+    def zoom_bucket(self, zoom: float):
+        """مستوى الفهرس المستخدم لتكبير الخريطة zoom (العلامات لا تتغير داخل نفس المستوى)"""
+        return min(max(int(math.floor(zoom)), self.min_zoom), self.max_zoom + 1)
+
+    def clusters(self, bounds, zoom: float):
+        """المجموعات الواقعة داخل المستطيل بمستوى التكبير zoom"""
+        level, xs = self._levels[self.zoom_bucket(zoom)]
+        min_lat, min_lon, max_lat, max_lon = bounds
+        x0, y1 = geo.mercator_xy(min_lat, min_lon)
+        x1, y0 = geo.mercator_xy(max_lat, max_lon)
+        start = bisect.bisect_left(xs, x0)
+        end = bisect.bisect_right(xs, x1)
+        return [c for c in level[start:end] if y0 <= c.y <= y1]
+
+    def count(self, zoom: float):
+        """عدد المجموعات في مستوى التكبير zoom (لكل النقاط)"""
+        return len(self._levels[self.zoom_bucket(zoom)][0])
+
+    def __len__(self):
+        return self.size
@@ -0,0 +1,130 @@
+"""مولد بيانات تجريبية قابل للتكرار (seed) لقياس الأداء
+
+التشغيل:
+    python datagen.py --users 1000 --properties 100000 [--seed 42]
+
+يستخدم قاعدة البيانات التي يحددها db.get_db_path (أو CITY_MOVER_DB).
+"""
+import argparse
+import math
+import random
+import time
+
+import db
+from areas import CITY_CENTERS
+
+# نسبة الإعلانات لكل مدينة (دمشق وريفها وحلب أكثر كثافة)
+CITY_WEIGHTS = {
+    "دمشق": 30, "ريف دمشق": 12, "حلب": 14, "حمص": 8, "اللاذقية": 8, "حماة": 5,
+    "طرطوس": 5, "سويدا": 3, "درعا": 3, "إدلب": 3, "دير الزور": 3,
+    "الحسكة": 2, "الرقة": 2, "القنيطرة": 1,
+}
+
+# متوسط الإيجار الشهري (ل.س) لكل مدينة - التوزيع لوغاريتمي طبيعي حوله
+CITY_MEDIAN_RENT = {"دمشق": 2_500_000, "ريف دمشق": 1_200_000, "حلب": 1_500_000, "اللاذقية": 1_800_000}
+DEFAULT_MEDIAN_RENT = 900_000
+
+GENERIC_AREAS = [
+    "المركز", "الحي الشرقي", "الحي الغربي", "الحي الشمالي", "الحي الجنوبي",
+    "المدينة الجديدة", "المحطة", "الجامعة", "الصناعة", "الكورنيش",
+]
+
+TITLE_WORDS = ["شقة", "منزل", "بيت عربي", "استوديو", "فيلا", "ملحق"]
+TITLE_DETAILS = ["مفروشة", "غير مفروشة", "طابق أرضي", "طابق ثاني", "مع حديقة", "مع شرفة", "إطلالة رائعة"]
+DESCRIPTION_WORDS = [
+    "غرفتين", "ثلاث غرف", "صالون واسع", "مطبخ حديث", "حمامين", "تدفئة مركزية", "مصعد",
+    "طاقة شمسية", "كسوة ممتازة", "منطقة هادئة", "اتجاه شرقي", "مساحة 120 متر",
+]
+SERVICES = ["سوبرماركت", "مدرسة", "مشفى", "صيدلية", "جامع", "فرن", "مواصلات", "جامعة", "حديقة عامة"]
+
+
+def city_areas(city: dict, rng: random.Random):
+    """مناطق المدينة (من جدول areas، أو مناطق عامة) مع مركز كل منطقة (ثابت لنفس الـ seed)"""
+    center_lat, center_lon = CITY_CENTERS.get(city["name"], (34.8, 38.9))
+    facets = sorted(db.get_area_facets(city["id"]), key=lambda f: f["area_id"])
+    names = [f["area"] for f in facets] or GENERIC_AREAS
+    areas = []
+    for name in names:
+        # المناطق موزعة حول مركز المدينة ضمن ~8 كم
+        angle = rng.uniform(0, 2 * math.pi)
+        distance = abs(rng.gauss(0, 0.04))
+        areas.append((name, center_lat + distance * math.sin(angle), center_lon + distance * math.cos(angle)))
+    return areas
+
+
+def _area_weights(city: dict, areas):
+    """المناطق المفعلة والمركزية أكثر كثافة (توزيع Zipf تقريبي)"""
+    active = {f["area"] for f in db.get_area_facets(city["id"]) if f["active"]}
+    weights = []
+    for rank, (name, _, _) in enumerate(areas, start=1):
+        weight = 1.0 / rank
+        if name in active:
+            weight *= 10
+        weights.append(weight)
+    return weights
+
+
+def generate(users: int, properties: int, seed: int = 42, batch_size: int = 5000, progress=None):
+    """إضافة users مستخدم و properties عقار إلى قاعدة البيانات الحالية"""
+    rng = random.Random(seed)
+    start = time.perf_counter()
+
+    # ثلث المستخدمين مالكون
+    owners = max(1, users // 3)
+    user_rows = [(f"owner{seed}_{i}", "123456", "owner") for i in range(owners)]
+    user_rows += [(f"user{seed}_{i}", "123456", "user") for i in range(users - owners)]
+    db.create_users_bulk(user_rows)
+    owner_ids = [db.get_user_id_by_username(name) for name, _, _ in user_rows[:owners]]
+    # قلة من المالكين (مكاتب عقارية) تملك معظم الإعلانات
+    owner_weights = [1.0 / (i + 1) ** 0.8 for i in range(len(owner_ids))]
+
+    cities = db.get_cities()
+    city_weights = [CITY_WEIGHTS.get(c["name"], 1) for c in cities]
+    areas_by_city = {c["id"]: city_areas(c, rng) for c in cities}
+    area_weights = {c["id"]: _area_weights(c, areas_by_city[c["id"]]) for c in cities}
+    medians = {c["id"]: CITY_MEDIAN_RENT.get(c["name"], DEFAULT_MEDIAN_RENT) for c in cities}
+
+    batch = []
+    for i in range(properties):
+        city = rng.choices(cities, city_weights)[0]
+        area, area_lat, area_lon = rng.choices(areas_by_city[city["id"]], area_weights[city["id"]])[0]
+        has_location = rng.random() < 0.9
+        rent = int(rng.lognormvariate(math.log(medians[city["id"]]), 0.5) // 10_000 * 10_000)
+        batch.append((
+            rng.choices(owner_ids, owner_weights)[0],
+            city["id"],
+            area,
+            f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_DETAILS)} في {area}",
+            "، ".join(rng.sample(DESCRIPTION_WORDS, 4)),
+            rent if rng.random() < 0.95 else None,
+            rng.gauss(area_lat, 0.006) if has_location else None,
+            rng.gauss(area_lon, 0.006) if has_location else None,
+            "، ".join(rng.sample(SERVICES, 3)),
+        ))
+        if len(batch) >= batch_size:
+            db.add_properties_bulk(batch)
+            batch = []
+            if progress:
+                progress(i + 1)
+    db.add_properties_bulk(batch)
+    db.refresh_area_centroids()
+
+    seconds = time.perf_counter() - start
+    print(f"🎲 Generated {users} users and {properties} properties in {seconds:.1f}s (seed {seed})")
+    return {"owner_ids": owner_ids, "seconds": seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="City Mover synthetic data generator")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--properties", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    db.configure_logging()
+    db.init_db()
+    generate(args.users, args.properties, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,40 @@
 import sqlite3
+import atexit
+import logging
+import math
 import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 from pathlib import Path  
 
+import geo
+import profiler
+from areas import DEFAULT_ACTIVE_AREAS, DEFAULT_AREAS
+
+logger = logging.getLogger("city_mover.db")
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+# إعدادات الاتصال - تطبق مرة واحدة عند فتح كل اتصال جديد
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 8192
+MMAP_SIZE = 64 * 1024 * 1024
+STATEMENT_CACHE_SIZE = 256
+MAX_IDLE_CONNECTIONS = 8
+
 def get_db_path():
     """الحصول على مسار قاعدة البيانات المناسب لكل منصة"""
     try:
+        # مسار مخصص (للاختبارات وقياس الأداء)
+        custom_path = os.environ.get('CITY_MOVER_DB')
+        if custom_path:
+            logger.info("🧪 Custom DB path: %s", custom_path)
+            return custom_path
+
         # محاولة اكتشاف نظام الأندرويد باستخدام متغيرات البيئة
         android_runtime = os.environ.get('ANDROID_RUNTIME')
         android_data = os.environ.get('ANDROID_DATA')
@@ -13,31 +43,33 @@ def get_db_path():
         if android_runtime or android_data:
             # على Android - استخدام مسار التخزين الداخلي
             # هذا المسار يعمل مع معظم تطبيقات الأندرويد
-            if 'PYKINATOR' in os.environ or 'PYTHONPATH' in os.environ:
+            if os.environ.get('FLET_APP_STORAGE_DATA'):
+                # تطبيق مبني بـ flet build: مجلد البيانات الخاص بالتطبيق
+                db_path = str(Path(os.environ['FLET_APP_STORAGE_DATA']) / "city_app.db")
+            elif 'PYKINATOR' in os.environ or 'PYTHONPATH' in os.environ:
                 # لـ Pydroid
                 db_path = "/storage/emulated/0/city_app.db"
             else:
                 # مسار افتراضي للأندرويد
                 db_path = "/data/data/com.example.citymover/databases/city_app.db"
             
-            print(f"📱 Android DB path: {db_path}")
+            logger.info("📱 Android DB path: %s", db_path)
             return db_path
         else:
             # على أجهزة أخرى (Windows, Linux, macOS)
             db_path = str(Path(__file__).parent / "city_app.db")
-            print(f"💻 Desktop DB path: {db_path}")
+            logger.info("💻 Desktop DB path: %s", db_path)
             return db_path
             
     except Exception as e:
-        print(f"⚠️  Using fallback DB path: {e}")
+        logger.warning("⚠️  Using fallback DB path: %s", e)
         # إذا فشل كل شيء، استخدم المسار الحالي
         return str(Path(__file__).parent / "city_app.db")
 
-def get_connection():
-    """إنشاء اتصال بقاعدة البيانات"""
+def resolve_db_path():
+    """تحديد مسار قاعدة البيانات والتأكد من وجود المجلد"""
     db_path = get_db_path()
-    print(f"🔗 Connecting to database: {db_path}")
-    
+
     # التأكد من وجود المجلد
     try:
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
@@ -45,223 +77,1696 @@ def get_connection():
         # إذا فشل إنشاء المجلد، استخدم المسار الحالي
         db_path = str(Path(__file__).parent / "city_app.db")
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    
-    conn = sqlite3.connect(db_path)
+
+    return db_path
+
+class PooledConnection(sqlite3.Connection):
+    """اتصال طويل العمر: close() تعيده إلى المجمع بدلاً من إغلاقه"""
+
+    pool = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def close_now(self):
+        super().close()
+
+class ProfilingConnection(PooledConnection):
+    """اتصال مجمع يقيس كل عبارة - يستخدم فقط عند تفعيل محلل الاستعلامات"""
+
+    query_profiler = None
+
+    def cursor(self, factory=profiler.ProfilingCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def _readonly_uri(db_path: str):
+    return Path(db_path).resolve().as_uri() + "?mode=ro"
+
+def _open_connection(db_path: str, readonly: bool = False):
+    """اتصال جديد بإعدادات التطبيق؛ readonly: اتصال قراءة فقط عبر URI (mode=ro)"""
+    query_profiler = _profiler
+    factory = ProfilingConnection if query_profiler else PooledConnection
+    options = dict(factory=factory, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+    conn = None
+    if readonly:
+        try:
+            conn = sqlite3.connect(_readonly_uri(db_path), uri=True, **options)
+        except sqlite3.OperationalError as e:
+            # SQLite قديم أو مجلد لا يسمح بإنشاء ملف -shm: اتصال عادي يمنع الكتابة بنفسه
+            logger.warning("⚠️  Read-only URI failed (%s), using query_only connection", e)
+    if conn is None:
+        conn = sqlite3.connect(db_path, **options)
+    conn.query_profiler = query_profiler
     conn.row_factory = sqlite3.Row
+    register_functions(conn)
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    if readonly:
+        conn.execute("PRAGMA query_only=1")
+    else:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
     return conn
 
-def init_db():
-    """إنشاء الجداول الأساسية إذا لم تكن موجودة."""
+class ConnectionPool:
+    """مجمع اتصالات قراءة يراعي الخيوط: لكل خيط اتصال واحد محجوز أثناء الاستخدام
+
+    الاتصالات للقراءة فقط؛ كل التعديلات تمر بخيط الكاتب (write) حتى لا تتنافس الخيوط
+    على قفل الكتابة الوحيد في SQLite.
+    """
+
+    def __init__(self, db_path: str, max_idle: int = MAX_IDLE_CONNECTIONS, readonly: bool = True):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._idle = []
+        self._local = threading.local()
+        self.opened = 0
+
+    def _open(self):
+        logger.info("🔗 Connecting to database: %s%s", self.db_path, " (read-only)" if self.readonly else "")
+        conn = _open_connection(self.db_path, self.readonly)
+        conn.pool = self
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def acquire(self):
+        """حجز اتصال للخيط الحالي (الاستدعاءات المتداخلة تعيد نفس الاتصال)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.depth += 1
+            return conn
+
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._open()
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        """إعادة الاتصال إلى المجمع عند انتهاء آخر استخدام له في الخيط"""
+        if getattr(self._local, "conn", None) is not conn:
+            return
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._local.conn = None
+
+        # لا نعيد اتصالاً فيه معاملة مفتوحة
+        if conn.in_transaction:
+            conn.rollback()
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.pool = None
+        conn.close_now()
+
+    def close_all(self):
+        """إغلاق جميع الاتصالات الخاملة"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.pool = None
+            conn.close_now()
+
+# ---------- الكاتب الوحيد ----------
+# SQLite يسمح بكاتب واحد في كل لحظة. بدل أن تتنافس الخيوط على القفل (وتنام في
+# busy_timeout)، تدخل التعديلات طابوراً يخدمه خيط واحد: يأخذ كل ما تجمع فيه (حتى
+# WRITE_BATCH_MAX) وينفذه في معاملة واحدة بـ COMMIT واحد. كل تعديل داخل SAVEPOINT خاص
+# به، ففشله يعود لصاحبه وحده ولا يلغي باقي الدفعة.
+
+WRITE_BATCH_MAX = 64
+
+class WriteQueue:
+    """خيط الكاتب لقاعدة بيانات واحدة، مع اتصال القراءة والكتابة الوحيد في العملية"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._jobs = queue.SimpleQueue()
+        # يفتح هنا لا في الخيط: ينشئ الملف ويضبط WAL قبل أن تفتح اتصالات القراءة
+        self._conn = _open_connection(db_path)
+        self._data_version = self._read_data_version()
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.largest_batch = 0
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, job, *args, **kwargs):
+        """جدولة job(conn, *args, **kwargs) في الدفعة التالية؛ Future بما تعيده أو باستثنائها"""
+        future = Future()
+        if threading.current_thread() is self._thread:
+            # تعديل يستدعي تعديلاً آخر: ينفذ فوراً ضمن نفس المعاملة (الانتظار هنا قفل دائم)
+            try:
+                future.set_result(job(self._conn, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        self._jobs.put((job, args, kwargs, future))
+        return future
+
+    def close(self):
+        """إنهاء الخيط بعد تنفيذ ما في الطابور ثم إغلاق الاتصال"""
+        self._jobs.put(None)
+        self._thread.join()
+        self._conn.close_now()
+
+    def _read_data_version(self):
+        try:
+            row = self._conn.execute("SELECT version FROM data_changes WHERE id = 1").fetchone()
+        except sqlite3.OperationalError:
+            return None  # قبل الترحيل 9
+        return row[0] if row else None
+
+    def _run(self):
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            while len(batch) < WRITE_BATCH_MAX:
+                try:
+                    item = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+            if stopping:
+                return
+
+    def _commit(self, batch):
+        conn = self._conn
+        if conn.query_profiler is not _profiler:
+            # تفعيل المحلل أو إيقافه يغير نوع الاتصال
+            conn.close_now()
+            conn = self._conn = _open_connection(self.db_path)
+        done = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for job, args, kwargs, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT write_job")
+                try:
+                    done.append((future, job(conn, *args, **kwargs), None))
+                    conn.execute("RELEASE write_job")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_job")
+                    conn.execute("RELEASE write_job")
+                    done.append((future, None, e))
+            conn.commit()
+        except Exception as e:
+            # فشل المعاملة نفسها (قفل من عملية أخرى بعد busy_timeout، قرص ممتلئ...)
+            if conn.in_transaction:
+                conn.rollback()
+            logger.error("❌ Write batch of %d failed: %s", len(batch), e)
+            self.failed += len(batch)
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        # الذواكر تبطل قبل إعادة النتائج، فمن ينتظر تعديله يقرأ البيانات الجديدة بعده
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._data_version = version
+            invalidate_city_cache()
+            invalidate_area_facets()
+        self.batches += 1
+        self.writes += len(done)
+        self.failed += sum(1 for _, _, error in done if error is not None)
+        self.largest_batch = max(self.largest_batch, len(done))
+        for future, value, error in done:
+            if error is None:
+                future.set_result(value)
+            else:
+                future.set_exception(error)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "writes": self.writes,
+            "failed": self.failed,
+            "largest_batch": self.largest_batch,
+            "avg_batch": round(self.writes / self.batches, 2) if self.batches else 0,
+            "queued": self._jobs.qsize(),
+        }
+
+_pool = None
+_writer = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """مجمع اتصالات القراءة الخاص بالعملية (يحدد المسار مرة واحدة فقط)"""
+    global _pool, _writer
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                db_path = resolve_db_path()
+                _writer = WriteQueue(db_path)
+                _pool = ConnectionPool(db_path)
+    return _pool
+
+def get_writer():
+    """خيط الكاتب لقاعدة البيانات الحالية"""
+    get_pool()
+    return _writer
+
+def write(job, *args, **kwargs):
+    """تنفيذ job(conn, *args, **kwargs) في خيط الكاتب ضمن الدفعة التالية
+
+    يعيد concurrent.futures.Future: النتيجة بعد COMMIT، أو استثناء job (أو المعاملة).
+    job لا تستدعي commit ولا rollback؛ await asyncio.wrap_future(...) من حلقة الأحداث.
+    """
+    return get_writer().submit(job, *args, **kwargs)
+
+def write_stats():
+    """عدد الدفعات والتعديلات ومتوسط حجم الدفعة في خيط الكاتب"""
+    return get_writer().stats()
+
+@contextmanager
+def _write_connection():
+    """اتصال قراءة وكتابة مستقل للتهيئة والترحيلات (خارج طابور الكاتب)"""
+    conn = _open_connection(get_pool().db_path)
     try:
-        conn = get_connection()
-        cur = conn.cursor()
+        yield conn
+    finally:
+        conn.close_now()
 
-        # جدول المستخدمين
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                role TEXT NOT NULL CHECK(role IN ('user', 'owner', 'admin')),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
+def close_pool():
+    """إغلاق المجمع وخيط الكاتب؛ الاستدعاء التالي سيعيد تحديد مسار قاعدة البيانات"""
+    global _pool, _writer, _bootstrapped
+    with _pool_lock:
+        pool, _pool = _pool, None
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
+    if pool is not None:
+        pool.close_all()
+    # البيانات المخزنة تخص قاعدة البيانات السابقة
+    _bootstrapped = False
+    _virtual_tables.clear()
+    city_cache.invalidate()
+    area_facet_cache.invalidate()
+
+def get_connection():
+    """الحصول على اتصال قراءة من المجمع - استدعاء close() يعيده إلى المجمع"""
+    return get_pool().acquire()
+
+@contextmanager
+def connection():
+    """اتصال قراءة من المجمع يعاد تلقائياً عند الخروج من الكتلة"""
+    conn = get_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+# ---------- السجل ومحلل الاستعلامات ----------
+
+def configure_logging(level=None):
+    """إعداد السجل للتطبيق وأدوات سطر الأوامر (المستوى من CITY_MOVER_LOG_LEVEL، الافتراضي INFO)"""
+    level = level or os.environ.get("CITY_MOVER_LOG_LEVEL", "INFO")
+    logging.basicConfig(level=level.upper() if isinstance(level, str) else level, format=LOG_FORMAT)
+
+_profiler = None
+
+def enable_profiling(slow_ms: float = None):
+    """تفعيل محلل الاستعلامات؛ الاتصالات الخاملة تغلق لتفتح من جديد بمؤشرات مقاسة"""
+    global _profiler
+    if slow_ms is None:
+        slow_ms = float(os.environ.get("CITY_MOVER_SLOW_MS", profiler.DEFAULT_SLOW_MS))
+    if _profiler is None:
+        _profiler = profiler.Profiler(slow_ms)
+    _profiler.slow_ms = slow_ms
+    if _pool is not None:
+        _pool.close_all()
+    logger.info("⏱️  Query profiling enabled (slow >= %.0f ms)", slow_ms)
+    return _profiler
+
+def disable_profiling():
+    """إيقاف المحلل والعودة إلى الاتصالات العادية؛ يعيد المحلل بإحصائياته"""
+    global _profiler
+    query_profiler, _profiler = _profiler, None
+    if _pool is not None:
+        _pool.close_all()
+    return query_profiler
+
+def get_profiler():
+    """المحلل الحالي، أو None إذا كان معطلاً"""
+    return _profiler
+
+def profile_report(limit: int = 20):
+    """تقرير نصي بأكثر الاستعلامات استهلاكاً للوقت"""
+    if _profiler is None:
+        return "Query profiling is disabled (set CITY_MOVER_PROFILE=1)"
+    return _profiler.report(limit)
+
+def _save_profile():
+    if _profiler is not None:
+        _profiler.save(os.environ["CITY_MOVER_PROFILE_OUT"])
+
+if os.environ.get("CITY_MOVER_PROFILE"):
+    enable_profiling()
+    if os.environ.get("CITY_MOVER_PROFILE_OUT"):
+        atexit.register(_save_profile)
+
+# ---------- ذاكرة مؤقتة للبيانات المرجعية (المدن) ----------
+
+class CityCache:
+    """جدول المدن في الذاكرة، مشترك بين كل جلسات Flet في العملية"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cities = None
+        self._by_id = {}
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        with connection() as conn:
+            rows = conn.execute("SELECT id, name FROM cities ORDER BY name").fetchall()
+        cities = [{"id": r[0], "name": r[1]} for r in rows]
+        logger.debug("🏙️  Loaded %d cities into cache", len(cities))
+        return cities
+
+    def get_all(self):
+        """جميع المدن مرتبة بالاسم (تحمل من قاعدة البيانات عند أول طلب فقط)"""
+        with self._lock:
+            if self._cities is not None:
+                self.hits += 1
+                return self._cities
+            self.misses += 1
+            version = self.version
+
+        cities = self._load()
+        with self._lock:
+            # لا نخزن نتيجة قديمة إذا تم الإبطال أثناء التحميل
+            if version == self.version:
+                self._cities = cities
+                self._by_id = {c["id"]: c for c in cities}
+        return cities
+
+    def get(self, city_id: int):
+        """مدينة واحدة حسب المعرف، أو None إذا لم تكن موجودة"""
+        with self._lock:
+            if self._cities is not None:
+                self.hits += 1
+                return self._by_id.get(city_id)
+        for city in self.get_all():
+            if city["id"] == city_id:
+                return city
+        return None
+
+    def invalidate(self):
+        """إبطال الذاكرة بعد أي تعديل على جدول المدن"""
+        with self._lock:
+            self._cities = None
+            self._by_id = {}
+            self.version += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._by_id),
+            }
+
+city_cache = CityCache()
+
+def invalidate_city_cache():
+    """إبطال ذاكرة المدن (يجب استدعاؤها بعد تعديل جدول cities)"""
+    city_cache.invalidate()
+
+def city_cache_stats():
+    """عدادات الإصابة والإخفاق ورقم إصدار ذاكرة المدن"""
+    return city_cache.stats()
+
+# ---------- تطبيع النص العربي للبحث ----------
+# توحيد أشكال الألف والهمزة والتاء المربوطة والألف المقصورة، حذف التشكيل والتطويل،
+# ونزع أداة التعريف وما يسبقها. يطبق على النص المفهرس (أعمدة search_* تكتب من Python)
+# وعلى نص البحث
+
+ARABIC_NORMALIZATION = {
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ؤ": "و", "ئ": "ي", "ى": "ي", "ة": "ه",
+    "\u0640": "",  # تطويل
+    "\u064b": "", "\u064c": "", "\u064d": "", "\u064e": "",
+    "\u064f": "", "\u0650": "", "\u0651": "", "\u0652": "",  # تشكيل
+}
+
+ARABIC_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+
+_ARABIC_TABLE = str.maketrans(ARABIC_NORMALIZATION)
+
+def _strip_prefix(word: str):
+    for prefix in ARABIC_PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= 2:
+            return word[len(prefix):]
+    return word
+
+def normalize_arabic(text: str):
+    """تطبيع نص عربي ليتطابق مع محتوى الفهرس النصي"""
+    if not text:
+        return text
+    return " ".join(_strip_prefix(w) for w in text.translate(_ARABIC_TABLE).split())
+
+# رموز unicode61 تقريباً: حروف وأرقام متصلة
+_FTS_TOKEN = re.compile(r"[^\W_]+")
+
+def _search_text(text: str):
+    """النص كما يقطعه الفهرس النصي: كلمات normalize_arabic بأحرف صغيرة دون ترقيم، بينها مسافة واحدة"""
+    if not text:
+        return text
+    words = _FTS_TOKEN.findall(text.translate(_ARABIC_TABLE).lower())
+    return " ".join(_strip_prefix(w) for w in words)
+
+def register_functions(conn):
+    """دوال SQL المخصصة لاتصالات التطبيق (تستخدمها الترحيلات فقط، لا triggers)"""
+    conn.create_function("normalize_arabic", 1, normalize_arabic, deterministic=True)
+
+# ---------- ترحيل المخطط (Migrations) ----------
+# كل ترحيل يرفع PRAGMA user_version إلى رقمه، وتطبق الترحيلات بالترتيب مرة واحدة فقط
+
+FTS_COLUMNS = ("title", "description", "services")
+# النص الموحد لكل عمود مفهرس، يكتبه التطبيق بجانب النص الأصلي
+SEARCH_COLUMNS = tuple(f"search_{c}" for c in FTS_COLUMNS)
+
+def _search_values(*texts):
+    """قيم أعمدة SEARCH_COLUMNS لنصوص FTS_COLUMNS"""
+    return tuple(_search_text(t) for t in texts)
+
+def _migration_1_property_indexes(cur):
+    """فهارس مسارات الوصول الأكثر استخداماً في جدول العقارات"""
+    # WHERE city_id=? AND area=? ORDER BY id DESC و SELECT DISTINCT area WHERE city_id=?
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_properties_city_area ON properties(city_id, area)"
+    )
+    # WHERE city_id=? ORDER BY id DESC
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_properties_city ON properties(city_id)"
+    )
+    # WHERE owner_id=? ORDER BY id DESC
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_properties_owner ON properties(owner_id)"
+    )
+
+def _migration_2_analyze(cur):
+    """جمع إحصائيات الجداول والفهارس لمخطط الاستعلامات"""
+    cur.execute("ANALYZE")
+
+def _migration_3_full_text_search(cur):
+    """فهرس نصي FTS5 على العنوان والوصف والخدمات مع triggers للمزامنة"""
+    options = [r[0] for r in cur.execute("PRAGMA compile_options")]
+    if "ENABLE_FTS5" not in options:
+        logger.warning("⚠️  FTS5 not available - search will fall back to LIKE")
+        return
+
+    # جدول بدون محتوى: يخزن الفهرس فقط، والنص الأصلي يبقى في properties
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS properties_fts USING fts5(
+            title, description, services,
+            content='',
+            tokenize='unicode61 remove_diacritics 2'
         )
+        """
+    )
+    # ترتيب النتائج: العنوان أهم من الوصف، والوصف أهم من الخدمات
+    cur.execute(
+        "INSERT INTO properties_fts(properties_fts, rank) VALUES('rank', 'bm25(10.0, 5.0, 2.0)')"
+    )
 
-        # جدول المدن
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS cities (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
+    new_values = ", ".join(f"normalize_arabic(new.{c})" for c in FTS_COLUMNS)
+    old_values = ", ".join(f"normalize_arabic(old.{c})" for c in FTS_COLUMNS)
+    columns = ", ".join(FTS_COLUMNS)
+    insert_new = f"INSERT INTO properties_fts(rowid, {columns}) VALUES (new.id, {new_values});"
+    delete_old = (
+        f"INSERT INTO properties_fts(properties_fts, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values});"
+    )
+
+    cur.execute(f"CREATE TRIGGER properties_fts_ai AFTER INSERT ON properties BEGIN {insert_new} END")
+    cur.execute(f"CREATE TRIGGER properties_fts_ad AFTER DELETE ON properties BEGIN {delete_old} END")
+    cur.execute(
+        f"CREATE TRIGGER properties_fts_au AFTER UPDATE OF {columns} ON properties "
+        f"BEGIN {delete_old} {insert_new} END"
+    )
+
+    # فهرسة العقارات الموجودة مسبقاً
+    values = ", ".join(f"normalize_arabic({c})" for c in FTS_COLUMNS)
+    cur.execute(f"INSERT INTO properties_fts(rowid, {columns}) SELECT id, {values} FROM properties")
+
+def _migration_4_spatial_index(cur):
+    """فهرس مكاني R*Tree على إحداثيات العقارات مع triggers للمزامنة"""
+    options = [r[0] for r in cur.execute("PRAGMA compile_options")]
+    if "ENABLE_RTREE" not in options:
+        logger.warning("⚠️  R*Tree not available - map queries will fall back to lat/lon scans")
+        return
+
+    cur.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS properties_rtree USING rtree(
+            id, min_lat, max_lat, min_lon, max_lon
         )
+        """
+    )
+    insert_new = (
+        "INSERT INTO properties_rtree VALUES (new.id, new.lat, new.lat, new.lon, new.lon);"
+    )
+    delete_old = "DELETE FROM properties_rtree WHERE id = old.id;"
 
-        # جدول العقارات / المنازل
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS properties (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                owner_id INTEGER NOT NULL,
-                city_id INTEGER NOT NULL,
-                area TEXT,
-                title TEXT NOT NULL,
-                description TEXT,
-                rent INTEGER,
-                lat REAL,
-                lon REAL,
-                services TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(owner_id) REFERENCES users(id) ON DELETE CASCADE,
-                FOREIGN KEY(city_id) REFERENCES cities(id) ON DELETE CASCADE
+    cur.execute(
+        "CREATE TRIGGER properties_rtree_ai AFTER INSERT ON properties "
+        f"WHEN new.lat IS NOT NULL AND new.lon IS NOT NULL BEGIN {insert_new} END"
+    )
+    cur.execute(f"CREATE TRIGGER properties_rtree_ad AFTER DELETE ON properties BEGIN {delete_old} END")
+    cur.execute(
+        "CREATE TRIGGER properties_rtree_au AFTER UPDATE OF lat, lon ON properties "
+        f"BEGIN {delete_old} "
+        "INSERT INTO properties_rtree SELECT new.id, new.lat, new.lat, new.lon, new.lon "
+        "WHERE new.lat IS NOT NULL AND new.lon IS NOT NULL; END"
+    )
+
+    # فهرسة العقارات الموجودة مسبقاً
+    cur.execute(
+        """
+        INSERT INTO properties_rtree
+        SELECT id, lat, lat, lon, lon FROM properties
+        WHERE lat IS NOT NULL AND lon IS NOT NULL
+        """
+    )
+
+def _migration_5_import_checkpoints(cur):
+    """نقاط الاستئناف للاستيراد الجماعي (تحفظ مع كل دفعة في نفس المعاملة)"""
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            source TEXT PRIMARY KEY,
+            line INTEGER NOT NULL,
+            imported INTEGER NOT NULL,
+            errors INTEGER NOT NULL,
+            done INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+def _migration_6_area_rent_index(cur):
+    """فهرس (city_id, area, rent) يغطي تجميع المناطق وإحصائيات الإيجار"""
+    # الفهرس (city_id, area) يبقى: ترتيب الصفحات حسب id داخل المنطقة يعتمد عليه
+    cur.execute(
+        "CREATE INDEX IF NOT EXISTS idx_properties_city_area_rent ON properties(city_id, area, rent)"
+    )
+    cur.execute("ANALYZE idx_properties_city_area_rent")
+
+def _seed_default_areas(cur):
+    """إضافة المناطق الافتراضية (areas.py) للمدن الموجودة دون تغيير المناطق المضافة سابقاً"""
+    rows = []
+    for city_name, names in DEFAULT_AREAS.items():
+        active = set(DEFAULT_ACTIVE_AREAS.get(city_name, ()))
+        rows += [(name, normalize_arabic(name), int(name in active), city_name) for name in names]
+    cur.executemany(
+        """
+        INSERT OR IGNORE INTO areas (city_id, name, normalized_name, active)
+        SELECT id, ?, ?, ? FROM cities WHERE name = ?
+        """,
+        rows,
+    )
+
+# مركز كل منطقة = متوسط إحداثيات عقاراتها
+_UPDATE_AREA_CENTROIDS = """
+    /* centroids: every area */
+    UPDATE areas SET
+        lat = (SELECT AVG(p.lat) FROM properties p WHERE p.area_id = areas.id AND p.lat IS NOT NULL),
+        lon = (SELECT AVG(p.lon) FROM properties p WHERE p.area_id = areas.id AND p.lon IS NOT NULL)
+"""
+
+# ALTER TABLE ... DROP COLUMN متاح من SQLite 3.35
+SUPPORTS_DROP_COLUMN = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+def _migration_7_areas_table(cur):
+    """جدول المناطق areas، وربط العقارات بـ area_id بدل النص الحر properties.area"""
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS areas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            city_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            normalized_name TEXT NOT NULL,
+            active INTEGER NOT NULL DEFAULT 0,
+            lat REAL,
+            lon REAL,
+            UNIQUE(city_id, normalized_name),
+            FOREIGN KEY(city_id) REFERENCES cities(id) ON DELETE CASCADE
+        )
+        """
+    )
+    # مناطق المدينة بترتيب id (تجميع العقارات لكل منطقة دون ترتيب مؤقت)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_areas_city ON areas(city_id)")
+    # هل في المدينة مناطق مفعلة
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_areas_city_active ON areas(city_id) WHERE active = 1")
+    _seed_default_areas(cur)
+
+    # المناطق المكتوبة في العقارات الحالية: أول كتابة لكل اسم موحد تصبح الاسم المعروض
+    cur.execute(
+        """
+        INSERT OR IGNORE INTO areas (city_id, name, normalized_name)
+        SELECT city_id, trim(area), normalize_arabic(area) FROM properties
+        WHERE normalize_arabic(area) != ''
+        ORDER BY id
+        """
+    )
+    cur.execute("ALTER TABLE properties ADD COLUMN area_id INTEGER REFERENCES areas(id)")
+    cur.execute(
+        """
+        /* migration: backfill area_id from the old area text */
+        UPDATE properties SET area_id = (
+            SELECT a.id FROM areas a
+            WHERE a.city_id = properties.city_id AND a.normalized_name = normalize_arabic(properties.area)
+        )
+        WHERE area IS NOT NULL
+        """
+    )
+
+    # فهارس area النصي تستبدل بفهارس على area_id
+    cur.execute("DROP INDEX IF EXISTS idx_properties_city_area")
+    cur.execute("DROP INDEX IF EXISTS idx_properties_city_area_rent")
+    if SUPPORTS_DROP_COLUMN:
+        cur.execute("ALTER TABLE properties DROP COLUMN area")
+    else:
+        # SQLite أقدم من 3.35 (Android وبعض الأنظمة): يبقى العمود فارغاً ولا يستخدمه التطبيق
+        cur.execute("/* migration: clear the old area text */ UPDATE properties SET area = NULL")
+    # WHERE area_id=? AND id<? ORDER BY id DESC (ترقيم الصفحات)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_properties_area ON properties(area_id)")
+    # عدد الإعلانات وإحصائيات الإيجار لكل منطقة (فهرس مغطٍ)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_properties_area_rent ON properties(area_id, rent)")
+    cur.execute(_UPDATE_AREA_CENTROIDS)
+    cur.execute("ANALYZE")
+
+# حدود فئات مدرج الإيجار في area_stats (ل.س): <500 ألف، <1 مليون، <2 مليون، <5 مليون، وما فوق
+RENT_BUCKETS = (500_000, 1_000_000, 2_000_000, 5_000_000)
+AREA_STATS_COLUMNS = (
+    ("listings", "rented", "rent_sum", "rent_min", "rent_max")
+    + tuple(f"bucket_{i}" for i in range(len(RENT_BUCKETS) + 1))
+)
+
+def _rent_bucket_conditions(rent: str):
+    """شرط SQL لكل فئة إيجار (NULL لا يقع في أي فئة)"""
+    bounds = (None,) + RENT_BUCKETS + (None,)
+    conditions = []
+    for low, high in zip(bounds, bounds[1:]):
+        parts = [f"{rent} IS NOT NULL"]
+        if low is not None:
+            parts.append(f"{rent} >= {low}")
+        if high is not None:
+            parts.append(f"{rent} < {high}")
+        conditions.append("(" + " AND ".join(parts) + ")")
+    return conditions
+
+# إحصائيات كل منطقة محسوبة من الصفر (لإعادة البناء وفحص التطابق)
+_AREA_STATS_SELECT = (
+    """
+    /* area stats: full aggregate */
+    SELECT a.id, COUNT(p.id), COUNT(p.rent), ifnull(SUM(p.rent), 0), MIN(p.rent), MAX(p.rent)
+    """
+    + "".join(f", ifnull(SUM({c}), 0)" for c in _rent_bucket_conditions("p.rent"))
+    + """
+    FROM areas a
+    LEFT JOIN properties p ON p.area_id = a.id
+    GROUP BY a.id
+    """
+)
+
+# triggers area_stats بدوال SQL المدمجة فقط، فتبقى الإحصائيات صحيحة مع تعديلات sqlite3 أو أي
+# أداة أخرى على properties وareas (bench.py area-stats يتحقق من ذلك)
+def _create_area_stats_triggers(cur):
+    buckets = _rent_bucket_conditions
+    add_new = (
+        "UPDATE area_stats SET listings = listings + 1, rented = rented + (new.rent IS NOT NULL), "
+        "rent_sum = rent_sum + ifnull(new.rent, 0), "
+        "rent_min = coalesce(min(rent_min, new.rent), rent_min, new.rent), "
+        "rent_max = coalesce(max(rent_max, new.rent), rent_max, new.rent)"
+        + "".join(f", bucket_{i} = bucket_{i} + {c}" for i, c in enumerate(buckets("new.rent")))
+        + " WHERE area_id = new.area_id;"
+    )
+    # العقار المحذوف كان الأدنى/الأعلى: إعادة الحساب عبر الفهرس (area_id, rent) دون مسح
+    remove_old = (
+        "UPDATE area_stats SET listings = listings - 1, rented = rented - (old.rent IS NOT NULL), "
+        "rent_sum = rent_sum - ifnull(old.rent, 0), "
+        "rent_min = CASE WHEN old.rent = rent_min "
+        "THEN (SELECT MIN(rent) FROM properties WHERE area_id = old.area_id) ELSE rent_min END, "
+        "rent_max = CASE WHEN old.rent = rent_max "
+        "THEN (SELECT MAX(rent) FROM properties WHERE area_id = old.area_id) ELSE rent_max END"
+        + "".join(f", bucket_{i} = bucket_{i} - {c}" for i, c in enumerate(buckets("old.rent")))
+        + " WHERE area_id = old.area_id;"
+    )
+
+    cur.execute(
+        "CREATE TRIGGER areas_stats_ai AFTER INSERT ON areas "
+        "BEGIN INSERT OR IGNORE INTO area_stats (area_id) VALUES (new.id); END"
+    )
+    cur.execute(
+        "CREATE TRIGGER areas_stats_ad AFTER DELETE ON areas "
+        "BEGIN DELETE FROM area_stats WHERE area_id = old.id; END"
+    )
+    cur.execute(
+        "CREATE TRIGGER properties_stats_ai AFTER INSERT ON properties "
+        f"WHEN new.area_id IS NOT NULL BEGIN {add_new} END"
+    )
+    cur.execute(
+        "CREATE TRIGGER properties_stats_ad AFTER DELETE ON properties "
+        f"WHEN old.area_id IS NOT NULL BEGIN {remove_old} END"
+    )
+    # WHERE area_id = NULL لا يطابق شيئاً، فلا حاجة لشرط WHEN هنا
+    cur.execute(
+        f"CREATE TRIGGER properties_stats_au AFTER UPDATE OF area_id, rent ON properties "
+        f"BEGIN {remove_old} {add_new} END"
+    )
+
+def _rebuild_area_stats(cur):
+    columns = ", ".join(AREA_STATS_COLUMNS)
+    cur.execute("DELETE FROM area_stats")
+    cur.execute(f"INSERT INTO area_stats (area_id, {columns}) " + _AREA_STATS_SELECT)
+
+def _migration_8_area_stats(cur):
+    """جدول area_stats لإحصائيات كل منطقة، تحدثه triggers مع كل إضافة أو تعديل أو حذف"""
+    buckets = "".join(f", bucket_{i} INTEGER NOT NULL DEFAULT 0" for i in range(len(RENT_BUCKETS) + 1))
+    cur.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS area_stats (
+            area_id INTEGER PRIMARY KEY,
+            listings INTEGER NOT NULL DEFAULT 0,
+            rented INTEGER NOT NULL DEFAULT 0,
+            rent_sum INTEGER NOT NULL DEFAULT 0,
+            rent_min INTEGER,
+            rent_max INTEGER{buckets},
+            FOREIGN KEY(area_id) REFERENCES areas(id) ON DELETE CASCADE
+        )
+        """
+    )
+    _create_area_stats_triggers(cur)
+    _rebuild_area_stats(cur)
+
+# الجداول التي تعتمد عليها ذواكر القراءة (المدن وإحصائيات المناطق وذواكر shared)
+CACHED_TABLES = ("cities", "areas", "properties")
+
+def _migration_9_data_changes(cur):
+    """عداد تعديلات data_changes تزيده triggers في نفس معاملة أي تعديل على الجداول المخزنة"""
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS data_changes (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        """
+    )
+    cur.execute("INSERT OR IGNORE INTO data_changes (id, version) VALUES (1, 0)")
+    for table in CACHED_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cur.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_data_changes AFTER {event} ON {table}
+                BEGIN
+                    UPDATE data_changes SET version = version + 1 WHERE id = 1;
+                END
+                """
             )
-            """
+
+def _scope_sql(row: str):
+    """رموز عمود scope في properties_fts (c<city_id> a<area_id>) لصف row من properties"""
+    return f"'c' || {row}city_id || ifnull(' a' || {row}area_id, '')"
+
+def _create_fts_triggers(cur, scope: bool = True):
+    """مزامنة properties_fts من أعمدة search_* بدوال SQL المدمجة فقط (ومن المدينة والمنطقة مع scope)"""
+    columns = ", ".join(FTS_COLUMNS + (("scope",) if scope else ()))
+    search_columns = ", ".join(SEARCH_COLUMNS + (("city_id", "area_id") if scope else ()))
+    new_values = ", ".join([f"new.{c}" for c in SEARCH_COLUMNS] + ([_scope_sql("new.")] if scope else []))
+    old_values = ", ".join([f"old.{c}" for c in SEARCH_COLUMNS] + ([_scope_sql("old.")] if scope else []))
+    insert_new = f"INSERT INTO properties_fts(rowid, {columns}) VALUES (new.id, {new_values});"
+    delete_old = (
+        f"INSERT INTO properties_fts(properties_fts, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values});"
+    )
+    cur.execute(f"CREATE TRIGGER properties_fts_ai AFTER INSERT ON properties BEGIN {insert_new} END")
+    cur.execute(f"CREATE TRIGGER properties_fts_ad AFTER DELETE ON properties BEGIN {delete_old} END")
+    cur.execute(
+        f"CREATE TRIGGER properties_fts_au AFTER UPDATE OF {search_columns} ON properties "
+        f"BEGIN {delete_old} {insert_new} END"
+    )
+
+# triggers الترحيل 3 كانت تستدعي normalize_arabic المسجلة على اتصالات التطبيق فقط، فيفشل أي
+# تعديل على properties من sqlite3 أو أداة أخرى. الآن يكتب التطبيق النص الموحد في search_*
+# (_insert_property و_update_property و_insert_properties) والـ triggers تنسخه كما هو.
+# أداة خارجية تعدل title/description/services دون search_* لا تفشل، لكن الفهرس النصي يبقى
+# على النص القديم حتى تكتب search_* الموحدة.
+def _migration_10_search_columns(cur):
+    """أعمدة search_* للنص الموحد، فلا تحتاج triggers الفهرس النصي إلى دوال Python"""
+    for column in SEARCH_COLUMNS:
+        cur.execute(f"ALTER TABLE properties ADD COLUMN {column} TEXT")
+    rows = cur.execute(f"SELECT id, {', '.join(FTS_COLUMNS)} FROM properties").fetchall()
+    cur.executemany(
+        f"UPDATE properties SET {', '.join(f'{c}=?' for c in SEARCH_COLUMNS)} WHERE id=?",
+        [_search_values(*row[1:]) + (row[0],) for row in rows],
+    )
+    if cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'properties_fts'").fetchone():
+        # نفس النص الموحد المفهرس مسبقاً، فلا حاجة لإعادة بناء الفهرس
+        for suffix in ("ai", "ad", "au"):
+            cur.execute(f"DROP TRIGGER IF EXISTS properties_fts_{suffix}")
+        # جدول الفهرس هنا ما زال بأعمدة الترحيل 3، والترحيل 11 يضيف scope
+        _create_fts_triggers(cur, scope=False)
+
+# تصفية البحث بالمدينة أو المنطقة بعد MATCH كانت تمر على كل المطابقات (نصف الإعلانات لكلمة
+# شائعة) وتبحث عن كل واحدة في properties. عمود scope يجعل التصفية شرطاً داخل الفهرس النصي
+# نفسه، فتتقاطع قوائم الرموز ولا يقرأ إلا ما يطابق الكلمات والمدينة معاً.
+def _migration_11_search_scope(cur):
+    """إعادة بناء الفهرس النصي بعمود scope لرموز المدينة والمنطقة وفهارس للبادئات"""
+    if not cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'properties_fts'").fetchone():
+        return
+    for suffix in ("ai", "ad", "au"):
+        cur.execute(f"DROP TRIGGER IF EXISTS properties_fts_{suffix}")
+    cur.execute("DROP TABLE properties_fts")
+    # search_* بلا ترقيم وبأحرف صغيرة (_search_text): نفس رموز الفهرس، ويعد البحث الكلمات فيها مباشرة
+    rows = cur.execute(f"SELECT id, {', '.join(FTS_COLUMNS)} FROM properties").fetchall()
+    cur.executemany(
+        f"UPDATE properties SET {', '.join(f'{c}=?' for c in SEARCH_COLUMNS)} WHERE id=?",
+        [_search_values(*row[1:]) + (row[0],) for row in rows],
+    )
+    # جدول بدون محتوى كما في الترحيل 3؛ scope لا يظهر في النتائج ولا يطابق كلمات البحث.
+    # فهارس البادئات (2-4 حروف) تجعل "مدر"* تقرأ أحدث المطابقات فقط بدل دمج كل قوائمها أولاً
+    cur.execute(
+        f"""
+        CREATE VIRTUAL TABLE properties_fts USING fts5(
+            {", ".join(FTS_COLUMNS)}, scope,
+            content='',
+            prefix='2 3 4',
+            tokenize='unicode61 remove_diacritics 2'
         )
+        """
+    )
+    _create_fts_triggers(cur)
+    cur.execute(
+        f"INSERT INTO properties_fts(rowid, {', '.join(FTS_COLUMNS)}, scope) "
+        f"SELECT id, {', '.join(SEARCH_COLUMNS)}, {_scope_sql('')} FROM properties"
+    )
 
-        conn.commit()
+MIGRATIONS = [
+    (1, _migration_1_property_indexes),
+    (2, _migration_2_analyze),
+    (3, _migration_3_full_text_search),
+    (4, _migration_4_spatial_index),
+    (5, _migration_5_import_checkpoints),
+    (6, _migration_6_area_rent_index),
+    (7, _migration_7_areas_table),
+    (8, _migration_8_area_stats),
+    (9, _migration_9_data_changes),
+    (10, _migration_10_search_columns),
+    (11, _migration_11_search_scope),
+]
 
-        # تعبئة المدن الافتراضية إذا كانت فارغة
-        cur.execute("SELECT COUNT(*) FROM cities")
-        count = cur.fetchone()[0]
-        if count == 0:
-            default_cities = [
-                "دمشق", "حلب", "حمص", "حماة", "اللاذقية", "طرطوس",
-                "دير الزور", "الرقة", "الحسكة", "ريف دمشق",
-                "درعا", "القنيطرة", "سويدا", "إدلب"
-            ]
-            cur.executemany(
-                "INSERT OR IGNORE INTO cities (name) VALUES (?)",
-                [(c,) for c in default_cities]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(conn):
+    """رقم إصدار المخطط المخزن في PRAGMA user_version"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """تطبيق الترحيلات الناقصة على قاعدة البيانات الحالية"""
+    current = get_schema_version(conn)
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        cur = conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            migration(cur)
+            cur.execute(f"PRAGMA user_version={version}")
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        logger.info("🧱 Migrated schema to version %d: %s", version, migration.__doc__)
+    return get_schema_version(conn)
+
+def init_db():
+    """إنشاء الجداول الأساسية إذا لم تكن موجودة."""
+    try:
+        # المخطط والترحيلات بمعاملاتها الخاصة، فلا تمر بطابور الكاتب
+        with _write_connection() as conn:
+            cur = conn.cursor()
+
+            # جدول المستخدمين
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    role TEXT NOT NULL CHECK(role IN ('user', 'owner', 'admin')),
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
             )
-            print(f"🏙️  Added {len(default_cities)} default cities")
-            conn.commit()
 
-        # إنشاء مستخدمين تجريبيين إذا لم يوجدوا
-        cur.execute("SELECT COUNT(*) FROM users")
-        user_count = cur.fetchone()[0]
-        if user_count == 0:
-            demo_users = [
-                ("user1", "123456", "user"),
-                ("owner1", "123456", "owner"),
-            ]
-            cur.executemany(
-                "INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, ?)",
-                demo_users,
+            # جدول المدن
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cities (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL UNIQUE,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+
+            # جدول العقارات / المنازل
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS properties (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    owner_id INTEGER NOT NULL,
+                    city_id INTEGER NOT NULL,
+                    area TEXT,
+                    title TEXT NOT NULL,
+                    description TEXT,
+                    rent INTEGER,
+                    lat REAL,
+                    lon REAL,
+                    services TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY(owner_id) REFERENCES users(id) ON DELETE CASCADE,
+                    FOREIGN KEY(city_id) REFERENCES cities(id) ON DELETE CASCADE
+                )
+                """
             )
-            print("👤 Added demo users: user1/123456 (user), owner1/123456 (owner)")
+
             conn.commit()
+
+            # ترقية قاعدة البيانات الحالية إلى آخر إصدار للمخطط
+            migrate(conn)
+
+            # تعبئة المدن الافتراضية إذا كانت فارغة
+            cur.execute("SELECT COUNT(*) FROM cities")
+            count = cur.fetchone()[0]
+            if count == 0:
+                default_cities = [
+                    "دمشق", "حلب", "حمص", "حماة", "اللاذقية", "طرطوس",
+                    "دير الزور", "الرقة", "الحسكة", "ريف دمشق",
+                    "درعا", "القنيطرة", "سويدا", "إدلب"
+                ]
+                cur.executemany(
+                    "INSERT OR IGNORE INTO cities (name) VALUES (?)",
+                    [(c,) for c in default_cities]
+                )
+                _seed_default_areas(cur)
+                logger.info("🏙️  Added %d default cities", len(default_cities))
+                conn.commit()
+                invalidate_city_cache()
+                invalidate_area_facets()
+
+            # إنشاء مستخدمين تجريبيين إذا لم يوجدوا
+            cur.execute("SELECT COUNT(*) FROM users")
+            user_count = cur.fetchone()[0]
+            if user_count == 0:
+                demo_users = [
+                    ("user1", "123456", "user"),
+                    ("owner1", "123456", "owner"),
+                ]
+                cur.executemany(
+                    "INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, ?)",
+                    demo_users,
+                )
+                logger.info("👤 Added demo users: user1/123456 (user), owner1/123456 (owner)")
+                conn.commit()
         
-        conn.close()
-        print("✅ Database initialized successfully")
+        logger.info("✅ Database initialized successfully")
         
     except Exception as e:
-        print(f"❌ Database initialization error: {e}")
+        logger.error("❌ Database initialization error: %s", e)
         # محاولة إنشاء ملف DB بسيط في حالة الخطأ
         try:
             db_path = str(Path(__file__).parent / "city_app.db")
             conn = sqlite3.connect(db_path)
             conn.close()
-            print(f"📄 Created empty DB file: {db_path}")
+            logger.info("📄 Created empty DB file: %s", db_path)
         except Exception as create_error:
-            print(f"❌ Failed to create DB file: {create_error}")
+            logger.error("❌ Failed to create DB file: %s", create_error)
+
+# ---------- تهيئة العملية ----------
+# التحقق من المخطط والبيانات الافتراضية وتسخين ذاكرة المدن يحدث مرة واحدة لكل عملية
+# (ولكل قاعدة بيانات بعد close_pool)، لا مع كل جلسة Flet
+
+_bootstrapped = False
+_bootstrap_lock = threading.Lock()
+
+def bootstrap():
+    """تهيئة العملية مرة واحدة؛ يعيد True إذا نفذت الآن وFalse إذا كانت منفذة مسبقاً"""
+    global _bootstrapped
+    if _bootstrapped:
+        return False
+    with _bootstrap_lock:
+        if _bootstrapped:
+            return False
+        start = time.perf_counter()
+        init_db()
+        city_cache.get_all()
+        _bootstrapped = True
+    logger.info("🚀 Process bootstrap done in %.1f ms", (time.perf_counter() - start) * 1000)
+    return True
+
+def _insert_user(conn, username: str, password: str, role: str):
+    return conn.execute(
+        "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+        (username, password, role),
+    ).lastrowid
 
 def create_user(username: str, password: str, role: str):
     """إنشاء مستخدم جديد"""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
-            (username, password, role),
-        )
-        user_id = cur.lastrowid
-        conn.commit()
-        conn.close()
-        print(f"👤 User created: {username} (ID: {user_id})")
+        user_id = write(_insert_user, username, password, role).result()
+        logger.info("👤 User created: %s (ID: %s)", username, user_id)
         return user_id
     except sqlite3.IntegrityError:
         raise Exception("اسم المستخدم موجود مسبقاً")
     except Exception as e:
-        print(f"❌ Create user error: {e}")
+        logger.error("❌ Create user error: %s", e)
         raise Exception(f"خطأ في إنشاء المستخدم: {e}")
 
+def _insert_users(conn, users):
+    conn.executemany("INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, ?)", users)
+    return len(users)
+
+def create_users_bulk(users):
+    """إنشاء عدة مستخدمين بمعاملة واحدة - users: قائمة (username, password, role)"""
+    return write(_insert_users, list(users)).result()
+
 def get_user_by_credentials(username: str, password: str):
     """الحصول على بيانات المستخدم باستخدام اسم المستخدم وكلمة المرور"""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
-            "SELECT id, username, role FROM users WHERE username=? AND password=?",
-            (username, password),
-        )
-        row = cur.fetchone()
-        conn.close()
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT id, username, role FROM users WHERE username=? AND password=?",
+                (username, password),
+            )
+            row = cur.fetchone()
         
         if row:
             user_data = {"id": row[0], "username": row[1], "role": row[2]}
-            print(f"🔐 User logged in: {username}")
+            logger.info("🔐 User logged in: %s", username)
             return user_data
         else:
-            print(f"❌ Login failed for user: {username}")
+            logger.warning("❌ Login failed for user: %s", username)
             return None
     except Exception as e:
-        print(f"❌ Get user credentials error: {e}")
+        logger.error("❌ Get user credentials error: %s", e)
+        return None
+
+def get_user_id_by_username(username: str):
+    """معرف المستخدم حسب اسمه، أو None إذا لم يكن موجوداً"""
+    try:
+        with connection() as conn:
+            row = conn.execute("SELECT id FROM users WHERE username=?", (username,)).fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        logger.error("❌ Get user id error: %s", e)
         return None
 
+def user_exists(user_id: int):
+    """هل يوجد مستخدم بهذا المعرف"""
+    try:
+        with connection() as conn:
+            row = conn.execute("SELECT 1 FROM users WHERE id=?", (user_id,)).fetchone()
+        return row is not None
+    except Exception as e:
+        logger.error("❌ User exists error: %s", e)
+        return False
+
 def get_cities():
-    """الحصول على قائمة جميع المدن"""
+    """الحصول على قائمة جميع المدن (من الذاكرة المؤقتة)"""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT id, name FROM cities ORDER BY name")
-        cities = [{"id": r[0], "name": r[1]} for r in cur.fetchall()]
-        conn.close()
-        print(f"🏙️  Retrieved {len(cities)} cities")
-        return cities
+        return [dict(c) for c in city_cache.get_all()]
     except Exception as e:
-        print(f"❌ Get cities error: {e}")
+        logger.error("❌ Get cities error: %s", e)
         return []
 
 def get_city_by_id(city_id: int):
-    """الحصول على بيانات مدينة معينة"""
+    """الحصول على بيانات مدينة معينة (من الذاكرة المؤقتة)"""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT id, name FROM cities WHERE id=?", (city_id,))
-        r = cur.fetchone()
-        conn.close()
-        
-        if r:
-            return {"id": r[0], "name": r[1]}
-        return None
+        city = city_cache.get(city_id)
+        return dict(city) if city else None
     except Exception as e:
-        print(f"❌ Get city by id error: {e}")
+        logger.error("❌ Get city by id error: %s", e)
         return None
 
+# ---------- المناطق ----------
+
+def _area_id(conn, city_id: int, name: str, lat: float = None, lon: float = None, cache: dict = None):
+    """معرف المنطقة حسب اسمها الموحد، وتنشأ إذا لم تكن موجودة (None للاسم الفارغ)"""
+    normalized = normalize_arabic(name)
+    if not normalized:
+        return None
+    key = (city_id, normalized)
+    if cache is not None and key in cache:
+        return cache[key]
+
+    sql = "SELECT id FROM areas WHERE city_id=? AND normalized_name=?"
+    row = conn.execute(sql, key).fetchone()
+    if row is None:
+        # OR IGNORE: قد ينشئ خيط آخر نفس المنطقة في نفس اللحظة
+        conn.execute(
+            "INSERT OR IGNORE INTO areas (city_id, name, normalized_name, lat, lon) VALUES (?, ?, ?, ?, ?)",
+            (city_id, name.strip(), normalized, lat, lon),
+        )
+        row = conn.execute(sql, key).fetchone()
+    if cache is not None:
+        cache[key] = row[0]
+    return row[0]
+
+def is_area_open(city_id: int, area: str):
+    """هل تقبل المنطقة الإعلانات: المدينة بلا مناطق مفعلة، أو المنطقة نفسها مفعلة"""
+    try:
+        with connection() as conn:
+            row = conn.execute(
+                """
+                SELECT NOT EXISTS (SELECT 1 FROM areas WHERE city_id = ? AND active = 1)
+                    OR EXISTS (
+                        SELECT 1 FROM areas WHERE city_id = ? AND normalized_name = ? AND active = 1
+                    )
+                """,
+                (city_id, city_id, normalize_arabic(area) or ""),
+            ).fetchone()
+        return bool(row[0])
+    except Exception as e:
+        logger.error("❌ Is area open error: %s", e)
+        return False
+
+def _set_area_active(conn, area_id: int, active: bool):
+    return conn.execute("UPDATE areas SET active=? WHERE id=?", (int(active), area_id)).rowcount > 0
+
+def set_area_active(area_id: int, active: bool = True):
+    """تفعيل منطقة أو إلغاء تفعيلها (بدون تعديل الشيفرة لأي مدينة)"""
+    updated = write(_set_area_active, area_id, active).result()
+    if updated:
+        logger.info("📍 Area %s %s", area_id, "activated" if active else "deactivated")
+    return updated
+
+def _refresh_area_centroids(conn):
+    conn.execute(_UPDATE_AREA_CENTROIDS)
+
+def refresh_area_centroids():
+    """إعادة حساب مركز كل منطقة من إحداثيات عقاراتها (بعد الاستيراد الجماعي مثلاً)"""
+    write(_refresh_area_centroids).result()
+
+def _insert_property(conn, owner_id, city_id, area, title, description, rent, lat, lon, services):
+    area_id = _area_id(conn, city_id, area, lat, lon)
+    return conn.execute(
+        f"""
+        INSERT INTO properties (owner_id, city_id, area_id, title, description, rent, lat, lon, services,
+                                {", ".join(SEARCH_COLUMNS)})
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (owner_id, city_id, area_id, title, description, rent, lat, lon, services)
+        + _search_values(title, description, services),
+    ).lastrowid
+
 def add_property(owner_id: int, city_id: int, area: str, title: str, description: str,
                  rent: int, lat: float, lon: float, services: str):
-    """إضافة عقار جديد"""
+    """إضافة عقار جديد (المنطقة بالاسم - تنشأ إذا كانت جديدة)"""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO properties (owner_id, city_id, area, title, description, rent, lat, lon, services)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (owner_id, city_id, area, title, description, rent, lat, lon, services),
-        )
-        property_id = cur.lastrowid
-        conn.commit()
-        conn.close()
-        print(f"🏠 Property added: {title} (ID: {property_id})")
+        property_id = write(
+            _insert_property, owner_id, city_id, area, title, description, rent, lat, lon, services
+        ).result()
+        logger.info("🏠 Property added: %s (ID: %s)", title, property_id)
         return property_id
     except Exception as e:
-        print(f"❌ Add property error: {e}")
+        logger.error("❌ Add property error: %s", e)
         raise Exception(f"خطأ في إضافة العقار: {e}")
 
-def get_properties_by_city(city_id: int):
-    """الحصول على العقارات في مدينة معينة"""
+def get_property(property_id: int):
+    """بيانات عقار واحد (لنافذة التعديل)، أو None"""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT p.id, p.title, p.area, p.description, p.rent, p.lat, p.lon, p.services,
-                   u.username
-            FROM properties p
-            JOIN users u ON p.owner_id = u.id
-            WHERE p.city_id=?
-            ORDER BY p.id DESC
+        with connection() as conn:
+            row = conn.execute(
+                """
+                SELECT p.id, p.owner_id, p.city_id, p.area_id, a.name AS area, p.title, p.description,
+                       p.rent, p.lat, p.lon, p.services
+                FROM properties p
+                LEFT JOIN areas a ON a.id = p.area_id
+                WHERE p.id = ?
+                """,
+                (property_id,),
+            ).fetchone()
+        return dict(row) if row else None
+    except Exception as e:
+        logger.error("❌ Get property error: %s", e)
+        return None
+
+# ---------- عدد الإعلانات وإحصائيات الإيجار لكل منطقة ----------
+
+def _approximate_median(histogram, rent_min, rent_max):
+    """وسيط تقريبي للإيجار من مدرج RENT_BUCKETS: كل إعلان في منتصف حصته من فئته
+
+    area_stats لا يحفظ الإيجارات نفسها، فالوسيط الدقيق يحتاج إلى مسح إعلانات المنطقة. أدنى وأعلى
+    إيجار معروفان بدقة فيحدّان الفئتين الطرفيتين، والخطأ لا يتجاوز عرض الفئة التي يقع فيها الوسيط.
+    """
+    total = sum(histogram)
+    if not total or rent_min is None:
+        return None
+    lows = (rent_min,) + RENT_BUCKETS
+    highs = RENT_BUCKETS + (rent_max,)
+
+    def nth(rank):
+        if rank == 1:
+            return rent_min
+        if rank == total:
+            return rent_max
+        seen = 0
+        for count, low, high in zip(histogram, lows, highs):
+            if rank <= seen + count:
+                low, high = max(low, rent_min), min(high, rent_max)
+                return low + (high - low) * (rank - seen - 0.5) / count
+            seen += count
+        return rent_max
+
+    return (nth((total + 1) // 2) + nth(total // 2 + 1)) / 2
+
+
+def _stats_dict(row):
+    """صف area_stats (بترتيب AREA_STATS_COLUMNS) كإحصائيات جاهزة للعرض"""
+    listings, rented, rent_sum, rent_min, rent_max = row[:5]
+    histogram = [n or 0 for n in row[5:]]
+    return {
+        "count": listings or 0,
+        "min_rent": rent_min,
+        "median_rent": _approximate_median(histogram, rent_min, rent_max),
+        "avg_rent": rent_sum / rented if rented else None,
+        "max_rent": rent_max,
+        "histogram": histogram,
+    }
+
+def _load_area_facets(city_id: int):
+    columns = ", ".join(f"s.{c}" for c in AREA_STATS_COLUMNS)
+    with connection() as conn:
+        # قراءة الإحصائيات المحفوظة: صف واحد لكل منطقة مهما كان عدد الإعلانات
+        rows = conn.execute(
+            f"""
+            SELECT a.id, a.name, a.active, {columns}
+            FROM areas a
+            LEFT JOIN area_stats s ON s.area_id = a.id
+            WHERE a.city_id = ?
             """,
             (city_id,),
-        )
-        properties = []
-        for r in cur.fetchall():
-            properties.append(
+        ).fetchall()
+    # مدينة فيها مناطق مفعلة تقبل الإعلانات في هذه المناطق فقط
+    restricted = any(r[2] for r in rows)
+    facets = [
+        {
+            "area_id": r[0],
+            "area": r[1],
+            "active": bool(r[2]),
+            "open": bool(r[2]) or not restricted,
+            **_stats_dict(r[3:]),
+        }
+        for r in rows
+    ]
+    facets.sort(key=lambda f: (-f["count"], f["area"]))
+    return facets
+
+class AreaFacetCache:
+    """مناطق كل مدينة مع عدد إعلاناتها؛ تبطل بعد أي تعديل على العقارات أو المناطق"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._facets = {}
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, city_id: int):
+        with self._lock:
+            facets = self._facets.get(city_id)
+            if facets is not None:
+                self.hits += 1
+                return facets
+            self.misses += 1
+            version = self.version
+
+        facets = _load_area_facets(city_id)
+        with self._lock:
+            # لا نخزن نتيجة قديمة إذا تم الإبطال أثناء التحميل
+            if version == self.version:
+                self._facets[city_id] = facets
+        return facets
+
+    def invalidate(self):
+        with self._lock:
+            self._facets.clear()
+            self.version += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "cities": len(self._facets),
+            }
+
+area_facet_cache = AreaFacetCache()
+
+def _rebuild_area_stats_job(conn):
+    _rebuild_area_stats(conn.cursor())
+    # area_stats ليس من CACHED_TABLES: إبلاغ الذواكر (وباقي العمليات) يدوياً
+    conn.execute("UPDATE data_changes SET version = version + 1 WHERE id = 1")
+
+def rebuild_area_stats():
+    """إعادة حساب area_stats بالكامل من جدول العقارات (إصلاح بعد تعديل يدوي مثلاً)"""
+    write(_rebuild_area_stats_job).result()
+    logger.info("📊 Area stats rebuilt")
+
+def check_area_stats():
+    """مقارنة area_stats مع تجميع جديد؛ يعيد المناطق المختلفة [{"area_id", "expected", "actual"}]"""
+    columns = ", ".join(AREA_STATS_COLUMNS)
+    with connection() as conn:
+        expected = {r[0]: tuple(r[1:]) for r in conn.execute(_AREA_STATS_SELECT)}
+        actual = {
+            r[0]: tuple(r[1:])
+            for r in conn.execute(f"/* area stats: full check */ SELECT area_id, {columns} FROM area_stats")
+        }
+    mismatches = []
+    for area_id in sorted(expected.keys() | actual.keys()):
+        if expected.get(area_id) != actual.get(area_id):
+            mismatches.append({
+                "area_id": area_id,
+                "expected": dict(zip(AREA_STATS_COLUMNS, expected[area_id])) if area_id in expected else None,
+                "actual": dict(zip(AREA_STATS_COLUMNS, actual[area_id])) if area_id in actual else None,
+            })
+    return mismatches
+
+def invalidate_area_facets():
+    """إبطال إحصائيات المناطق (تستدعى بعد أي تعديل على جدول properties)"""
+    area_facet_cache.invalidate()
+
+def data_version():
+    """رقم يزداد بعد أي تعديل على العقارات أو المناطق (مفتاح للذواكر المشتركة خارج db)
+
+    تعديلات هذه العملية تزيده فوراً، وتعديلات العمليات الأخرى عند ملاحظتها عبر watch_changes.
+    """
+    return area_facet_cache.version
+
+def area_facet_stats():
+    """عدادات الإصابة والإخفاق لذاكرة إحصائيات المناطق"""
+    return area_facet_cache.stats()
+
+# ---------- مزامنة الذواكر بين العمليات ----------
+# عدة عمليات (عمال supervisor.py أو أدوات استيراد) تكتب في نفس الملف؛ كل عملية تحتفظ
+# بذواكرها، فتستطلع data_changes دورياً وتبطلها إذا زاد العداد منذ آخر قراءة
+
+CHANGE_POLL_MS = 250
+
+class ChangeWatcher:
+    """خيط خلفي يقرأ data_changes.version كل interval_ms ويبطل الذواكر المحلية عند تغيره"""
+
+    def __init__(self, interval_ms: float = CHANGE_POLL_MS):
+        self.interval = interval_ms / 1000
+        self.version = None
+        self.polls = 0
+        self.changes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def read_version(self):
+        with connection() as conn:
+            row = conn.execute("SELECT version FROM data_changes WHERE id = 1").fetchone()
+        return row[0] if row else None
+
+    def check(self):
+        """قراءة واحدة؛ يعيد True إذا تغيرت البيانات منذ القراءة السابقة (وأبطلت الذواكر)"""
+        version = self.read_version()
+        self.polls += 1
+        changed = self.version is not None and version != self.version
+        self.version = version
+        if changed:
+            self.changes += 1
+            invalidate_city_cache()
+            invalidate_area_facets()
+        return changed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except sqlite3.Error as e:
+                logger.warning("⚠️ Change watcher poll failed: %s", e)
+
+    def start(self):
+        self.check()
+        self._thread = threading.Thread(target=self._run, name="db-change-watcher", daemon=True)
+        self._thread.start()
+        logger.info("👀 Watching data changes every %.0f ms", self.interval * 1000)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        return {"version": self.version, "polls": self.polls, "changes": self.changes}
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+def watch_changes(interval_ms: float = CHANGE_POLL_MS):
+    """تشغيل ChangeWatcher للعملية (مرة واحدة)؛ يعيد المراقب الجاري"""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = ChangeWatcher(interval_ms).start()
+    return _watcher
+
+def get_area_facets(city_id: int):
+    """مناطق المدينة مع عدد الإعلانات وأدنى/وسيط/متوسط/أعلى إيجار، الأكثر إعلانات أولاً
+
+    كل عنصر: {"area_id", "area", "active", "open", "count", "min_rent", "median_rent", "avg_rent",
+    "max_rent", "histogram"} - histogram: عدد الإعلانات في كل فئة من RENT_BUCKETS، وmedian_rent
+    تقريبي محسوب منه (_approximate_median)
+    (open: هل تقبل المنطقة الإعلانات حسب المناطق المفعلة في المدينة)
+    """
+    try:
+        return [dict(f) for f in area_facet_cache.get(city_id)]
+    except Exception as e:
+        logger.error("❌ Get area facets error: %s", e)
+        return []
+
+def get_properties_by_city(city_id: int):
+    """الحصول على العقارات في مدينة معينة"""
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT p.id, p.title, a.name AS area, p.description, p.rent, p.lat, p.lon, p.services,
+                       u.username
+                FROM properties p
+                JOIN users u ON p.owner_id = u.id
+                LEFT JOIN areas a ON a.id = p.area_id
+                WHERE p.city_id=?
+                ORDER BY p.id DESC
+                """,
+                (city_id,),
+            )
+            properties = []
+            for r in cur.fetchall():
+                properties.append(
+                    {
+                        "id": r[0],
+                        "title": r[1],
+                        "area": r[2],
+                        "description": r[3],
+                        "rent": r[4],
+                        "lat": r[5],
+                        "lon": r[6],
+                        "services": r[7],
+                        "owner_username": r[8],
+                    }
+                )
+        logger.debug("🏠 Retrieved %d properties for city ID: %s", len(properties), city_id)
+        return properties
+    except Exception as e:
+        logger.error("❌ Get properties by city error: %s", e)
+        return []
+
+def get_properties_by_owner(owner_id: int):
+    """الحصول على عقارات مالك معين مع اسم المدينة (استعلام واحد)"""
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT p.id, p.title, a.name AS area, p.description, p.rent, p.lat, p.lon, p.services, p.city_id,
+                       c.name AS city_name, a.active
+                FROM properties p
+                LEFT JOIN cities c ON p.city_id = c.id
+                LEFT JOIN areas a ON a.id = p.area_id
+                WHERE p.owner_id=?
+                ORDER BY p.id DESC
+                """,
+                (owner_id,),
+            )
+            properties = []
+            for r in cur.fetchall():
+                properties.append(
+                    {
+                        "id": r[0],
+                        "title": r[1],
+                        "area": r[2],
+                        "description": r[3],
+                        "rent": r[4],
+                        "lat": r[5],
+                        "lon": r[6],
+                        "services": r[7],
+                        "city_id": r[8],
+                        "city_name": r[9],
+                        "area_active": bool(r[10]),
+                    }
+                )
+        logger.debug("🏠 Retrieved %d properties for owner ID: %s", len(properties), owner_id)
+        return properties
+    except Exception as e:
+        logger.error("❌ Get properties by owner error: %s", e)
+        return []
+
+def get_owner_property(property_id: int, owner_id: int):
+    """عقار واحد من عقارات المالك بنفس حقول get_properties_by_owner (لتحديث بطاقته فقط)، أو None"""
+    try:
+        with connection() as conn:
+            r = conn.execute(
+                """
+                SELECT p.id, p.title, a.name AS area, p.description, p.rent, p.lat, p.lon, p.services, p.city_id,
+                       c.name AS city_name, a.active
+                FROM properties p
+                LEFT JOIN cities c ON p.city_id = c.id
+                LEFT JOIN areas a ON a.id = p.area_id
+                WHERE p.id=? AND p.owner_id=?
+                """,
+                (property_id, owner_id),
+            ).fetchone()
+        if not r:
+            return None
+        return {
+            "id": r[0],
+            "title": r[1],
+            "area": r[2],
+            "description": r[3],
+            "rent": r[4],
+            "lat": r[5],
+            "lon": r[6],
+            "services": r[7],
+            "city_id": r[8],
+            "city_name": r[9],
+            "area_active": bool(r[10]),
+        }
+    except Exception as e:
+        logger.error("❌ Get owner property error: %s", e)
+        return None
+
+def get_properties_by_area(area_id: int):
+    """الحصول على العقارات في منطقة معينة"""
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT p.id, p.title, a.name AS area, p.description, p.rent, p.lat, p.lon, p.services,
+                       u.username as owner_username
+                FROM properties p
+                JOIN users u ON p.owner_id = u.id
+                LEFT JOIN areas a ON a.id = p.area_id
+                WHERE p.area_id=?
+                ORDER BY p.id DESC
+                """,
+                (area_id,),
+            )
+            properties = []
+            for r in cur.fetchall():
+                properties.append(
+                    {
+                        "id": r[0],
+                        "title": r[1],
+                        "area": r[2],
+                        "description": r[3],
+                        "rent": r[4],
+                        "lat": r[5],
+                        "lon": r[6],
+                        "services": r[7],
+                        "owner_username": r[8],
+                    }
+                )
+        logger.debug("🏠 Retrieved %d properties for area ID: %s", len(properties), area_id)
+        return properties
+    except Exception as e:
+        logger.error("❌ Get properties by area error: %s", e)
+        return []
+
+# ---------- ترقيم الصفحات بالمؤشر (keyset على id تنازلياً) ----------
+
+PAGE_SIZE = 20
+_MAX_ID = 2 ** 63 - 1
+
+def _next_cursor(properties, limit: int):
+    """قص الصف الزائد وإرجاع مؤشر الصفحة التالية (None إذا انتهت النتائج)"""
+    if len(properties) > limit:
+        del properties[limit:]
+        return properties[-1]["id"]
+    return None
+
+def get_properties_page_by_area(area_id: int, before_id: int = None, limit: int = PAGE_SIZE):
+    """صفحة من عقارات منطقة معينة، تعيد (العقارات, مؤشر الصفحة التالية)"""
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT p.id, p.title, a.name AS area, p.description, p.rent, p.lat, p.lon, p.services,
+                       u.username as owner_username
+                FROM properties p
+                JOIN users u ON p.owner_id = u.id
+                LEFT JOIN areas a ON a.id = p.area_id
+                WHERE p.area_id=? AND p.id<?
+                ORDER BY p.id DESC
+                LIMIT ?
+                """,
+                (area_id, before_id or _MAX_ID, limit + 1),
+            )
+            properties = [
                 {
                     "id": r[0],
                     "title": r[1],
@@ -273,31 +1778,32 @@ def get_properties_by_city(city_id: int):
                     "services": r[7],
                     "owner_username": r[8],
                 }
-            )
-        conn.close()
-        print(f"🏠 Retrieved {len(properties)} properties for city ID: {city_id}")
-        return properties
+                for r in cur.fetchall()
+            ]
+        return properties, _next_cursor(properties, limit)
     except Exception as e:
-        print(f"❌ Get properties by city error: {e}")
-        return []
+        logger.error("❌ Get properties page by area error: %s", e)
+        return [], None
 
-def get_properties_by_owner(owner_id: int):
-    """الحصول على عقارات مالك معين"""
+def get_properties_page_by_owner(owner_id: int, before_id: int = None, limit: int = PAGE_SIZE):
+    """صفحة من عقارات مالك معين، تعيد (العقارات, مؤشر الصفحة التالية)"""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT p.id, p.title, p.area, p.description, p.rent, p.lat, p.lon, p.services, p.city_id
-            FROM properties p
-            WHERE p.owner_id=?
-            ORDER BY p.id DESC
-            """,
-            (owner_id,),
-        )
-        properties = []
-        for r in cur.fetchall():
-            properties.append(
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT p.id, p.title, a.name AS area, p.description, p.rent, p.lat, p.lon, p.services, p.city_id,
+                       c.name AS city_name, a.active
+                FROM properties p
+                LEFT JOIN cities c ON p.city_id = c.id
+                LEFT JOIN areas a ON a.id = p.area_id
+                WHERE p.owner_id=? AND p.id<?
+                ORDER BY p.id DESC
+                LIMIT ?
+                """,
+                (owner_id, before_id or _MAX_ID, limit + 1),
+            )
+            properties = [
                 {
                     "id": r[0],
                     "title": r[1],
@@ -308,34 +1814,271 @@ def get_properties_by_owner(owner_id: int):
                     "lon": r[6],
                     "services": r[7],
                     "city_id": r[8],
+                    "city_name": r[9],
+                    "area_active": bool(r[10]),
                 }
-            )
-        conn.close()
-        print(f"🏠 Retrieved {len(properties)} properties for owner ID: {owner_id}")
-        return properties
+                for r in cur.fetchall()
+            ]
+        return properties, _next_cursor(properties, limit)
     except Exception as e:
-        print(f"❌ Get properties by owner error: {e}")
-        return []
+        logger.error("❌ Get properties page by owner error: %s", e)
+        return [], None
 
-def get_properties_by_city_and_area(city_id: int, area: str):
-    """الحصول على العقارات في مدينة ومنطقة معينة"""
-    try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
+# ---------- البحث النصي ----------
+
+# وجود الجداول الافتراضية (FTS5 / R*Tree) يعتمد على خيارات بناء SQLite
+_virtual_tables = {}
+
+def _has_table(conn, name: str):
+    """هل يوجد الجدول في قاعدة البيانات الحالية (يفحص مرة واحدة لكل جدول)"""
+    if name not in _virtual_tables:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)
+        ).fetchone()
+        _virtual_tables[name] = row is not None
+    return _virtual_tables[name]
+
+def build_fts_query(text: str, prefix: bool = False):
+    """تحويل نص البحث إلى استعلام FTS5: كل كلمة مطلوبة (ومطابقة بالبادئة عند الطلب)"""
+    words = (_search_text(text) or "").split()
+    suffix = "*" if prefix else ""
+    return " ".join(f'"{w}"{suffix}' for w in words)
+
+# ترتيب الصلة: صيغة bm25 في FTS5 بمعاملاتها الافتراضية، وأوزان الأعمدة من الترحيل 3
+# (العنوان ثم الوصف ثم الخدمات)
+BM25_WEIGHTS = (10.0, 5.0, 2.0)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# bm25() في SQLite يمر على كل مطابقات كل كلمة ليحسب ندرتها (IDF)، فكلمة في نصف 100 ألف إعلان
+# تكلف ~3 ms وحدها وكل كلمة إضافية مثلها. لذلك يرتب البحث أحدث SEARCH_WINDOW مطابقة فقط
+# (قراءتها من الفهرس بترتيب rowid تتوقف عند الحد) ويحسب bm25 لها في Python. المقابل: عندما
+# تتجاوز المطابقات النافذة، إعلان أقدم أعلى صلة لا يظهر حتى تضيق الكلمات أو المنطقة البحث؛
+# search_properties تعيد ذلك لتعرضه الواجهة.
+SEARCH_WINDOW = 200
+
+# كلمات البحث تطابق أعمدة النص فقط، لا رموز المدينة والمنطقة في scope
+_FTS_TEXT_COLUMNS = "{" + " ".join(FTS_COLUMNS) + "}"
+
+def _phrase_matches(conn, phrase_query: str, newest_id: int):
+    """عدد الإعلانات المطابقة لعبارة (لحساب IDF): دقيق حتى SEARCH_WINDOW، وبعدها تقدير من المدى
+    الذي تغطيه أحدث SEARCH_WINDOW مطابقة بين المعرفات 1..newest_id"""
+    found, oldest = conn.execute(
+        """
+        SELECT count(*), min(id) FROM (
+            SELECT rowid AS id FROM properties_fts
+            WHERE properties_fts MATCH ?
+            ORDER BY rowid DESC
+            LIMIT ?
+        )
+        """,
+        (phrase_query, SEARCH_WINDOW),
+    ).fetchone()
+    if found < SEARCH_WINDOW:
+        return found
+    return found * newest_id / (newest_id - oldest + 1)
+
+def _bm25_scores(conn, rows, words: list, prefix: bool):
+    """درجة bm25 (الأعلى أفضل) لكل صف (id, العنوان, الوصف, الخدمات) من نافذة _search_rows؛
+    أطوال الإعلانات تقارن بمتوسط النافذة لا الجدول كله"""
+    # النصوص كلمات _search_text بمسافتين بينها وحولها، فتعد " كلمة " بـ str.count. مع prefix
+    # تطابق كل كلمة بدايتها فقط كما في build_fts_query
+    patterns = [f" {w} " if not prefix else f" {w}" for w in words]
+    docs = [row[1:] for row in rows]
+    lengths = [(title + description + services).count(" ") // 2 for title, description, services in docs]
+    average = sum(lengths) / len(lengths) or 1
+
+    # كل مطابقة تحوي كل الكلمات، فـ IDF لكلمة واحدة عامل ثابت لا يغير الترتيب. عدد الإعلانات
+    # هو أكبر معرف (count(*) يمر على الجدول كله)؛ الحذف يجعله أكبر قليلاً من الحقيقي
+    idf = [1.0] * len(words)
+    if len(words) > 1:
+        total = conn.execute("SELECT max(id) FROM properties").fetchone()[0]
+        suffix = "*" if prefix else ""
+        for i, word in enumerate(words):
+            matches = _phrase_matches(conn, f'{_FTS_TEXT_COLUMNS} : "{word}"{suffix}', total)
+            idf[i] = max(1e-6, math.log((total - matches + 0.5) / (matches + 0.5)))
+
+    title_weight, description_weight, services_weight = BM25_WEIGHTS
+    norms = [BM25_K1 * (1 - BM25_B + BM25_B * length / average) for length in lengths]
+    scores = [0.0] * len(docs)
+    for pattern, weight in zip(patterns, idf):
+        hits = [
+            title_weight * title.count(pattern)
+            + description_weight * description.count(pattern)
+            + services_weight * services.count(pattern)
+            for title, description, services in docs
+        ]
+        scores = [
+            score + weight * h * (BM25_K1 + 1) / (h + norm)
+            for score, h, norm in zip(scores, hits, norms)
+        ]
+    return scores
+
+def _search_rows(conn, text: str, city_id: int, area_id: int, limit: int):
+    """(الصفوف, هل تجاوزت المطابقات SEARCH_WINDOW)"""
+    if not _has_table(conn, "properties_fts"):
+        # بديل للأنظمة التي لا تدعم FTS5: مسح كامل بـ LIKE
+        filters = ""
+        filter_params = []
+        if city_id is not None:
+            filters += " AND p.city_id=?"
+            filter_params.append(city_id)
+        if area_id is not None:
+            filters += " AND p.area_id=?"
+            filter_params.append(area_id)
+        rows = conn.execute(
             """
-            SELECT p.id, p.title, p.area, p.description, p.rent, p.lat, p.lon, p.services,
+            SELECT p.id, p.title, a.name AS area, p.description, p.rent, p.lat, p.lon, p.services,
                    u.username as owner_username
             FROM properties p
             JOIN users u ON p.owner_id = u.id
-            WHERE p.city_id=? AND p.area=?
-            ORDER BY p.id DESC
+            LEFT JOIN areas a ON a.id = p.area_id
+            WHERE (p.title || ' ' || ifnull(p.description, '') || ' ' || ifnull(p.services, '')) LIKE ?
+            """
+            + filters
+            + " ORDER BY p.id DESC LIMIT ?",
+            [f"%{text.strip()}%", *filter_params, limit],
+        ).fetchall()
+        return rows, False
+
+    # المدينة والمنطقة رموز في عمود scope، فتصفيتهما داخل الفهرس النصي (الترحيل 11)
+    scope = [f"c{city_id}"] if city_id is not None else []
+    if area_id is not None:
+        scope.append(f"a{area_id}")
+    scope_query = f" AND scope : ({' AND '.join(scope)})" if scope else ""
+
+    # الكلمات الكاملة أولاً، ثم المطابقة بالبادئة إذا لم توجد نتائج
+    window = []
+    for prefix in (False, True):
+        window = conn.execute(
+            """
+            SELECT p.id,
+                   ifnull(' ' || replace(nullif(p.search_title, ''), ' ', '  ') || ' ', ''),
+                   ifnull(' ' || replace(nullif(p.search_description, ''), ' ', '  ') || ' ', ''),
+                   ifnull(' ' || replace(nullif(p.search_services, ''), ' ', '  ') || ' ', '')
+            FROM (
+                SELECT rowid AS id FROM properties_fts
+                WHERE properties_fts MATCH ?
+                ORDER BY rowid DESC
+                LIMIT ?
+            ) m
+            JOIN properties p ON p.id = m.id
             """,
-            (city_id, area),
-        )
-        properties = []
-        for r in cur.fetchall():
-            properties.append(
+            [f"{_FTS_TEXT_COLUMNS} : ({build_fts_query(text, prefix)}){scope_query}", SEARCH_WINDOW + 1],
+        ).fetchall()
+        if window:
+            break
+    if not window:
+        return [], False
+
+    capped = len(window) > SEARCH_WINDOW
+    window = sorted(window, key=lambda r: r[0], reverse=True)[:SEARCH_WINDOW]
+    scores = _bm25_scores(conn, window, _search_text(text).split(), prefix)
+    # الأعلى صلة أولاً، والأحدث عند التساوي
+    ranked = sorted(zip(scores, (r[0] for r in window)), key=lambda pair: (-pair[0], -pair[1]))
+    order = [property_id for _, property_id in ranked[:limit]]
+    rows = conn.execute(
+        f"""
+        SELECT p.id, p.title, a.name AS area, p.description, p.rent, p.lat, p.lon, p.services,
+               u.username as owner_username
+        FROM properties p
+        JOIN users u ON p.owner_id = u.id
+        LEFT JOIN areas a ON a.id = p.area_id
+        WHERE p.id IN ({", ".join("?" for _ in order)})
+        """,
+        order,
+    ).fetchall()
+    position = {property_id: i for i, property_id in enumerate(order)}
+    return sorted(rows, key=lambda r: position[r[0]]), capped
+
+def search_properties(text: str, city_id: int = None, area_id: int = None, limit: int = PAGE_SIZE):
+    """بحث نصي مرتب حسب الصلة (bm25) في العنوان والوصف والخدمات
+
+    يعيد (العقارات, capped): capped صحيحة إذا تجاوزت المطابقات SEARCH_WINDOW فرتبت أحدثها فقط.
+    """
+    if not build_fts_query(text):
+        return [], False
+
+    try:
+        with connection() as conn:
+            rows, capped = _search_rows(conn, text, city_id, area_id, limit)
+        properties = [
+            {
+                "id": r[0],
+                "title": r[1],
+                "area": r[2],
+                "description": r[3],
+                "rent": r[4],
+                "lat": r[5],
+                "lon": r[6],
+                "services": r[7],
+                "owner_username": r[8],
+            }
+            for r in rows
+        ]
+        logger.debug("🔎 Search '%s' returned %d properties%s", text, len(properties),
+                     f" (newest {SEARCH_WINDOW} matches ranked)" if capped else "")
+        return properties, capped
+    except Exception as e:
+        logger.error("❌ Search properties error: %s", e)
+        return [], False
+
+# ---------- الاستعلامات المكانية ----------
+
+MAP_MARKER_LIMIT = 500
+
+def get_properties_in_bounds(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                             city_id: int = None, area_id: int = None, limit: int = MAP_MARKER_LIMIT):
+    """العقارات الواقعة داخل مستطيل (نطاق عرض الخريطة)، الأحدث أولاً"""
+    filters = ""
+    filter_params = []
+    if city_id is not None:
+        filters += " AND p.city_id=?"
+        filter_params.append(city_id)
+    if area_id is not None:
+        filters += " AND p.area_id=?"
+        filter_params.append(area_id)
+
+    try:
+        with connection() as conn:
+            if _has_table(conn, "properties_rtree"):
+                # ترتيب معرفات النطاق فقط (R*Tree لا يعيدها بترتيب id)، ثم جلب أعمدة أحدث limit منها
+                sql = (
+                    """
+                    SELECT p.id, p.title, a.name AS area, p.description, p.rent, p.lat, p.lon, p.services,
+                           u.username as owner_username
+                    FROM (
+                        SELECT r.id FROM properties_rtree r
+                        JOIN properties p ON p.id = r.id
+                        WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?
+                    """
+                    + filters
+                    + """
+                        ORDER BY r.id DESC
+                        LIMIT ?
+                    ) m
+                    JOIN properties p ON p.id = m.id
+                    JOIN users u ON p.owner_id = u.id
+                    LEFT JOIN areas a ON a.id = p.area_id
+                    ORDER BY m.id DESC
+                    """
+                )
+            else:
+                # بديل للأنظمة التي لا تدعم R*Tree
+                sql = (
+                    """
+                    SELECT p.id, p.title, a.name AS area, p.description, p.rent, p.lat, p.lon, p.services,
+                           u.username as owner_username
+                    FROM properties p
+                    JOIN users u ON p.owner_id = u.id
+                    LEFT JOIN areas a ON a.id = p.area_id
+                    WHERE p.lat BETWEEN ? AND ? AND p.lon BETWEEN ? AND ?
+                    """
+                    + filters
+                    + " ORDER BY p.id DESC LIMIT ?"
+                )
+            cur = conn.execute(sql, [min_lat, max_lat, min_lon, max_lon, *filter_params, limit])
+            properties = [
                 {
                     "id": r[0],
                     "title": r[1],
@@ -347,70 +2090,220 @@ def get_properties_by_city_and_area(city_id: int, area: str):
                     "services": r[7],
                     "owner_username": r[8],
                 }
-            )
-        conn.close()
-        print(f"🏠 Retrieved {len(properties)} properties for city {city_id}, area: {area}")
+                for r in cur.fetchall()
+            ]
         return properties
     except Exception as e:
-        print(f"❌ Get properties by city and area error: {e}")
+        logger.error("❌ Get properties in bounds error: %s", e)
         return []
 
+def get_property_points(city_id: int, area_id: int = None):
+    """كل العقارات ذات الموقع في المدينة (أو المنطقة) كنقاط (id, lat, lon, title) لتجميع علامات الخريطة"""
+    try:
+        with connection() as conn:
+            if area_id is not None:
+                cur = conn.execute(
+                    "SELECT id, lat, lon, title FROM properties WHERE area_id = ? AND lat IS NOT NULL AND lon IS NOT NULL",
+                    (area_id,),
+                )
+            else:
+                cur = conn.execute(
+                    "SELECT id, lat, lon, title FROM properties WHERE city_id = ? AND lat IS NOT NULL AND lon IS NOT NULL",
+                    (city_id,),
+                )
+            return cur.fetchall()
+    except Exception as e:
+        logger.error("❌ Get property points error: %s", e)
+        return []
+
+def get_properties_near(lat: float, lon: float, radius_km: float, city_id: int = None,
+                        limit: int = PAGE_SIZE):
+    """العقارات ضمن radius_km من نقطة، مرتبة حسب المسافة (haversine) مع حقل distance_km"""
+    min_lat, min_lon, max_lat, max_lon = geo.bbox_around(lat, lon, radius_km)
+    candidates = get_properties_in_bounds(
+        min_lat, min_lon, max_lat, max_lon, city_id=city_id, limit=-1
+    )
+    nearby = []
+    for p in candidates:
+        distance = geo.haversine_km(lat, lon, p["lat"], p["lon"])
+        if distance <= radius_km:
+            p["distance_km"] = distance
+            nearby.append(p)
+    nearby.sort(key=lambda p: p["distance_km"])
+    return nearby[:limit]
+
+# ---------- الإدخال الجماعي ونقاط الاستئناف ----------
+
+PROPERTY_COLUMNS = ("owner_id", "city_id", "area", "title", "description", "rent", "lat", "lon", "services")
+# area (اسم المنطقة) يحول إلى area_id قبل الإدخال
+_CITY, _AREA, _LAT, _LON = (PROPERTY_COLUMNS.index(c) for c in ("city_id", "area", "lat", "lon"))
+_FTS = tuple(PROPERTY_COLUMNS.index(c) for c in FTS_COLUMNS)
+_INSERT_COLUMNS = PROPERTY_COLUMNS[:_AREA] + ("area_id",) + PROPERTY_COLUMNS[_AREA + 1:] + SEARCH_COLUMNS
+
+def _insert_properties(conn, rows, checkpoint):
+    columns = ", ".join(_INSERT_COLUMNS)
+    placeholders = ", ".join("?" for _ in _INSERT_COLUMNS)
+    area_ids = {}
+    rows = [
+        row[:_AREA]
+        + (_area_id(conn, row[_CITY], row[_AREA], row[_LAT], row[_LON], cache=area_ids),)
+        + row[_AREA + 1:]
+        + _search_values(*(row[i] for i in _FTS))
+        for row in rows
+    ]
+    conn.executemany(f"INSERT INTO properties ({columns}) VALUES ({placeholders})", rows)
+    if checkpoint is not None:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO import_checkpoints (source, line, imported, errors, done, updated_at)
+            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """,
+            (
+                checkpoint["source"],
+                checkpoint["line"],
+                checkpoint["imported"],
+                checkpoint["errors"],
+                int(checkpoint.get("done", False)),
+            ),
+        )
+    return len(rows)
+
+def add_properties_bulk(rows, checkpoint: dict = None):
+    """إدخال دفعة عقارات بمعاملة واحدة؛ تحفظ نقطة الاستئناف في نفس المعاملة
+
+    rows: قائمة tuples بترتيب PROPERTY_COLUMNS (المناطق الجديدة تنشأ تلقائياً)
+    checkpoint: {"source", "line", "imported", "errors", "done"}
+    """
+    return write(_insert_properties, list(rows), checkpoint).result()
+
+def get_import_checkpoint(source: str):
+    """آخر نقطة استئناف محفوظة لمصدر استيراد، أو None"""
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT source, line, imported, errors, done FROM import_checkpoints WHERE source=?",
+            (source,),
+        ).fetchone()
+    if not row:
+        return None
+    return {
+        "source": row[0],
+        "line": row[1],
+        "imported": row[2],
+        "errors": row[3],
+        "done": bool(row[4]),
+    }
+
+def _delete_import_checkpoint(conn, source: str):
+    conn.execute("DELETE FROM import_checkpoints WHERE source=?", (source,))
+
+def clear_import_checkpoint(source: str):
+    """حذف نقطة الاستئناف (لإعادة الاستيراد من البداية)"""
+    write(_delete_import_checkpoint, source).result()
+
+def iter_properties_for_export(city_id: int = None, batch_size: int = 1000):
+    """كل العقارات مع اسم المدينة والمالك، تقرأ على دفعات (ذاكرة ثابتة)"""
+    sql = """
+        /* export: full scan in id order */
+        SELECT p.id, u.username, c.name, a.name, p.title, p.description, p.rent, p.lat, p.lon,
+               p.services
+        FROM properties p
+        JOIN users u ON p.owner_id = u.id
+        JOIN cities c ON p.city_id = c.id
+        LEFT JOIN areas a ON a.id = p.area_id
+    """
+    params = ()
+    if city_id is not None:
+        sql += " WHERE p.city_id=?"
+        params = (city_id,)
+    with connection() as conn:
+        cur = conn.execute(sql + " ORDER BY p.id", params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for r in rows:
+                yield {
+                    "id": r[0],
+                    "owner": r[1],
+                    "city": r[2],
+                    "area": r[3],
+                    "title": r[4],
+                    "description": r[5],
+                    "rent": r[6],
+                    "lat": r[7],
+                    "lon": r[8],
+                    "services": r[9],
+                }
+
+def _delete_property(conn, property_id: int, owner_id: int):
+    return conn.execute(
+        "DELETE FROM properties WHERE id=? AND owner_id=?", (property_id, owner_id)
+    ).rowcount > 0
+
 def delete_property(property_id: int, owner_id: int):
     """حذف عقار (للمالك فقط)"""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute(
-            "DELETE FROM properties WHERE id=? AND owner_id=?",
-            (property_id, owner_id),
-        )
-        deleted = cur.rowcount > 0
-        conn.commit()
-        conn.close()
-        
+        deleted = write(_delete_property, property_id, owner_id).result()
+
         if deleted:
-            print(f"🗑️  Property deleted: ID {property_id}")
+            logger.info("🗑️  Property deleted: ID %s", property_id)
         else:
-            print(f"❌ Property not found or access denied: ID {property_id}")
+            logger.warning("❌ Property not found or access denied: ID %s", property_id)
             
         return deleted
     except Exception as e:
-        print(f"❌ Delete property error: {e}")
+        logger.error("❌ Delete property error: %s", e)
         return False
 
+def _update_property(conn, property_id: int, owner_id: int, updates: dict):
+    # المنطقة بالاسم تحول إلى area_id ضمن مدينة العقار
+    if "area" in updates:
+        city_id = updates.get("city_id")
+        if city_id is None:
+            row = conn.execute(
+                "SELECT city_id FROM properties WHERE id=? AND owner_id=?", (property_id, owner_id)
+            ).fetchone()
+            city_id = row[0] if row else None
+        area = updates.pop("area")
+        # عقار غير موجود: لا ننشئ منطقة، والتحديث لن يطابق أي صف
+        updates["area_id"] = (
+            _area_id(conn, city_id, area, updates.get("lat"), updates.get("lon"))
+            if city_id is not None else None
+        )
+    # النص الموحد للفهرس النصي مع كل عمود مفهرس يتغير
+    for column in FTS_COLUMNS:
+        if column in updates:
+            updates[f"search_{column}"] = _search_text(updates[column])
+
+    # بناء استعلام التحديث ديناميكياً
+    set_clause = ", ".join([f"{key}=?" for key in updates.keys()])
+    values = list(updates.values())
+    values.extend([property_id, owner_id])
+
+    query = f"UPDATE properties SET {set_clause} WHERE id=? AND owner_id=?"
+    return conn.execute(query, values).rowcount > 0
+
 def update_property(property_id: int, owner_id: int, **updates):
     """تحديث بيانات عقار"""
     try:
         if not updates:
             return False
-            
-        conn = get_connection()
-        cur = conn.cursor()
-        
-        # بناء استعلام التحديث ديناميكياً
-        set_clause = ", ".join([f"{key}=?" for key in updates.keys()])
-        values = list(updates.values())
-        values.extend([property_id, owner_id])
-        
-        query = f"UPDATE properties SET {set_clause} WHERE id=? AND owner_id=?"
-        
-        cur.execute(query, values)
-        updated = cur.rowcount > 0
-        conn.commit()
-        conn.close()
-        
+
+        updated = write(_update_property, property_id, owner_id, dict(updates)).result()
+
         if updated:
-            print(f"✏️  Property updated: ID {property_id}")
+            logger.info("✏️  Property updated: ID %s", property_id)
         else:
-            print(f"❌ Property update failed: ID {property_id}")
+            logger.warning("❌ Property update failed: ID %s", property_id)
             
         return updated
     except Exception as e:
-        print(f"❌ Update property error: {e}")
+        logger.error("❌ Update property error: %s", e)
         return False
 
 # اختبار الوظائف عند التشغيل المباشر
 if __name__ == "__main__":
+    configure_logging()
     print("🧪 Testing database module...")
     init_db()
     
@@ -423,8 +2316,4 @@ if __name__ == "__main__":
     if user:
         print(f"👤 Test user: {user['username']} - {user['role']}")
     
-<<<<<<< HEAD
-    print("✅ Database module test completed!")
-=======
     print("✅ Database module test completed!")
->>>>>>> a1d0cd9d871b34fe15847374e5b89751b62300eb
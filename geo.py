@@ -0,0 +1,82 @@
+"""حسابات جغرافية بسيطة: المسافات والمستطيلات المحيطة ونطاق عرض الخريطة"""
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+TILE_SIZE = 256
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float):
+    """المسافة بالكيلومتر بين نقطتين على سطح الأرض"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bbox_around(lat: float, lon: float, radius_km: float):
+    """أصغر مستطيل (min_lat, min_lon, max_lat, max_lon) يحيط بدائرة نصف قطرها radius_km"""
+    d_lat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    d_lon = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return (
+        max(lat - d_lat, -90.0),
+        max(lon - d_lon, -180.0),
+        min(lat + d_lat, 90.0),
+        min(lon + d_lon, 180.0),
+    )
+
+
+def _lat_to_y(lat: float):
+    """خط العرض إلى إحداثي Web Mercator في المجال [0, 1]"""
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    s = math.sin(math.radians(lat))
+    return 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+
+
+def _y_to_lat(y: float):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+
+
+def viewport_bounds(lat: float, lon: float, zoom: float, width_px: float, height_px: float):
+    """المستطيل الظاهر في خريطة مركزها (lat, lon) بمستوى تكبير zoom وحجم بالبكسل"""
+    world_px = TILE_SIZE * (2 ** zoom)
+    half_w = width_px / 2 / world_px
+    half_h = height_px / 2 / world_px
+    x = (lon + 180.0) / 360.0
+    y = _lat_to_y(lat)
+    return (
+        _y_to_lat(min(y + half_h, 1.0)),
+        max((x - half_w) * 360.0 - 180.0, -180.0),
+        _y_to_lat(max(y - half_h, 0.0)),
+        min((x + half_w) * 360.0 - 180.0, 180.0),
+    )
+
+
+def tile_xy(lat: float, lon: float, zoom: int):
+    """رقم مربع الخريطة (x, y) الذي يحوي النقطة بمستوى التكبير zoom (ترقيم XYZ)"""
+    n = 2 ** zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int(_lat_to_y(lat) * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tiles_in_bounds(min_lat: float, min_lon: float, max_lat: float, max_lon: float, zoom: int):
+    """كل مربعات الخريطة (x, y) التي تغطي المستطيل بمستوى التكبير zoom"""
+    x0, y0 = tile_xy(max_lat, min_lon, zoom)
+    x1, y1 = tile_xy(min_lat, max_lon, zoom)
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield x, y
+
+
+def mercator_xy(lat: float, lon: float):
+    """النقطة بإحداثيات Web Mercator في المجال [0, 1] (x من الغرب، y من الشمال)"""
+    return (lon + 180.0) / 360.0, _lat_to_y(lat)
+
+
+def mercator_latlon(x: float, y: float):
+    """عكس mercator_xy"""
+    return _y_to_lat(y), x * 360.0 - 180.0
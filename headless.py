@@ -0,0 +1,251 @@
+"""جلسات Flet بلا عميل: صفحة ft.Page حقيقية فوق اتصال يطبق الأوامر محلياً
+
+    page = headless.new_page()
+    main.main(page)
+    page.connection.wait_for(lambda: headless.current_route(page) == "/login")
+
+الاتصال يعالج أوامر الصفحة (add وupdate وremove...) كما يفعل خادم Flet ويعيد معرفات
+العناصر الجديدة، لكنه لا يرسلها لأي عميل. تستخدمه أدوات القياس لتشغيل main.py دون نافذة.
+
+Driver يقود جلسة كاملة كما يفعل مستخدم: تنقل بين المسارات، تعبئة الحقول، اختيار من
+القوائم، ضغط الأزرار والخريطة. كل تفاعل ينتظر حتى تهدأ الجلسة (لا مهام ولا معالجات
+جارية) ثم يسجل زمنه وعدد عبارات SQL وحجم شجرة العناصر والأوامر المرسلة:
+
+    driver = headless.Driver(main.main)
+    driver.start()
+    driver.login("owner1", "123456")
+    driver.select(driver.find(ft.Dropdown, label="المدينة"), "1")
+    driver.tap_map(driver.find(flet_map.Map), 33.51, 36.28)
+    print(driver.interactions[-1])   # {"name": "tap Map", "ms": ..., "statements": ..., ...}
+"""
+import asyncio
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import flet as ft
+from flet.core.event import Event
+from flet.core.local_connection import LocalConnection
+from flet.core.protocol import PageCommandResponsePayload, PageCommandsBatchResponsePayload
+
+import db
+import ui_profiler
+
+# الأوامر التي يعيد العميل نتيجتها (معرفات العناصر المضافة أو القيمة المطلوبة)
+RESULT_COMMANDS = ("add", "get")
+
+
+class HeadlessConnection(LocalConnection):
+    """اتصال جلسة واحدة يطبق الأوامر على نسخة محلية من شجرة العناصر"""
+
+    def __init__(self, page_url: str = "http://localhost"):
+        super().__init__()
+        self.page_url = page_url
+        self.commands = 0
+        # حجم الأوامر كما كانت سترسل للعميل (JSON)
+        self.bytes = 0
+        self._changed = threading.Condition()
+
+    def _sent(self, commands):
+        size = ui_profiler.payload_size(commands)
+        with self._changed:
+            self.commands += len(commands)
+            self.bytes += size
+            self._changed.notify_all()
+
+    def send_command(self, session_id: str, command):
+        result, _ = self._process_command(command)
+        self._sent([command])
+        return PageCommandResponsePayload(result=result, error="")
+
+    def send_commands(self, session_id: str, commands):
+        results = []
+        for command in commands:
+            result, _ = self._process_command(command)
+            if command.name in RESULT_COMMANDS:
+                results.append(result)
+        self._sent(commands)
+        return PageCommandsBatchResponsePayload(results=results, error="")
+
+    def wait_for(self, predicate, timeout: float = 10.0):
+        """انتظار أوامر الجلسة حتى يتحقق الشرط؛ TimeoutError إذا لم يتحقق خلال المهلة"""
+        with self._changed:
+            if not self._changed.wait_for(predicate, timeout):
+                raise TimeoutError(f"condition not met after {self.commands} commands in {timeout}s")
+
+
+_loop = None
+_loop_lock = threading.Lock()
+_session_ids = itertools.count(1)
+
+
+def get_loop():
+    """حلقة أحداث في خيط خلفي مشتركة بين كل الصفحات (كحلقة خادم Flet)"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="headless-loop", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def new_page(executor=None):
+    """صفحة جديدة بجلسة مستقلة واتصال HeadlessConnection خاص بها"""
+    return ft.Page(HeadlessConnection(), f"headless-{next(_session_ids)}", get_loop(), executor)
+
+
+def current_route(page: ft.Page):
+    """مسار الواجهة العليا إذا كانت قد أرسلت فعلاً (لها معرف)، وإلا None"""
+    view = page.views[-1] if page.views else None
+    return view.route if view is not None and view.uid else None
+
+
+class TrackingExecutor(ThreadPoolExecutor):
+    """مجمع خيوط المعالجات المتزامنة (page.run_thread) يعرف عدد المعالجات الجارية"""
+
+    def __init__(self, max_workers: int = 4):
+        super().__init__(max_workers=max_workers, thread_name_prefix="headless-handler")
+        self._lock = threading.Lock()
+        self.running = 0
+
+    def _done(self, future):
+        with self._lock:
+            self.running -= 1
+
+    def submit(self, fn, /, *args, **kwargs):
+        with self._lock:
+            self.running += 1
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self._done)
+        return future
+
+
+async def _pending_tasks():
+    current = asyncio.current_task()
+    return sum(1 for task in asyncio.all_tasks() if task is not current and not task.done())
+
+
+class Driver:
+    """جلسة main.py بلا عميل تقاد بالأحداث نفسها التي يرسلها عميل Flet، مع قياس كل تفاعل
+
+    عبارات SQL تعد عبر محلل db (يفعل عند إنشاء أول Driver إذا لم يكن مفعلاً)، فيجب ألا
+    تعمل جلسات أخرى في نفس الوقت إذا أريد عد عبارات كل تفاعل بدقة.
+    """
+
+    def __init__(self, app_main, timeout: float = 10.0):
+        self.app_main = app_main
+        self.timeout = timeout
+        self.executor = TrackingExecutor()
+        self.page = new_page(self.executor)
+        self.connection = self.page.connection
+        self.profiler = db.get_profiler() or db.enable_profiling()
+        self.interactions = []
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    # ---------- البحث في شجرة العناصر ----------
+
+    def controls(self):
+        """كل العناصر المعروضة (المضافة فعلاً إلى الصفحة)"""
+        return list(self.page._index.values())
+
+    def find_all(self, cls=ft.Control, **attrs):
+        """العناصر المعروضة من النوع cls التي تطابق كل الخصائص المعطاة (label="..." مثلاً)"""
+        return [
+            c for c in self.page._index.values()
+            if isinstance(c, cls) and all(getattr(c, k, None) == v for k, v in attrs.items())
+        ]
+
+    def find(self, cls=ft.Control, **attrs):
+        """العنصر الوحيد المطابق؛ LookupError إذا لم يوجد أو وجد أكثر من واحد"""
+        found = self.find_all(cls, **attrs)
+        if len(found) != 1:
+            raise LookupError(f"{len(found)} {cls.__name__} controls match {attrs}")
+        return found[0]
+
+    # ---------- الانتظار والقياس ----------
+
+    def wait_idle(self):
+        """انتظار انتهاء كل مهام حلقة الأحداث والمعالجات المتزامنة التي أطلقها التفاعل"""
+        deadline = time.perf_counter() + self.timeout
+        loop = self.page.loop
+        while True:
+            pending = asyncio.run_coroutine_threadsafe(_pending_tasks(), loop).result(self.timeout)
+            if pending == 0 and self.executor.running == 0:
+                return
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"session still busy after {self.timeout}s ({pending} tasks)")
+            time.sleep(0.0005)
+
+    def _statements(self):
+        return sum(s["calls"] for s in self.profiler.snapshot()["statements"])
+
+    def measure(self, name: str, action):
+        """تنفيذ action() ثم انتظار هدوء الجلسة وتسجيل كلفة التفاعل كله"""
+        statements = self._statements()
+        commands, size = self.connection.commands, self.connection.bytes
+        start = time.perf_counter()
+        action()
+        self.wait_idle()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        interaction = {
+            "name": name,
+            "ms": elapsed_ms,
+            "statements": self._statements() - statements,
+            "controls": len(self.page._index),
+            "commands": self.connection.commands - commands,
+            "bytes": self.connection.bytes - size,
+        }
+        self.interactions.append(interaction)
+        return interaction
+
+    # ---------- التفاعلات ----------
+
+    def start(self):
+        """تشغيل main(page) كبداية جلسة جديدة (حتى تظهر واجهة الدخول)"""
+        return self.measure("start", lambda: self.app_main(self.page))
+
+    def go(self, route: str):
+        return self.measure(f"go {route}", lambda: self.page.go(route))
+
+    def _send(self, target: str, name: str, data: str = ""):
+        future = asyncio.run_coroutine_threadsafe(self.page.on_event_async(Event(target, name, data)), self.page.loop)
+        future.result(self.timeout)
+
+    def set_value(self, control, value):
+        """تغيير قيمة حقل كما يفعل العميل (حدث change للصفحة) دون إطلاق on_change"""
+        self._send("page", "change", json.dumps([{"i": control.uid, "value": value}]))
+
+    def fire(self, control, name: str, data=""):
+        """إطلاق حدث عنصر (click أو change أو submit أو tap...) وقياسه"""
+        if not isinstance(data, str):
+            data = json.dumps(data)
+        return self.measure(f"{name} {type(control).__name__}", lambda: self._send(control.uid, name, data))
+
+    def click(self, control):
+        return self.fire(control, "click")
+
+    def select(self, control, value):
+        """اختيار قيمة من قائمة منسدلة"""
+        self.set_value(control, value)
+        return self.fire(control, "change", value)
+
+    def submit(self, control, value):
+        """كتابة نص في حقل ثم ضغط Enter"""
+        self.set_value(control, value)
+        return self.fire(control, "submit", value)
+
+    def tap_map(self, control, lat: float, lon: float):
+        return self.fire(control, "tap", {"lat": lat, "long": lon, "gx": 0, "gy": 0})
+
+    def login(self, username: str, password: str, button_text: str = "متابعة"):
+        """تسجيل الدخول من واجهة الدخول وانتظار الواجهة التالية"""
+        fields = self.find_all(ft.TextField)
+        self.set_value(fields[0], username)
+        self.set_value(fields[1], password)
+        return self.click(self.find(ft.ElevatedButton, text=button_text))
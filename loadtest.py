@@ -0,0 +1,439 @@
+"""اختبار حمل لوضع الخادم: مئات الجلسات المتزامنة تسجل الدخول وتتصفح المدن والمناطق
+
+    python loadtest.py [--sessions 200] [--ramp 10] [--actions 3] [--properties 10000]
+    python loadtest.py --url http://host:8550 --user-prefix user42_ --users 500
+    python loadtest.py --workers 1 2 4 --think 0 --sessions 200     (توسع عمال supervisor.py)
+
+بدون --url يولد قاعدة بيانات مؤقتة (datagen) ويشغل server.py عليها في عملية منفصلة.
+كل جلسة عميل ويب يتكلم بروتوكول Flet عبر websocket كما يفعل المتصفح: يسجل الدخول كمستخدم،
+يختار مدينة ثم منطقة عشوائية، يبحث أحياناً، ويكرر ذلك --actions مرة. زمن الخطوة من إرسال
+الحدث حتى آخر رسالة من الخادم قبل فترة هدوء (--quiet-ms)، فهو يشمل تأخير التجميع في
+الواجهة (150 ms عند تغيير المدينة أو المنطقة).
+
+بعد أن تنهي كل الجلسات تصفحها تبقى مفتوحة معاً حتى تقرأ ذاكرة الخادم من /stats، ثم
+تغلق. النتيجة: p50/p95/p99 لكل خطوة، الذاكرة لكل جلسة مفتوحة، وإحصائيات الذواكر المشتركة.
+
+مع --workers يعاد نفس الحمل على supervisor.py بكل عدد من العمال، ثم جدول بعدد خطوات التصفح
+في الثانية لكل عدد. مع --think 0 تعمل كل جلسة بلا توقف فيقيس الجدول أقصى معدل للخادم.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+CITY_LABEL = "اختر المدينة التي ترغب بالانتقال إليها"
+AREA_LABEL = "اختر المنطقة"
+SEARCH_LABEL = "ابحث في العناوين والوصف والخدمات"
+LOGIN_BUTTON = "متابعة"
+PASSWORD = "123456"
+BROWSE_STEPS = ("city", "area", "search")
+SEARCH_TERMS = ["شقة", "مفروشة", "حديقة", "مصعد", "طاقة شمسية", "مدرسة", "فيلا", "شرفة"]
+
+
+class FletClient:
+    """عميل ويب Flet مبسط: يحفظ شجرة العناصر كما يرسلها الخادم ويرسل الأحداث إليه"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.controls = {}
+        self.messages = 0
+        self.bytes = 0
+        self.last_message = 0.0
+        self.error = None
+        self._changed = asyncio.Event()
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for raw in self.ws:
+                self._apply(json.loads(raw))
+                self.messages += 1
+                self.bytes += len(raw)
+                self.last_message = time.perf_counter()
+                self._changed.set()
+        except Exception as e:  # انقطاع الاتصال أثناء الإغلاق أو تحت الحمل
+            self.error = self.error or repr(e)
+        finally:
+            self._changed.set()
+
+    # ---------- شجرة العناصر ----------
+
+    def _apply(self, message):
+        action, payload = message["action"], message["payload"]
+        if action == "registerWebClient":
+            if payload.get("error"):
+                self.error = payload["error"]
+            self.controls.update(payload["session"]["controls"])
+        elif action == "pageControlsBatch":
+            for m in payload:
+                self._apply(m)
+        elif action == "addPageControls":
+            for cid in payload.get("trimIDs") or []:
+                self._remove(cid)
+            for control in payload["controls"]:
+                self.controls[control["i"]] = control
+                parent = self.controls.get(control["p"])
+                if parent is not None and control["i"] not in parent.setdefault("c", []):
+                    at = int(control.get("at", -1))
+                    parent["c"].insert(at, control["i"]) if at >= 0 else parent["c"].append(control["i"])
+        elif action == "updateControlProps":
+            for props in payload["props"]:
+                control = self.controls.get(props["i"])
+                if control is not None:
+                    control.update(props)
+        elif action == "removeControl":
+            for cid in payload["ids"]:
+                control = self.controls.get(cid)
+                parent = self.controls.get(control["p"]) if control else None
+                if parent is not None and cid in parent.get("c", []):
+                    parent["c"].remove(cid)
+                self._remove(cid)
+        elif action == "cleanControl":
+            for cid in payload["ids"]:
+                control = self.controls.get(cid)
+                if control is not None:
+                    for child in control.get("c", []):
+                        self._remove(child)
+                    control["c"] = []
+        elif action == "sessionCrashed":
+            self.error = payload.get("message", "session crashed")
+
+    def _remove(self, cid):
+        control = self.controls.pop(cid, None)
+        if control is not None:
+            for child in control.get("c", []):
+                self._remove(child)
+
+    def find_all(self, type_name, **attrs):
+        """العناصر من النوع type_name ("textfield" مثلاً) التي تطابق الخصائص، بترتيب إنشائها"""
+        found = [
+            c for c in self.controls.values()
+            if c.get("t") == type_name and all(c.get(k) == v for k, v in attrs.items())
+        ]
+        return sorted(found, key=lambda c: int(c["i"].lstrip("_") or 0))
+
+    def find(self, type_name, **attrs):
+        found = self.find_all(type_name, **attrs)
+        if len(found) != 1:
+            raise LookupError(f"{len(found)} {type_name} controls match {attrs}")
+        return found[0]
+
+    def children(self, control):
+        return [self.controls[c] for c in control.get("c", []) if c in self.controls]
+
+    def has_route(self, route):
+        return any(c.get("t") == "view" and c.get("route") == route for c in self.controls.values())
+
+    # ---------- الإرسال والانتظار ----------
+
+    async def _send(self, action, payload):
+        await self.ws.send(json.dumps({"action": action, "payload": payload}, separators=(",", ":")))
+
+    async def register(self, route="/"):
+        await self._send("registerWebClient", {
+            "pageName": "", "pageRoute": route, "pageWidth": "400", "pageHeight": "800",
+            "windowWidth": "400", "windowHeight": "800", "windowTop": "0", "windowLeft": "0",
+            "isPWA": "false", "isWeb": "true", "isDebug": "false", "platform": "linux",
+            "platformBrightness": "light", "media": "{}", "sessionId": "",
+        })
+
+    async def set_value(self, control, value):
+        """قيمة الحقل كما يرسلها المتصفح عند الكتابة (دون حدث change)"""
+        control["value"] = value
+        await self._send("updateControlProps", {"props": [{"i": control["i"], "value": value}]})
+
+    async def fire(self, control, name, data=""):
+        await self._send("pageEventFromWeb", {"eventTarget": control["i"], "eventName": name, "eventData": data})
+
+    async def close_page(self):
+        await self._send("pageEventFromWeb", {"eventTarget": "page", "eventName": "close", "eventData": ""})
+
+    async def wait_for(self, predicate, timeout):
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            if self.error:
+                raise RuntimeError(self.error)
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError("condition not met")
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def settle(self, start, quiet, timeout):
+        """زمن آخر رسالة وصلت بعد start ولم تتبعها رسائل خلال quiet ثانية (بالميلي ثانية)"""
+        deadline = start + timeout
+        await self.wait_for(lambda: self.last_message > start, timeout)
+        while True:
+            idle = quiet - (time.perf_counter() - self.last_message)
+            if idle <= 0:
+                return (self.last_message - start) * 1000
+            if time.perf_counter() > deadline:
+                raise TimeoutError("session never went quiet")
+            await asyncio.sleep(min(idle, 0.05))
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def browse(number, args, rng, timings, errors, browsed, release):
+    """جلسة مستخدم واحد: دخول، ثم مدينة ومنطقة وبحث --actions مرة، ثم انتظار الإغلاق"""
+    import websockets
+
+    quiet, timeout = args.quiet_ms / 1000, args.timeout
+    username = f"{args.user_prefix}{number % args.users}"
+    step = "connect"
+    try:
+        async with websockets.connect(args.ws_url, max_size=None, open_timeout=timeout) as ws:
+            client = FletClient(ws)
+
+            async def measure(name, action):
+                nonlocal step
+                step = name
+                start = time.perf_counter()
+                await action()
+                timings.setdefault(name, []).append(await client.settle(start, quiet, timeout))
+
+            async def open_app():
+                await client.register()
+                await client.wait_for(lambda: client.find_all("elevatedbutton", text=LOGIN_BUTTON), timeout)
+
+            async def login():
+                fields = client.find_all("textfield")
+                await client.set_value(fields[0], username)
+                await client.set_value(fields[1], PASSWORD)
+                await client.fire(client.find("elevatedbutton", text=LOGIN_BUTTON), "click")
+                await client.wait_for(lambda: client.has_route("/user"), timeout)
+
+            async def choose(label):
+                dropdown = client.find("dropdown", label=label)
+                options = [o["key"] for o in client.children(dropdown) if o.get("disabled") != "true"]
+                if not options:
+                    return
+                value = rng.choice(options)
+                await client.set_value(dropdown, value)
+                await client.fire(dropdown, "change", value)
+
+            async def search():
+                field = client.find("textfield", label=SEARCH_LABEL)
+                term = rng.choice(SEARCH_TERMS)
+                await client.set_value(field, term)
+                await client.fire(field, "submit", term)
+
+            await measure("open", open_app)
+            await measure("login", login)
+            for _ in range(args.actions):
+                await asyncio.sleep(rng.uniform(0, args.think))
+                await measure("city", lambda: choose(CITY_LABEL))
+                await asyncio.sleep(rng.uniform(0, args.think))
+                await measure("area", lambda: choose(AREA_LABEL))
+                if rng.random() < args.search_ratio:
+                    await asyncio.sleep(rng.uniform(0, args.think))
+                    await measure("search", search)
+            step = "hold"
+            browsed.append(client.bytes)
+            await release.wait()
+            await client.close_page()
+    except Exception as e:
+        errors.append(f"{username} at {step}: {type(e).__name__}: {e}")
+
+
+def fetch_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/stats", timeout=30) as response:
+        return json.loads(response.read())
+
+
+async def run_load(args):
+    rng = random.Random(args.seed)
+    timings, errors, browsed = {}, [], []
+    release = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    before = await loop.run_in_executor(None, fetch_stats, args.base_url)
+    start = time.perf_counter()
+    delay = args.ramp / max(1, args.sessions)
+    tasks = []
+    for i in range(args.sessions):
+        tasks.append(asyncio.create_task(
+            browse(i, args, random.Random(rng.random()), timings, errors, browsed, release)))
+        await asyncio.sleep(delay)
+
+    # كل الجلسات مفتوحة معاً حتى تنهي تصفحها (أو تفشل)، عندها تقاس ذاكرة الخادم
+    while len(browsed) + len(errors) < args.sessions:
+        await asyncio.sleep(0.1)
+    browse_seconds = time.perf_counter() - start
+    peak = await loop.run_in_executor(None, fetch_stats, args.base_url)
+    release.set()
+    await asyncio.gather(*tasks)
+    return {
+        "timings": timings, "errors": errors, "received": browsed,
+        "seconds": browse_seconds, "before": before, "peak": peak,
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(base_url, process, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            return fetch_stats(base_url)
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"server not ready after {timeout}s")
+
+
+def generate_db(args, tmp):
+    """قاعدة بيانات مولدة في tmp؛ يعيد بيئة العمليات التي تستخدمها"""
+    env = dict(os.environ, CITY_MOVER_DB=str(Path(tmp) / "loadtest.db"))
+    generate = (f"import datagen, db; db.init_db(); "
+                f"datagen.generate({args.users * 3 // 2}, {args.properties}, seed={args.seed})")
+    subprocess.run([sys.executable, "-c", generate], cwd=Path(__file__).parent, env=env, check=True)
+    return env
+
+
+def start_server(args, env, tmp, workers: int = None):
+    """server.py (أو supervisor.py بعدد workers من العمال) على قاعدة env؛ يعيد العملية وعنوانها"""
+    here = Path(__file__).parent
+    port = _free_port()
+    if workers:
+        command = [str(here / "supervisor.py"), "--workers", str(workers)]
+    else:
+        command = [str(here / "server.py")]
+    log_path = Path(tmp) / f"server-{workers or 0}.log"
+    log = open(log_path, "w")
+    process = subprocess.Popen(
+        [sys.executable, *command, "--port", str(port), "--session-timeout", "30"],
+        cwd=here, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(base_url, process)
+    except Exception:
+        process.kill()
+        print(log_path.read_text()[-4000:])
+        raise
+    return process, base_url
+
+
+def run_against(args, base_url):
+    args.base_url = base_url
+    args.ws_url = base_url.replace("http", "ws", 1) + "/ws"
+    print(f"🚦 {args.sessions} sessions against {base_url} over {args.ramp:.0f}s")
+    return asyncio.run(run_load(args))
+
+
+def report(args, result):
+    print(f"\n{'step':8} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    everything = []
+    for name in ("open", "login", "city", "area", "search"):
+        times = sorted(result["timings"].get(name, []))
+        if not times:
+            continue
+        everything += times
+        print(f"{name:8} {len(times):>6} {_percentile(times, 0.5):>9.0f} {_percentile(times, 0.95):>9.0f} "
+              f"{_percentile(times, 0.99):>9.0f} {times[-1]:>9.0f}")
+    everything.sort()
+    print(f"{'all':8} {len(everything):>6} {_percentile(everything, 0.5):>9.0f} "
+          f"{_percentile(everything, 0.95):>9.0f} {_percentile(everything, 0.99):>9.0f} "
+          f"{everything[-1] if everything else 0:>9.0f}")
+
+    before, peak = result["before"], result["peak"]
+    open_sessions = peak["sessions"] - before["sessions"]
+    grown = peak["rss_bytes"] - before["rss_bytes"]
+    print(f"\n👥 {open_sessions} sessions open at peak ({len(result['errors'])} failed), "
+          f"{len(everything)} steps in {result['seconds']:.1f}s")
+    print(f"🧠 Server RSS {before['rss_bytes'] / 2**20:.0f} MB -> {peak['rss_bytes'] / 2**20:.0f} MB "
+          f"({grown / max(1, open_sessions) / 1024:.0f} KB per session, incl. shared cache growth)")
+    if result["received"]:
+        print(f"📦 {sum(result['received']) / len(result['received']) / 1024:.0f} KB received per session")
+    print(f"🗄️  DB connections {peak['db_connections']}, db workers {peak['db_workers']}")
+    for name, cache in peak["caches"].items():
+        print(f"   {name}: {cache}")
+    for error in result["errors"][:10]:
+        print(f"❌ {error}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({**result, "args": vars(args)}, f, ensure_ascii=False, indent=2, default=str)
+        print(f"💾 Results saved to {args.output}")
+
+
+def report_scaling(results):
+    """خطوات التصفح (مدينة ومنطقة وبحث) في الثانية وزمنها مع كل عدد من العمال"""
+    print(f"\n{'workers':>7} {'browse':>7} {'req/sec':>8} {'p50 ms':>8} {'p95 ms':>8} {'failed':>7}")
+    baseline = None
+    for workers, result in results.items():
+        times = sorted(t for name in BROWSE_STEPS for t in result["timings"].get(name, []))
+        rate = len(times) / result["seconds"] if result["seconds"] else 0
+        baseline = baseline or rate
+        print(f"{workers:>7} {len(times):>7} {rate:>8.1f} {_percentile(times, 0.5):>8.0f} "
+              f"{_percentile(times, 0.95):>8.0f} {len(result['errors']):>7}   x{rate / baseline:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="City Mover web server load test")
+    parser.add_argument("--url", help="existing server (http://host:port; remote servers need --public-stats); "
+                                      "default: start one on a generated DB")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        help="run once per worker count through supervisor.py (e.g. 1 2 4)")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--ramp", type=float, default=10.0, help="seconds to open all sessions")
+    parser.add_argument("--actions", type=int, default=3, help="city/area/search rounds per session")
+    parser.add_argument("--think", type=float, default=1.0, help="max think time between steps (s)")
+    parser.add_argument("--search-ratio", type=float, default=0.5)
+    parser.add_argument("--quiet-ms", type=float, default=300.0, help="silence that ends a step")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--users", type=int, default=500, help="distinct user accounts to log in as")
+    parser.add_argument("--user-prefix", default=None, help="default: datagen's user{seed}_")
+    parser.add_argument("--properties", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write raw timings and stats as JSON")
+    args = parser.parse_args()
+    args.user_prefix = args.user_prefix or f"user{args.seed}_"
+
+    if args.url:
+        result = run_against(args, args.url.rstrip("/"))
+        report(args, result)
+        return 1 if result["errors"] else 0
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = generate_db(args, tmp)
+        for workers in args.workers or [None]:
+            process, base_url = start_server(args, env, tmp, workers)
+            try:
+                if workers:
+                    print(f"\n👷 {workers} worker(s) behind supervisor.py")
+                result = run_against(args, base_url)
+            finally:
+                process.terminate()
+                process.wait(10)
+            report(args, result)
+            results[workers] = result
+    if args.workers:
+        report_scaling(results)
+    return 1 if any(r["errors"] for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,60 +1,82 @@
 import flet as ft
-import sqlite3
+import logging
+import math
 import os
-from pathlib import Path
-
-# استيراد مكتبة flet_map إذا كانت متوفرة
-try:
-    import flet_map as map
-except ImportError:
-    # إذا لم تكن متوفرة، استخدم بديل
-    class MockMap:
-        def __init__(self, *args, **kwargs):
-            pass
-            
-        def __getattr__(self, name):
-            return lambda *args, **kwargs: None
-            
-    class MockMapLatitudeLongitude:
-        def __init__(self, lat, lon):
-            self.latitude = lat
-            self.longitude = lon
-            
-    class MockMapTapEvent:
-        def __init__(self):
-            self.name = "tap"
-            self.coordinates = MockMapLatitudeLongitude(0, 0)
-            
-    class MockTileLayer:
-        def __init__(self, *args, **kwargs):
-            pass
-            
-    class MockMarkerLayer:
-        def __init__(self, *args, **kwargs):
-            self.markers = []
-            
-    class MockMarker:
-        def __init__(self, *args, **kwargs):
-            pass
-            
-    class MapInteractiveFlag:
-        ALL = "all"
-        
-    class MapInteractionConfiguration:
-        def __init__(self, flags=None):
-            self.flags = flags
-            
-    map = MockMap()
-    map.Map = MockMap
-    map.MapLatitudeLongitude = MockMapLatitudeLongitude
-    map.MapTapEvent = MockMapTapEvent
-    map.TileLayer = MockTileLayer
-    map.MarkerLayer = MockMarkerLayer
-    map.Marker = MockMarker
-    map.MapInteractiveFlag = MapInteractiveFlag
-    map.MapInteractionConfiguration = MapInteractionConfiguration
+from contextlib import asynccontextmanager
 
+import async_db
+import cards
 import db
+import geo
+import shared
+import tiles
+from scheduler import RequestScheduler
+
+logger = logging.getLogger("city_mover.app")
+
+_map_module = None
+
+
+def load_map():
+    """مكتبة flet_map (أو بديل إذا لم تكن متوفرة)؛ تستورد عند أول واجهة فيها خريطة لا عند بدء التطبيق"""
+    global _map_module
+    if _map_module is None:
+        _map_module = _import_map()
+    return _map_module
+
+
+def _import_map():
+    try:
+        import flet_map as map
+    except ImportError:
+        # إذا لم تكن متوفرة، استخدم بديل
+        class MockMap:
+            def __init__(self, *args, **kwargs):
+                pass
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: None
+
+        class MockMapLatitudeLongitude:
+            def __init__(self, lat, lon):
+                self.latitude = lat
+                self.longitude = lon
+
+        class MockMapTapEvent:
+            def __init__(self):
+                self.name = "tap"
+                self.coordinates = MockMapLatitudeLongitude(0, 0)
+
+        class MockTileLayer:
+            def __init__(self, *args, **kwargs):
+                pass
+
+        class MockMarkerLayer:
+            def __init__(self, *args, **kwargs):
+                self.markers = []
+
+        class MockMarker:
+            def __init__(self, *args, **kwargs):
+                pass
+
+        class MapInteractiveFlag:
+            ALL = "all"
+
+        class MapInteractionConfiguration:
+            def __init__(self, flags=None):
+                self.flags = flags
+
+        map = MockMap()
+        map.Map = MockMap
+        map.MapLatitudeLongitude = MockMapLatitudeLongitude
+        map.MapTapEvent = MockMapTapEvent
+        map.TileLayer = MockTileLayer
+        map.MarkerLayer = MockMarkerLayer
+        map.Marker = MockMarker
+        map.MapInteractiveFlag = MapInteractiveFlag
+        map.MapInteractionConfiguration = MapInteractionConfiguration
+    return map
+
 
 def main(page: ft.Page):
     # إعدادات خاصة بالأندرويد
@@ -80,27 +102,22 @@ def main(page: ft.Page):
     SURFACE_COLOR = "#FFFFFF"
     TEXT_COLOR = "#1E293B"
 
-    # تهيئة قاعدة البيانات
-    db.init_db()
+    # تهيئة العملية (المخطط والبيانات الافتراضية) تحدث مرة واحدة فقط؛ هنا لا تفعل شيئاً بعد أول جلسة
+    db.bootstrap()
+
+    # طلبات البيانات في هذه الجلسة: تأخير التغييرات السريعة والأحدث يفوز
+    scheduler = RequestScheduler()
+
+    # تشخيص التحديثات (CITY_MOVER_UI_PROFILE=1): حجم وزمن كل update()
+    # ui_profiler يعتمد على واجهات Flet الداخلية، فلا يستورد إلا عند التفعيل
+    if os.environ.get("CITY_MOVER_UI_PROFILE", "0") == "1":
+        import ui_profiler
+        ui_profiler.instrument(page)
 
     # تخزين بيانات الجلسة
     if not page.session.contains_key("user"):
         page.session.set("user", None)
 
-    # ---------- مناطق دمشق المفعلة ----------
-    DAMASCUS_ACTIVE_AREAS = ["المزة", "كفرسوسة", "الميدان"]
-    
-    # ---------- جميع مناطق دمشق ----------
-    DAMASCUS_ALL_AREAS = [
-        "المزة", "كفرسوسة", "الميدان", "القدم", "القصاع", "المالكي", "أبو رمانة",
-        "البرامكة", "ركن الدين", "الصالحية", "الشعلان", "المهاجرين", "العدوي",
-        "القنوات", "باب توما", "باب شرقي", "ساروجة", "العفيف", "الجسر الأبيض",
-        "الزاهرة", "الرحمانية", "دمر", "السبينة", "جوبر", "حرستا", "دوما",
-        "داريا", "معضمية الشام", "صحنايا", "الكسوة", "التضامن", "الهامة",
-        "قدسيا", "يملك", "القدم", "القابون", "برزة", "القطيفة", "الخضيري",
-        "الزبداني", "بلد", "جرمانا", "سقبا", "معربا", "عربين", "حزة", "ببيلا"
-    ]
-
     # ---------- عناصر مشتركة ----------
 
     def create_logo():
@@ -164,6 +181,7 @@ def main(page: ft.Page):
         )
 
     def logout(e=None):
+        logger.info("📊 Session data requests: %s", scheduler.summary())
         page.session.set("user", None)
         page.go("/login")
 
@@ -208,6 +226,75 @@ def main(page: ft.Page):
             width=160 if not expand else None,
         )
 
+    def create_loading_bar():
+        """شريط تحميل يظهر أثناء تنفيذ الاستعلامات في الخلفية"""
+        return ft.ProgressBar(visible=False, color=SECONDARY_COLOR, bgcolor=ft.Colors.TRANSPARENT, data=0)
+
+    def update_controls(*controls):
+        """إرسال العناصر المتغيرة فقط بدل page.update() (العناصر غير المعروضة بعد ترسل مع واجهتها)"""
+        mounted = [c for c in controls if c is not None and c.page]
+        if mounted:
+            page.update(*mounted)
+
+    # شريط رسائل واحد للجلسة: فتحه يرسل الشريط وحده
+    snack_bar = ft.SnackBar(content=ft.Text(""), action="موافق")
+
+    def show_snack(text: str, color=None):
+        snack_bar.content.value = text
+        snack_bar.bgcolor = color
+        page.open(snack_bar)
+
+    @asynccontextmanager
+    async def loading(indicator):
+        """إظهار مؤشر التحميل طوال تنفيذ الكتلة (يبقى ظاهراً ما دامت مهمة أخرى تستخدمه)"""
+        indicator.data += 1
+        indicator.visible = True
+        update_controls(indicator)
+        try:
+            yield
+        finally:
+            indicator.data -= 1
+            indicator.visible = indicator.data > 0
+            update_controls(indicator)
+
+    def area_options(facets, by_id: bool = False, disable_empty: bool = False):
+        """خيارات قائمة المناطق مع عدد الإعلانات ونطاق الإيجار في كل منطقة وتمييز المناطق المفعلة"""
+        options = []
+        for f in facets:
+            mark = " ✓" if f["active"] else ""
+            key = str(f["area_id"]) if by_id else f["area"]
+            text = f"{f['area']} ({f['count']}){mark}"
+            if f["median_rent"] is not None:
+                text += (
+                    f" · {short_rent(f['min_rent'])} / ≈{short_rent(f['median_rent'])} / "
+                    f"{short_rent(f['max_rent'])}"
+                )
+            options.append(ft.dropdown.Option(key, text, disabled=disable_empty and not f["count"]))
+        return options
+
+    def short_rent(rent):
+        """إيجار مختصر لقائمة المناطق: 750 ألف، 1.2 مليون"""
+        if rent >= 1_000_000:
+            return f"{rent / 1_000_000:,.1f}".rstrip("0").rstrip(".") + " مليون"
+        if rent >= 1_000:
+            return f"{rent / 1_000:,.0f} ألف"
+        return f"{rent:,.0f}"
+
+    def active_areas_text(facets):
+        """أسماء المناطق المفعلة في المدينة (فارغ إذا كانت كل المناطق مفتوحة)"""
+        return ", ".join(f["area"] for f in facets if f["active"])
+
+    def describe_area_facet(facet):
+        """ملخص المنطقة: عدد الإعلانات ونطاق الإيجار (من area_stats - بدون تجميع)"""
+        text = f"{facet['count']} إعلان"
+        if facet["median_rent"] is not None:
+            # الوسيط تقريبي من مدرج فئات الإيجار (db.RENT_BUCKETS)
+            text += (
+                f" - الإيجار: أدنى {facet['min_rent']:,.0f}، وسيط تقريبي ≈{facet['median_rent']:,.0f}، "
+                f"أعلى {facet['max_rent']:,.0f} ل.س"
+            )
+        return text
+
     # ---------- شاشة تسجيل الدخول / إنشاء حساب ----------
 
     def login_view():
@@ -263,16 +350,17 @@ def main(page: ft.Page):
         )
 
         msg = ft.Text(color=ERROR_COLOR, size=14)
+        login_progress = create_loading_bar()
 
-        def submit(e):
-            nonlocal username, password
+        async def submit_async():
             if mode_tabs.selected_index == 0:
                 # تسجيل الدخول
-                user = db.get_user_by_credentials(username.value.strip(), password.value.strip())
+                async with loading(login_progress):
+                    user = await async_db.get_user_by_credentials(username.value.strip(), password.value.strip())
                 if not user:
                     msg.value = "بيانات الدخول غير صحيحة، حاول مرة أخرى."
                     msg.color = ERROR_COLOR
-                    page.update()
+                    update_controls(msg)
                     return
                 page.session.set("user", user)
                 if user["role"] == "owner":
@@ -287,15 +375,16 @@ def main(page: ft.Page):
                 if not uname or not pwd:
                     msg.value = "الرجاء إدخال اسم مستخدم وكلمة مرور."
                     msg.color = ERROR_COLOR
-                    page.update()
+                    update_controls(msg)
                     return
                 try:
-                    user_id = db.create_user(uname, pwd, role)
+                    async with loading(login_progress):
+                        user_id = await async_db.create_user(uname, pwd, role)
                     new_user = {"id": user_id, "username": uname, "role": role}
                     page.session.set("user", new_user)
                     msg.value = "تم إنشاء الحساب بنجاح! تم تسجيل الدخول تلقائياً."
                     msg.color = SUCCESS_COLOR
-                    page.update()
+                    update_controls(msg)
                     if role == "owner":
                         page.go("/owner")
                     else:
@@ -303,7 +392,10 @@ def main(page: ft.Page):
                 except Exception as ex:
                     msg.value = f"خطأ في إنشاء الحساب: {ex}"
                     msg.color = ERROR_COLOR
-                    page.update()
+                    update_controls(msg)
+
+        def submit(e):
+            page.run_task(submit_async)
 
         submit_btn = create_touch_button(
             "متابعة", 
@@ -346,6 +438,7 @@ def main(page: ft.Page):
                             alignment=ft.alignment.center,
                             padding=15,
                         ),
+                        login_progress,
                         msg,
                     ])
                 ),
@@ -399,6 +492,7 @@ def main(page: ft.Page):
             page.go("/login")
             return login_view()
 
+        map = load_map()
         cities = db.get_cities()
         city_dropdown = ft.Dropdown(
             label="اختر المدينة التي ترغب بالانتقال إليها",
@@ -421,104 +515,176 @@ def main(page: ft.Page):
             text_size=16,
         )
 
+        search_field = ft.TextField(
+            label="ابحث في العناوين والوصف والخدمات",
+            prefix_icon=ft.Icons.SEARCH,
+            expand=True,
+            border_color=PRIMARY_COLOR,
+            filled=True,
+            bgcolor="white",
+            text_size=16,
+        )
+
         selected_city_name = ft.Text("", size=18, weight=ft.FontWeight.BOLD, color=PRIMARY_COLOR)
         selected_area_name = ft.Text("", size=14, color=TEXT_COLOR)
+        # عدد الإعلانات وإحصائيات الإيجار لمناطق المدينة المختارة
+        area_facets = {}
         
-        properties_container = ft.Column(spacing=15)
         tips_container = ft.Column(spacing=10)
+        user_progress = create_loading_bar()
 
         # طبقة الماركر لخريطة الباحث عن منزل
         user_marker_layer_ref = ft.Ref[map.MarkerLayer]()
 
+        # موقع الخريطة الحالي - يستخدم لحساب المستطيل الظاهر والمجموعات داخله
+        map_view = {"lat": 33.5138, "lon": 36.2765, "zoom": 11, "selected": None}
+        USER_MAP_HEIGHT = 300
+        RESULTS_HEIGHT = 600
+        # فهرس تجميع عقارات المدينة/المنطقة المختارة وآخر ما رسم منه
+        map_index = {"index": None, "rendered": None}
+
+        def make_cluster_marker(c):
+            """علامة دائرية بعدد عقارات المجموعة؛ الضغط عليها يكبر حتى تنقسم"""
+            size = min(28 + 6 * int(math.log10(c.count)), 48)
+
+            def zoom_in(e, lat=c.lat, lon=c.lon, zoom=c.expansion_zoom):
+                map_view.update(lat=lat, lon=lon, zoom=zoom)
+                user_map.center_on(map.MapLatitudeLongitude(lat, lon), zoom=zoom)
+                render_map_markers()
+
+            return map.Marker(
+                content=ft.Container(
+                    content=ft.Text(str(c.count), size=12, weight=ft.FontWeight.BOLD, color="white"),
+                    bgcolor=PRIMARY_COLOR,
+                    border_radius=size / 2,
+                    alignment=ft.alignment.center,
+                    on_click=zoom_in,
+                ),
+                coordinates=map.MapLatitudeLongitude(c.lat, c.lon),
+                width=size,
+                height=size,
+            )
+
+        def render_map_markers():
+            """رسم المجموعات حول نطاق الخريطة الظاهر
+
+            العلامات لا يعاد بناؤها إلا إذا تغير مستوى التكبير في الفهرس أو خرجت الخريطة من
+            النطاق المرسوم (3x3 شاشات) أو تغير العقار المحدد.
+            """
+            index = map_index["index"]
+            if not user_marker_layer_ref.current or index is None:
+                return
+            width, height = page.width or 400, USER_MAP_HEIGHT
+            bucket = index.zoom_bucket(map_view["zoom"])
+            viewport = geo.viewport_bounds(map_view["lat"], map_view["lon"], map_view["zoom"], width, height)
+            rendered = map_index["rendered"]
+            if (
+                rendered is not None
+                and rendered["index"] is index
+                and rendered["bucket"] == bucket
+                and rendered["selected"] == map_view["selected"]
+                and rendered["region"][0] <= viewport[0] and rendered["region"][1] <= viewport[1]
+                and rendered["region"][2] >= viewport[2] and rendered["region"][3] >= viewport[3]
+            ):
+                return
+
+            region = geo.viewport_bounds(map_view["lat"], map_view["lon"], map_view["zoom"], width * 3, height * 3)
+            selected = map_view["selected"]
+            markers = user_marker_layer_ref.current.markers
+            markers.clear()
+            for c in index.clusters(region, map_view["zoom"])[:db.MAP_MARKER_LIMIT]:
+                if c.count > 1:
+                    markers.append(make_cluster_marker(c))
+                elif not selected or c.id != selected["id"]:
+                    markers.append(
+                        map.Marker(
+                            content=ft.Icon(ft.Icons.HOME, color=PRIMARY_COLOR, tooltip=c.title),
+                            coordinates=map.MapLatitudeLongitude(c.lat, c.lon),
+                        )
+                    )
+            if selected:
+                # العقار المحدد يظهر منفرداً فوق المجموعات
+                markers.append(
+                    map.Marker(
+                        content=ft.Icon(ft.Icons.HOME, color=ft.Colors.RED, tooltip=selected["title"]),
+                        coordinates=map.MapLatitudeLongitude(selected["lat"], selected["lon"]),
+                    )
+                )
+            map_index["rendered"] = {"index": index, "bucket": bucket, "region": region, "selected": selected}
+            update_controls(user_marker_layer_ref.current)
+
+        async def load_map_index(city_id: int, area_id: int = None, debounce: bool = True):
+            """بناء فهرس التجميع لكل عقارات المدينة (أو المنطقة) على مجمع الخيوط ثم رسمه"""
+
+            async def fetch():
+                # الفهرس مشترك بين كل الجلسات التي تعرض نفس المدينة أو المنطقة
+                return await async_db.run(shared.get_map_index, city_id, area_id)
+
+            def render(index):
+                map_index["index"] = index
+                render_map_markers()
+
+            await scheduler.request("map", (city_id, area_id), fetch, render, debounce=debounce)
+
+        def handle_user_map_move(e):
+            coords = getattr(e, "coordinates", None)
+            if coords is not None:
+                map_view["lat"] = coords.latitude
+                map_view["lon"] = coords.longitude
+            zoom = getattr(e, "zoom", None)
+            if zoom is not None:
+                map_view["zoom"] = zoom
+            render_map_markers()
+
         user_map = map.Map(
             expand=True,
-            height=300,
-            initial_center=map.MapLatitudeLongitude(33.5138, 36.2765),  # دمشق
-            initial_zoom=11,
+            height=USER_MAP_HEIGHT,
+            initial_center=map.MapLatitudeLongitude(map_view["lat"], map_view["lon"]),  # دمشق
+            initial_zoom=map_view["zoom"],
             interaction_configuration=map.MapInteractionConfiguration(
                 flags=map.MapInteractiveFlag.ALL
             ),
+            on_position_change=handle_user_map_move,
             layers=[
                 map.TileLayer(
-                    url_template="https://tile.openstreetmap.org/{z}/{x}/{y}.png",
+                    url_template=tiles.url_template(),
                 ),
                 map.MarkerLayer(ref=user_marker_layer_ref, markers=[]),
             ],
         )
 
-        def get_all_areas_by_city(city_id: int):
-            """جلب جميع المناطق المتاحة لمدينة معينة من قاعدة البيانات"""
-            conn = db.get_connection()
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT DISTINCT area FROM properties 
-                WHERE city_id = ? AND area IS NOT NULL AND area != ''
-            """, (city_id,))
-            areas = [row[0] for row in cur.fetchall()]
-            conn.close()
-            return areas
-
-        def get_properties_by_city_and_area(city_id: int, area: str):
-            """جلب العقارات بناءً على المدينة والمنطقة"""
-            conn = db.get_connection()
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT p.id, p.title, p.area, p.description, p.rent, p.lat, p.lon, p.services,
-                       u.username as owner_username
-                FROM properties p
-                JOIN users u ON p.owner_id = u.id
-                WHERE p.city_id = ? AND p.area = ?
-            """, (city_id, area))
-            properties = []
-            for row in cur.fetchall():
-                properties.append({
-                    "id": row[0],
-                    "title": row[1],
-                    "area": row[2],
-                    "description": row[3],
-                    "rent": row[4],
-                    "lat": row[5],
-                    "lon": row[6],
-                    "services": row[7],
-                    "owner_username": row[8]
-                })
-            conn.close()
-            return properties
-
-        def load_areas_for_city(city_id: int):
-            """تحميل جميع المناطق المتاحة للمدينة المختارة"""
+        async def load_areas_for_city(city_id: int):
+            """تحميل جميع المناطق المتاحة للمدينة المختارة؛ يعيد False إذا تجاوزه اختيار أحدث"""
             area_dropdown.options.clear()
             area_dropdown.disabled = True
             
-            city = db.get_city_by_id(city_id)
-            if not city:
-                return
-                
-            city_name = city["name"]
-            
-            if city_name == "دمشق":
-                # لدمشق: نعرض جميع المناطق مع تمييز المناطق المفعلة
-                for area in DAMASCUS_ALL_AREAS:
-                    is_active = area in DAMASCUS_ACTIVE_AREAS
-                    area_text = f"{area} {'✓' if is_active else ''}"
-                    area_dropdown.options.append(ft.dropdown.Option(area, area_text))
-                
-                area_dropdown.disabled = False
-                selected_area_name.value = f"المناطق المفعلة: {', '.join(DAMASCUS_ACTIVE_AREAS)}"
-                selected_area_name.color = SUCCESS_COLOR
-            else:
-                # للمدن الأخرى: نعرض المناطق من قاعدة البيانات
-                all_areas = get_all_areas_by_city(city_id)
-                for area in all_areas:
-                    area_dropdown.options.append(ft.dropdown.Option(area, area))
+            # المدن في الذاكرة المؤقتة - لا تحتاج خيطاً
+            if not db.get_city_by_id(city_id):
+                return False
+
+            async def fetch():
+                async with loading(user_progress):
+                    return await async_db.get_area_facets(city_id)
+
+            def render(facets):
+                area_facets.clear()
+                area_facets.update((f["area_id"], f) for f in facets)
+                # المناطق بدون إعلانات معطلة - لا فائدة من اختيارها
+                area_dropdown.options[:] = area_options(facets, by_id=True, disable_empty=True)
+                active = active_areas_text(facets)
+                if active:
+                    selected_area_name.value = f"المناطق المفعلة: {active}"
+                    selected_area_name.color = SUCCESS_COLOR
+                else:
+                    selected_area_name.value = f"المناطق المتاحة: {len(facets)} منطقة"
+                    selected_area_name.color = TEXT_COLOR
                 area_dropdown.disabled = False
-                selected_area_name.value = f"المناطق المتاحة: {len(all_areas)} منطقة"
-                selected_area_name.color = TEXT_COLOR
-            
-            area_dropdown.value = None
-            # تفريغ قائمة العقارات
-            properties_container.controls.clear()
-            page.update()
+                area_dropdown.value = None
+                # تفريغ قائمة العقارات
+                property_list.set_items([])
+                update_controls(area_dropdown, selected_area_name, property_list.view)
+
+            return await scheduler.request("areas", city_id, fetch, render)
 
         def load_tips_for_city(city_name: str):
             tips_container.controls.clear()
@@ -544,22 +710,10 @@ def main(page: ft.Page):
             """فتح نافذة للتواصل مع المالك"""
             def send_message(e):
                 if message_field.value.strip():
-                    page.snack_bar = ft.SnackBar(
-                        content=ft.Text(f"تم إرسال رسالتك إلى {owner_username}"),
-                        bgcolor=SUCCESS_COLOR,
-                        action="موافق",
-                    )
-                    page.snack_bar.open = True
-                    page.update()
+                    show_snack(f"تم إرسال رسالتك إلى {owner_username}", SUCCESS_COLOR)
                     page.close(dlg)
                 else:
-                    page.snack_bar = ft.SnackBar(
-                        content=ft.Text("الرجاء كتابة رسالة"),
-                        bgcolor=WARNING_COLOR,
-                        action="موافق",
-                    )
-                    page.snack_bar.open = True
-                    page.update()
+                    show_snack("الرجاء كتابة رسالة", WARNING_COLOR)
 
             message_field = ft.TextField(
                 label="رسالتك إلى المالك",
@@ -595,20 +749,107 @@ def main(page: ft.Page):
             
             page.open(dlg)
 
-        def show_properties(e=None):
-            properties_container.controls.clear()
-            if user_marker_layer_ref.current:
-                user_marker_layer_ref.current.markers.clear()
+        # حالة ترقيم الصفحات للقائمة المعروضة حالياً
+        paging = {"area_id": None, "cursor": None, "has_more": False}
+
+        def reset_paging(**values):
+            # صفحة لاحقة ما زالت قيد التحميل تخص القائمة السابقة
+            scheduler.cancel("page")
+            paging.update(area_id=None, cursor=None, has_more=False)
+            paging.update(values)
+            search_note.visible = False
+
+        # معالجات أزرار البطاقات مشتركة بين كل البطاقات: العقار يعرف من data في الزر
+        def show_on_map(e):
+            p = property_list.by_id.get(e.control.data)
+            if not p or p["lat"] is None or p["lon"] is None:
+                show_snack("لا توجد إحداثيات لهذا المنزل.", WARNING_COLOR)
+                return
 
-            if not city_dropdown.value:
-                properties_container.controls.append(
-                    ft.Container(
-                        content=ft.Text("الرجاء اختيار مدينة أولاً.", color=ERROR_COLOR),
-                        padding=10,
-                        alignment=ft.alignment.center,
-                    )
+            # تمركز الخريطة على المنزل مع إبقاء باقي العقارات الظاهرة
+            lat, lon = p["lat"], p["lon"]
+            map_view.update(lat=lat, lon=lon, zoom=15, selected={"id": p["id"], "lat": lat, "lon": lon, "title": p["title"]})
+            user_map.center_on(map.MapLatitudeLongitude(lat, lon), zoom=15)
+            render_map_markers()
+
+        def open_google_maps(e):
+            p = property_list.by_id.get(e.control.data)
+            if p and p["lat"] is not None and p["lon"] is not None:
+                page.launch_url(f"https://www.google.com/maps?q={p['lat']},{p['lon']}")
+
+        def contact_listing_owner(e):
+            p = property_list.by_id.get(e.control.data)
+            if p:
+                contact_owner(p["owner_username"], p["title"])
+
+        card_template = cards.PropertyCardTemplate(
+            show_on_map, open_google_maps, contact_listing_owner,
+            primary=PRIMARY_COLOR, secondary=SECONDARY_COLOR, success=SUCCESS_COLOR, surface=SURFACE_COLOR,
+        )
+        # قائمة النتائج: البيانات كلها محفوظة والبطاقات تبنى للنافذة الظاهرة فقط
+        property_list = cards.VirtualList(
+            card_template.build,
+            viewport_height=RESULTS_HEIGHT,
+            on_end=lambda: page.run_task(load_next_page),
+        )
+
+        async def load_next_page():
+            """جلب الصفحة التالية من العقارات وإلحاق بطاقاتها بالقائمة"""
+            if not paging["has_more"]:
+                return
+            area_id, cursor = paging["area_id"], paging["cursor"]
+
+            async def fetch():
+                async with loading(user_progress):
+                    return await async_db.get_properties_page_by_area(area_id, before_id=cursor)
+
+            def render(result):
+                props, next_cursor = result
+                paging["cursor"] = next_cursor
+                paging["has_more"] = next_cursor is not None
+                property_list.append_items(props)
+                load_more_btn.visible = paging["has_more"]
+                update_controls(property_list.view, load_more_btn)
+
+            # أحداث التمرير المتكررة لنفس المؤشر تنتظر نفس الاستعلام
+            await scheduler.request("page", (area_id, cursor), fetch, render, debounce=False)
+
+        def on_load_more(e):
+            page.run_task(load_next_page)
+
+        load_more_btn = create_touch_button(
+            "عرض المزيد",
+            ft.Icons.EXPAND_MORE,
+            on_click=on_load_more,
+            bgcolor=SECONDARY_COLOR
+        )
+        load_more_btn.visible = False
+        # البحث يرتب أحدث db.SEARCH_WINDOW مطابقة فقط؛ يظهر عندما تتجاوزها المطابقات
+        search_note = ft.Text(
+            f"رتبت أحدث {db.SEARCH_WINDOW} نتيجة مطابقة حسب الصلة. أضف كلمات أو اختر منطقة لتضييق البحث.",
+            size=12,
+            color=WARNING_COLOR,
+            visible=False,
+        )
+
+        def show_list_message(text: str, color=None, *changed):
+            """رسالة بدل القائمة؛ تلغي أي نتائج قيد التحميل (changed: عناصر أخرى تغيرت معها)"""
+            scheduler.cancel("list")
+            property_list.show_message(
+                ft.Container(
+                    content=ft.Text(text, color=color),
+                    padding=10,
+                    alignment=ft.alignment.center,
                 )
-                page.update()
+            )
+            update_controls(property_list.view, load_more_btn, search_note, *changed)
+
+        async def show_properties(debounce: bool = True):
+            reset_paging()
+            load_more_btn.visible = False
+
+            if not city_dropdown.value:
+                show_list_message("الرجاء اختيار مدينة أولاً.", ERROR_COLOR)
                 return
 
             city_id = int(city_dropdown.value)
@@ -616,142 +857,98 @@ def main(page: ft.Page):
             city_name = city["name"] if city else ""
             selected_city_name.value = f"المدينة: {city_name}"
 
-            # إذا لم يتم اختيار منطقة، لا نعرض شيئاً
+            # إذا لم يتم اختيار منطقة، لا نعرض شيئاً في القائمة والخريطة تعرض كل عقارات المدينة
             if not area_dropdown.value:
-                properties_container.controls.append(
-                    ft.Container(
-                        content=ft.Text("الرجاء اختيار منطقة لعرض المنازل المتاحة.", color=WARNING_COLOR),
-                        padding=10,
-                        alignment=ft.alignment.center,
-                    )
-                )
-                page.update()
+                show_list_message("الرجاء اختيار منطقة لعرض المنازل المتاحة.", WARNING_COLOR, selected_city_name)
+                await load_map_index(city_id, debounce=debounce)
                 return
+            area_id = int(area_dropdown.value)
 
-            # التحقق إذا كانت المنطقة مفعلة لدمشق
-            if city_name == "دمشق" and area_dropdown.value not in DAMASCUS_ACTIVE_AREAS:
-                properties_container.controls.append(
-                    ft.Container(
-                        content=ft.Text("لا توجد منازل متاحة في هذه المنطقة حالياً.", color=ERROR_COLOR),
-                        padding=10,
-                        alignment=ft.alignment.center,
-                    )
-                )
-                page.update()
+            # التحقق إذا كانت المنطقة مفعلة (في المدن التي لها مناطق مفعلة)
+            facet = area_facets.get(area_id)
+            if facet and not facet["open"]:
+                show_list_message("لا توجد منازل متاحة في هذه المنطقة حالياً.", ERROR_COLOR, selected_city_name)
                 return
 
-            # جلب العقارات للمنطقة المختارة
-            props = get_properties_by_city_and_area(city_id, area_dropdown.value)
+            if facet:
+                selected_area_name.value = f"{facet['area']}: {describe_area_facet(facet)}"
+                selected_area_name.color = TEXT_COLOR
 
-            if not props:
-                properties_container.controls.append(
-                    ft.Container(
-                        content=ft.Text("لا يوجد منازل متاحة حالياً في المنطقة المختارة."),
-                        padding=10,
-                        alignment=ft.alignment.center,
+            async def fetch():
+                async with loading(user_progress):
+                    return await async_db.run(shared.get_first_page, area_id)
+
+            def render(result):
+                # الصفحة الأولى فقط - بقية الصفحات تحمل عند التمرير
+                props, cursor = result
+                reset_paging(area_id=area_id, cursor=cursor, has_more=cursor is not None)
+                property_list.set_items(props)
+                load_more_btn.visible = paging["has_more"]
+                if not props:
+                    property_list.show_message(
+                        ft.Container(
+                            content=ft.Text("لا يوجد منازل متاحة حالياً في المنطقة المختارة."),
+                            padding=10,
+                            alignment=ft.alignment.center,
+                        )
                     )
-                )
-            else:
-                for p in props:
-                    def make_show_on_map(lat=p["lat"], lon=p["lon"], title=p["title"]):
-                        def _inner(ev):
-                            if lat is None or lon is None:
-                                page.snack_bar = ft.SnackBar(
-                                    ft.Text("لا توجد إحداثيات لهذا المنزل."),
-                                    bgcolor=WARNING_COLOR,
-                                    open=True,
-                                )
-                                page.update()
-                                return
-
-                            if user_marker_layer_ref.current:
-                                user_marker_layer_ref.current.markers.clear()
-                                user_marker_layer_ref.current.markers.append(
-                                    map.Marker(
-                                        content=ft.Icon(
-                                            ft.Icons.HOME,
-                                            color=ft.Colors.RED,
-                                        ),
-                                        coordinates=map.MapLatitudeLongitude(lat, lon),
-                                    )
-                                )
-                            page.update()
-                        return _inner
-
-                    def make_contact_owner(username=p["owner_username"], title=p["title"]):
-                        return lambda e: contact_owner(username, title)
-
-                    card = create_card(
-                        ft.Column(
-                            [
-                                ft.Row([
-                                    ft.Icon(ft.Icons.HOME, color=PRIMARY_COLOR, size=24),
-                                    ft.Text(p["title"], size=16, weight=ft.FontWeight.BOLD, color=PRIMARY_COLOR, expand=True),
-                                ]),
-                                ft.Divider(height=10, color=ft.Colors.TRANSPARENT),
-                                ft.Row([
-                                    ft.Container(
-                                        content=ft.Column([
-                                            ft.Row([ft.Icon(ft.Icons.LOCATION_ON, size=16, color=SECONDARY_COLOR), 
-                                                   ft.Text(f"المنطقة: {p['area'] or 'غير محدد'}", size=14)]),
-                                            ft.Row([ft.Icon(ft.Icons.ATTACH_MONEY, size=16, color=SUCCESS_COLOR), 
-                                                   ft.Text(f"الإيجار الشهري: {p['rent']} ل.س" if p["rent"] else "الإيجار غير محدد", size=14)]),
-                                            ft.Row([ft.Icon(ft.Icons.PERSON, size=16, color=ACCENT_COLOR), 
-                                                   ft.Text(f"المالك: {p['owner_username']}", size=14)]),
-                                        ], spacing=8),
-                                        expand=True,
-                                    ),
-                                ]),
-                                ft.Divider(height=10, color=ft.Colors.GREY_300),
-                                ft.Text(p["description"] or "", size=13, color=ft.Colors.GREY_700),
-                                ft.Text(f"الخدمات القريبة: {p['services'] or 'غير مذكورة'}", size=12, color=ft.Colors.GREY_600),
-                                ft.Divider(height=15, color=ft.Colors.TRANSPARENT),
-                                ft.Row(
-                                    [
-                                        create_touch_button(
-                                            "عرض على الخريطة",
-                                            ft.Icons.MAP,
-                                            on_click=make_show_on_map(),
-                                            bgcolor=SECONDARY_COLOR
-                                        ),
-                                        create_touch_button(
-                                            "خرائط جوجل",
-                                            ft.Icons.OPEN_IN_NEW,
-                                            on_click=lambda ev, lat=p["lat"], lon=p["lon"]: (
-                                                page.launch_url(f"https://www.google.com/maps?q={lat},{lon}")
-                                                if lat is not None and lon is not None
-                                                else None
-                                            ),
-                                            bgcolor=PRIMARY_COLOR
-                                        ),
-                                        create_touch_button(
-                                            "تواصل",
-                                            ft.Icons.CONTACT_PHONE,
-                                            on_click=make_contact_owner(),
-                                            bgcolor=SUCCESS_COLOR
-                                        ),
-                                    ],
-                                    alignment=ft.MainAxisAlignment.CENTER,
-                                    wrap=True,
-                                ),
-                            ]
+                load_tips_for_city(city_name)
+                update_controls(property_list.view, load_more_btn, search_note, selected_city_name, selected_area_name,
+                                tips_container)
+
+            if await scheduler.request("list", ("area", area_id), fetch, render, debounce=debounce):
+                await load_map_index(city_id, area_id, debounce=False)
+
+        async def run_search():
+            """عرض نتائج البحث النصي ضمن المدينة والمنطقة المختارة (إن وجدت)"""
+            text = search_field.value.strip() if search_field.value else ""
+            if not text:
+                await show_properties(debounce=False)
+                return
+
+            reset_paging()
+            load_more_btn.visible = False
+            city_id = int(city_dropdown.value) if city_dropdown.value else None
+            area_id = int(area_dropdown.value) if area_dropdown.value else None
+
+            async def fetch():
+                async with loading(user_progress):
+                    return await async_db.search_properties(text, city_id=city_id, area_id=area_id)
+
+            def render(result):
+                results, capped = result
+                property_list.set_items(results)
+                search_note.visible = capped
+                if not results:
+                    property_list.show_message(
+                        ft.Container(
+                            content=ft.Text(f"لا توجد نتائج مطابقة لـ \"{text}\"."),
+                            padding=10,
+                            alignment=ft.alignment.center,
                         )
                     )
-                    properties_container.controls.append(card)
+                update_controls(property_list.view, load_more_btn, search_note)
 
-            load_tips_for_city(city_name)
-            page.update()
+            await scheduler.request("list", ("search", text, city_id, area_id), fetch, render, debounce=False)
+
+        async def change_city(city_id: int):
+            # إذا اختيرت مدينة أخرى أثناء التحميل فطلبها هو الذي يعرض القائمة
+            if await load_areas_for_city(city_id):
+                await show_properties(debounce=False)
 
         def on_city_change(e):
             if city_dropdown.value:
-                load_areas_for_city(int(city_dropdown.value))
-                show_properties()
+                page.run_task(change_city, int(city_dropdown.value))
 
         def on_area_change(e):
-            show_properties()
+            page.run_task(show_properties)
+
+        def on_search(e):
+            page.run_task(run_search)
 
         city_dropdown.on_change = on_city_change
         area_dropdown.on_change = on_area_change
+        search_field.on_submit = on_search
 
         # تحميل نصائح أولية
         tips_container.controls.append(
@@ -782,10 +979,7 @@ def main(page: ft.Page):
                         ])
                     ),
                     create_section_header("المنازل المتاحة", ft.Icons.HOME),
-                    ft.Container(
-                        content=ft.Column([properties_container], scroll=ft.ScrollMode.ADAPTIVE),
-                        expand=True,
-                    ),
+                    property_list.view,
                 ],
                 expand=True,
             ),
@@ -823,6 +1017,9 @@ def main(page: ft.Page):
                         ft.Divider(height=10),
                         ft.Text("اختر المنطقة", size=16, weight=ft.FontWeight.BOLD, color=PRIMARY_COLOR),
                         area_dropdown,
+                        ft.Divider(height=10),
+                        ft.Text("أو ابحث بالكلمات", size=16, weight=ft.FontWeight.BOLD, color=PRIMARY_COLOR),
+                        search_field,
                         selected_city_name,
                         selected_area_name,
                     ])
@@ -832,10 +1029,10 @@ def main(page: ft.Page):
                 create_card(ft.Container(content=user_map, height=300)),
                 
                 create_section_header("المنازل المتاحة", ft.Icons.HOME),
-                ft.Container(
-                    content=ft.Column([properties_container], scroll=ft.ScrollMode.ADAPTIVE),
-                    expand=True,
-                ),
+                user_progress,
+                search_note,
+                property_list.view,
+                ft.Row([load_more_btn], alignment=ft.MainAxisAlignment.CENTER),
                 
                 create_section_header("نصائح الانتقال", ft.Icons.LIGHTBULB),
                 create_card(
@@ -869,6 +1066,7 @@ def main(page: ft.Page):
             page.go("/login")
             return login_view()
 
+        map = load_map()
         cities = db.get_cities()
         city_dropdown = ft.Dropdown(
             label="المدينة",
@@ -899,6 +1097,14 @@ def main(page: ft.Page):
             filled=True,
             text_size=16,
         )
+        # تظهر فقط للمدن التي تقصر الإعلانات على مناطق مفعلة (من جدول areas)
+        area_note = ft.Container(
+            content=ft.Text(size=12, color=WARNING_COLOR),
+            bgcolor=ft.Colors.ORANGE_50,
+            padding=10,
+            border_radius=8,
+            visible=False,
+        )
         title_field = ft.TextField(
             label="عنوان الإعلان (مثال: شقة مفروشة بالقرب من المركز)",
             expand=True,
@@ -949,6 +1155,7 @@ def main(page: ft.Page):
         )
 
         msg = ft.Text(color=ERROR_COLOR, size=14)
+        owner_progress = create_loading_bar()
 
         # خريطة تفاعلية لتحديد موقع المنزل بالضغط
         owner_marker_layer_ref = ft.Ref[map.MarkerLayer]()
@@ -972,7 +1179,8 @@ def main(page: ft.Page):
                 )
             msg.value = "تم اختيار موقع العقار على الخريطة."
             msg.color = SUCCESS_COLOR
-            page.update()
+            # الحقلان والعلامة والرسالة فقط - لا يعاد إرسال النموذج
+            update_controls(lat_field, lon_field, owner_marker_layer_ref.current, msg)
 
         owner_map = map.Map(
             expand=True,
@@ -985,25 +1193,16 @@ def main(page: ft.Page):
             on_tap=handle_owner_map_tap,
             layers=[
                 map.TileLayer(
-                    url_template="https://tile.openstreetmap.org/{z}/{x}/{y}.png",
+                    url_template=tiles.url_template(),
                 ),
                 map.MarkerLayer(ref=owner_marker_layer_ref, markers=[]),
             ],
         )
 
-        def get_all_areas_by_city_owner(city_id: int):
-            """جلب جميع المناطق المتاحة لمدينة معينة للمالك"""
-            conn = db.get_connection()
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT DISTINCT area FROM properties 
-                WHERE city_id = ? AND area IS NOT NULL AND area != ''
-            """, (city_id,))
-            areas = [row[0] for row in cur.fetchall()]
-            conn.close()
-            return areas
-
-        def load_areas_for_owner_city(city_id: int):
+        # إحصائيات مناطق المدينة المختارة حسب اسم المنطقة
+        owner_area_facets = {}
+
+        async def load_areas_for_owner_city(city_id: int):
             """تحميل جميع المناطق المتاحة للمدينة المختارة في واجهة المالك"""
             area_dropdown.options.clear()
             area_dropdown.disabled = True
@@ -1013,34 +1212,46 @@ def main(page: ft.Page):
                 return
                 
             city_name = city["name"]
-            
-            if city_name == "دمشق":
-                # لدمشق: نعرض جميع المناطق مع تمييز المناطق المفعلة
-                for area in DAMASCUS_ALL_AREAS:
-                    is_active = area in DAMASCUS_ACTIVE_AREAS
-                    area_text = f"{area} {'✓' if is_active else ''}"
-                    area_dropdown.options.append(ft.dropdown.Option(area, area_text))
-                
-                area_dropdown.disabled = False
-                msg.value = f"المناطق المفعلة لدمشق: {', '.join(DAMASCUS_ACTIVE_AREAS)}"
-                msg.color = SUCCESS_COLOR
-            else:
-                # للمدن الأخرى: نعرض المناطق من قاعدة البيانات
-                all_areas = get_all_areas_by_city_owner(city_id)
-                for area in all_areas:
-                    area_dropdown.options.append(ft.dropdown.Option(area, area))
+
+            async def fetch():
+                async with loading(owner_progress):
+                    return await async_db.get_area_facets(city_id)
+
+            def render(facets):
+                owner_area_facets.clear()
+                owner_area_facets.update((f["area"], f) for f in facets)
+                area_dropdown.options[:] = area_options(facets)
+                active = active_areas_text(facets)
+                if active:
+                    msg.value = f"المناطق المفعلة لـ{city_name}: {active}"
+                    msg.color = SUCCESS_COLOR
+                    area_note.content.value = (
+                        f"ملاحظة: في {city_name}، يمكنك فقط إضافة عقارات في المناطق المفعلة ({active})"
+                    )
+                else:
+                    msg.value = f"تم تحميل {len(facets)} منطقة للمدينة"
+                    msg.color = TEXT_COLOR
+                area_note.visible = bool(active)
                 area_dropdown.disabled = False
-                msg.value = f"تم تحميل {len(all_areas)} منطقة للمدينة"
-                msg.color = TEXT_COLOR
-            
-            area_dropdown.value = None
-            page.update()
+                area_dropdown.value = None
+                update_controls(area_dropdown, msg, area_note)
+
+            await scheduler.request("owner_areas", city_id, fetch, render)
 
         def on_city_change_owner(e):
             if city_dropdown.value:
-                load_areas_for_owner_city(int(city_dropdown.value))
+                page.run_task(load_areas_for_owner_city, int(city_dropdown.value))
+
+        def on_area_change_owner(e):
+            # إيجارات المنطقة تساعد المالك على تسعير إعلانه
+            facet = owner_area_facets.get(area_dropdown.value)
+            if facet:
+                msg.value = f"{facet['area']}: {describe_area_facet(facet)}"
+                msg.color = TEXT_COLOR
+                update_controls(msg)
 
         city_dropdown.on_change = on_city_change_owner
+        area_dropdown.on_change = on_area_change_owner
 
         def open_google_maps(e=None):
             try:
@@ -1060,11 +1271,11 @@ def main(page: ft.Page):
 
             page.launch_url("https://www.google.com/maps")
 
-        def save_property(e):
+        async def save_property():
             if not city_dropdown.value:
                 msg.value = "الرجاء اختيار مدينة."
                 msg.color = ERROR_COLOR
-                page.update()
+                update_controls(msg)
                 return
 
             # تحديد المنطقة المختارة
@@ -1077,18 +1288,18 @@ def main(page: ft.Page):
             if not selected_area:
                 msg.value = "الرجاء اختيار منطقة أو كتابة اسم منطقة جديدة."
                 msg.color = ERROR_COLOR
-                page.update()
+                update_controls(msg)
                 return
 
             city_id = int(city_dropdown.value)
             city = db.get_city_by_id(city_id)
             city_name = city["name"] if city else ""
 
-            # التحقق من صحة المنطقة لمدينة دمشق
-            if city_name == "دمشق" and selected_area not in DAMASCUS_ACTIVE_AREAS:
-                msg.value = f"لدمشق: يمكنك فقط إضافة عقارات في المناطق التالية: {', '.join(DAMASCUS_ACTIVE_AREAS)}"
+            # المدن التي لها مناطق مفعلة تقبل الإعلانات في هذه المناطق فقط
+            if not await async_db.is_area_open(city_id, selected_area):
+                msg.value = f"في {city_name}: يمكنك فقط إضافة عقارات في المناطق المفعلة (✓)"
                 msg.color = ERROR_COLOR
-                page.update()
+                update_controls(msg)
                 return
 
             try:
@@ -1096,7 +1307,7 @@ def main(page: ft.Page):
             except ValueError:
                 msg.value = "الإيجار يجب أن يكون رقماً."
                 msg.color = ERROR_COLOR
-                page.update()
+                update_controls(msg)
                 return
             try:
                 lat = float(lat_field.value) if lat_field.value else None
@@ -1104,21 +1315,22 @@ def main(page: ft.Page):
             except ValueError:
                 msg.value = "إحداثيات غير صحيحة."
                 msg.color = ERROR_COLOR
-                page.update()
+                update_controls(msg)
                 return
 
             try:
-                db.add_property(
-                    owner_id=user["id"],
-                    city_id=city_id,
-                    area=selected_area,
-                    title=title_field.value.strip(),
-                    description=desc_field.value.strip(),
-                    rent=rent,
-                    lat=lat,
-                    lon=lon,
-                    services=services_field.value.strip(),
-                )
+                async with loading(owner_progress):
+                    property_id = await async_db.add_property(
+                        owner_id=user["id"],
+                        city_id=city_id,
+                        area=selected_area,
+                        title=title_field.value.strip(),
+                        description=desc_field.value.strip(),
+                        rent=rent,
+                        lat=lat,
+                        lon=lon,
+                        services=services_field.value.strip(),
+                    )
                 msg.value = "تم حفظ العقار بنجاح ✅"
                 msg.color = SUCCESS_COLOR
 
@@ -1132,79 +1344,71 @@ def main(page: ft.Page):
                 lon_field.value = ""
                 if owner_marker_layer_ref.current:
                     owner_marker_layer_ref.current.markers.clear()
-                page.update()
-                load_owner_properties()
+                update_controls(
+                    msg, area_field, title_field, rent_field, desc_field, services_field, lat_field, lon_field,
+                    owner_marker_layer_ref.current,
+                )
+                await refresh_owner_card(property_id)
             except Exception as ex:
                 msg.value = f"حدث خطأ أثناء الحفظ: {ex}"
                 msg.color = ERROR_COLOR
-                page.update()
+                update_controls(msg)
+
+        def on_save_property(e):
+            page.run_task(save_property)
 
-        def edit_property(property_id: int):
+        async def edit_property(property_id: int):
             """فتح نافذة لتعديل بيانات العقار"""
             # جلب بيانات العقار الحالية
-            conn = db.get_connection()
-            cur = conn.cursor()
-            cur.execute("""
-                SELECT title, area, description, rent, lat, lon, services, city_id 
-                FROM properties WHERE id = ?
-            """, (property_id,))
-            prop = cur.fetchone()
-            conn.close()
+            async with loading(owner_progress):
+                prop = await async_db.get_property(property_id)
             
             if not prop:
                 return
             
             # إنشاء حقول التعديل
-            edit_title = ft.TextField(label="العنوان", value=prop[0], expand=True, border_color=PRIMARY_COLOR, filled=True)
-            edit_area = ft.TextField(label="المنطقة", value=prop[1], expand=True, border_color=PRIMARY_COLOR, filled=True)
-            edit_desc = ft.TextField(label="الوصف", value=prop[2], multiline=True, min_lines=3, expand=True, border_color=PRIMARY_COLOR, filled=True)
-            edit_rent = ft.TextField(label="الإيجار", value=str(prop[3]) if prop[3] else "", expand=True, border_color=PRIMARY_COLOR, filled=True)
-            edit_lat = ft.TextField(label="خط العرض", value=str(prop[4]) if prop[4] else "", expand=True, border_color=PRIMARY_COLOR, filled=True)
-            edit_lon = ft.TextField(label="خط الطول", value=str(prop[5]) if prop[5] else "", expand=True, border_color=PRIMARY_COLOR, filled=True)
-            edit_services = ft.TextField(label="الخدمات", value=prop[6] or "", multiline=True, min_lines=2, expand=True, border_color=PRIMARY_COLOR, filled=True)
+            edit_title = ft.TextField(label="العنوان", value=prop["title"], expand=True, border_color=PRIMARY_COLOR, filled=True)
+            edit_area = ft.TextField(label="المنطقة", value=prop["area"], expand=True, border_color=PRIMARY_COLOR, filled=True)
+            edit_desc = ft.TextField(label="الوصف", value=prop["description"], multiline=True, min_lines=3, expand=True, border_color=PRIMARY_COLOR, filled=True)
+            edit_rent = ft.TextField(label="الإيجار", value=str(prop["rent"]) if prop["rent"] else "", expand=True, border_color=PRIMARY_COLOR, filled=True)
+            edit_lat = ft.TextField(label="خط العرض", value=str(prop["lat"]) if prop["lat"] else "", expand=True, border_color=PRIMARY_COLOR, filled=True)
+            edit_lon = ft.TextField(label="خط الطول", value=str(prop["lon"]) if prop["lon"] else "", expand=True, border_color=PRIMARY_COLOR, filled=True)
+            edit_services = ft.TextField(label="الخدمات", value=prop["services"] or "", multiline=True, min_lines=2, expand=True, border_color=PRIMARY_COLOR, filled=True)
+            edit_progress = create_loading_bar()
             
-            def update_property(e):
+            async def update_property():
                 try:
-                    rent_val = int(edit_rent.value) if edit_rent.value.strip() else None
-                    lat_val = float(edit_lat.value) if edit_lat.value.strip() else None
-                    lon_val = float(edit_lon.value) if edit_lon.value.strip() else None
-                    
-                    conn = db.get_connection()
-                    cur = conn.cursor()
-                    cur.execute("""
-                        UPDATE properties 
-                        SET title=?, area=?, description=?, rent=?, lat=?, lon=?, services=?
-                        WHERE id=?
-                    """, (
-                        edit_title.value.strip(),
-                        edit_area.value.strip(),
-                        edit_desc.value.strip(),
-                        rent_val,
-                        lat_val,
-                        lon_val,
-                        edit_services.value.strip(),
-                        property_id
-                    ))
-                    conn.commit()
-                    conn.close()
+                    rent_val = int(edit_rent.value) if (edit_rent.value or "").strip() else None
+                    lat_val = float(edit_lat.value) if (edit_lat.value or "").strip() else None
+                    lon_val = float(edit_lon.value) if (edit_lon.value or "").strip() else None
+                    area = (edit_area.value or "").strip()
+
+                    # نقل العقار إلى منطقة أخرى يخضع لنفس شرط الإضافة (المناطق المفعلة فقط)
+                    moved = db.normalize_arabic(area) != db.normalize_arabic(prop["area"] or "")
+                    if moved and not await async_db.is_area_open(prop["city_id"], area):
+                        show_snack("يمكنك فقط نقل العقار إلى المناطق المفعلة (✓) في مدينته", ERROR_COLOR)
+                        return
+
+                    async with loading(edit_progress):
+                        updated = await async_db.update_property(
+                            property_id,
+                            user["id"],
+                            title=(edit_title.value or "").strip(),
+                            area=area,
+                            description=(edit_desc.value or "").strip(),
+                            rent=rent_val,
+                            lat=lat_val,
+                            lon=lon_val,
+                            services=(edit_services.value or "").strip(),
+                        )
+                    if not updated:
+                        raise Exception("العقار غير موجود أو لا تملك صلاحية تعديله")
                     
-                    page.snack_bar = ft.SnackBar(
-                        content=ft.Text("تم تحديث بيانات العقار بنجاح"),
-                        bgcolor=SUCCESS_COLOR,
-                        action="موافق",
-                    )
-                    page.snack_bar.open = True
-                    page.update()
+                    show_snack("تم تحديث بيانات العقار بنجاح", SUCCESS_COLOR)
                     page.close(dlg)
-                    load_owner_properties()
+                    await refresh_owner_card(property_id)
                 except Exception as ex:
-                    page.snack_bar = ft.SnackBar(
-                        content=ft.Text(f"خطأ في التحديث: {ex}"),
-                        bgcolor=ERROR_COLOR,
-                        action="موافق",
-                    )
-                    page.snack_bar.open = True
-                    page.update()
+                    show_snack(f"خطأ في التحديث: {ex}", ERROR_COLOR)
             
             dlg = ft.AlertDialog(
                 title=ft.Text("تعديل بيانات العقار", color=PRIMARY_COLOR),
@@ -1213,10 +1417,11 @@ def main(page: ft.Page):
                     edit_area,
                     edit_desc,
                     ft.Row([edit_rent, edit_lat, edit_lon]),
-                    edit_services
+                    edit_services,
+                    edit_progress,
                 ], scroll=ft.ScrollMode.ADAPTIVE, height=400),
                 actions=[
-                    ft.TextButton("حفظ التعديلات", on_click=update_property, style=ft.ButtonStyle(color=SUCCESS_COLOR)),
+                    ft.TextButton("حفظ التعديلات", on_click=lambda e: page.run_task(update_property), style=ft.ButtonStyle(color=SUCCESS_COLOR)),
                     ft.TextButton("إلغاء", on_click=lambda e: page.close(dlg), style=ft.ButtonStyle(color=ERROR_COLOR)),
                 ],
             )
@@ -1226,7 +1431,7 @@ def main(page: ft.Page):
         add_btn = create_touch_button(
             "حفظ العقار", 
             ft.Icons.SAVE, 
-            on_click=save_property,
+            on_click=on_save_property,
             bgcolor=SUCCESS_COLOR
         )
         
@@ -1237,82 +1442,114 @@ def main(page: ft.Page):
             bgcolor=PRIMARY_COLOR
         )
 
-        properties_list_column = ft.Column(spacing=15)
+        # يزداد بعد كل حفظ أو تعديل حتى لا تدمج القراءة التالية مع قراءة بدأت قبله
+        owner_data = {"version": 0, "cursor": None, "has_more": False}
 
-        def load_owner_properties():
-            properties_list_column.controls.clear()
-            props = db.get_properties_by_owner(user["id"])
-            if not props:
-                properties_list_column.controls.append(
-                    create_card(
-                        ft.Column([
-                            ft.Icon(ft.Icons.HOME, size=40, color=ft.Colors.GREY_400),
-                            ft.Text("لم تقم بإضافة أي عقار بعد.", size=16, color=ft.Colors.GREY_600),
-                            ft.Text("استخدم النموذج أدناه لإضافة عقارك الأول", size=14, color=ft.Colors.GREY_500),
-                        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
-                        color=BACKGROUND_COLOR,
-                    )
-                )
+        def render_owner_page(result, first: bool = False):
+            props, next_cursor = result
+            owner_data["cursor"] = next_cursor
+            owner_data["has_more"] = next_cursor is not None
+            owner_more_btn.visible = owner_data["has_more"]
+            if first:
+                owner_list.set_items(props)
             else:
-                for p in props:
-                    # الحصول على اسم المدينة للتحقق من المنطقة المفعلة
-                    city = db.get_city_by_id(p.get("city_id", 0))
-                    city_name = city["name"] if city else ""
-                    is_active_area = city_name == "دمشق" and p["area"] in DAMASCUS_ACTIVE_AREAS
-                    
-                    def make_edit_function(prop_id=p["id"]):
-                        return lambda e: edit_property(prop_id)
-                    
-                    properties_list_column.controls.append(
-                        create_card(
-                            ft.Column(
-                                [
-                                    ft.Row([
-                                        ft.Icon(ft.Icons.APARTMENT, color=PRIMARY_COLOR, size=24),
-                                        ft.Text(p["title"], size=16, weight=ft.FontWeight.BOLD, color=PRIMARY_COLOR, expand=True),
-                                        ft.Container(
-                                            content=ft.Row([
-                                                ft.Icon(ft.Icons.CHECK_CIRCLE, size=16, color="white"),
-                                                ft.Text("مفعل", size=12, color="white"),
-                                            ]),
-                                            bgcolor=SUCCESS_COLOR,
-                                            padding=ft.padding.symmetric(horizontal=8, vertical=4),
-                                            border_radius=20,
-                                            visible=is_active_area
-                                        ) if is_active_area else ft.Container()
-                                    ]),
-                                    ft.Divider(height=10, color=ft.Colors.TRANSPARENT),
-                                    ft.Row([
-                                        ft.Container(
-                                            content=ft.Column([
-                                                ft.Row([ft.Icon(ft.Icons.LOCATION_CITY, size=16, color=SECONDARY_COLOR), 
-                                                       ft.Text(f"المدينة: {city_name}", size=14)]),
-                                                ft.Row([ft.Icon(ft.Icons.MAP, size=16, color=ACCENT_COLOR), 
-                                                       ft.Text(f"المنطقة: {p['area'] or 'غير محدد'}", size=14)]),
-                                                ft.Row([ft.Icon(ft.Icons.ATTACH_MONEY, size=16, color=SUCCESS_COLOR), 
-                                                       ft.Text(f"الإيجار: {p['rent']} ل.س" if p["rent"] else "الإيجار غير محدد", size=14)]),
-                                            ], spacing=8),
-                                            expand=True,
-                                        ),
-                                    ]),
-                                    ft.Divider(height=10, color=ft.Colors.GREY_300),
-                                    ft.Text(p["description"] or "", size=13, color=ft.Colors.GREY_700),
-                                    ft.Text(f"الخدمات القريبة: {p['services'] or 'غير مذكورة'}", size=12, color=ft.Colors.GREY_600),
-                                    ft.Divider(height=15, color=ft.Colors.TRANSPARENT),
-                                    ft.Row([
-                                        create_touch_button(
-                                            "تعديل البيانات",
-                                            ft.Icons.EDIT,
-                                            on_click=make_edit_function(),
-                                            bgcolor=PRIMARY_COLOR
-                                        )
-                                    ], alignment=ft.MainAxisAlignment.CENTER),
-                                ]
-                            )
-                        )
-                    )
+                owner_list.append_items(props)
+            update_controls(owner_more_btn)
+
+        async def load_owner_properties(changed: bool = False):
+            """الصفحة الأولى من عقارات المالك (الأحدث أولاً)"""
+            if changed:
+                owner_data["version"] += 1
+            scheduler.cancel("owner_page")
+
+            async def fetch():
+                async with loading(owner_progress):
+                    return await async_db.get_properties_page_by_owner(user["id"])
+
+            await scheduler.request(
+                "owner_list", (user["id"], owner_data["version"]),
+                fetch, lambda result: render_owner_page(result, first=True), debounce=False,
+            )
+
+        async def load_more_owner_properties():
+            """الصفحة التالية من عقارات المالك تلحق ببطاقاتها فقط"""
+            if not owner_data["has_more"]:
+                return
+            cursor = owner_data["cursor"]
+
+            async def fetch():
+                async with loading(owner_progress):
+                    return await async_db.get_properties_page_by_owner(user["id"], before_id=cursor)
+
+            await scheduler.request("owner_page", (user["id"], cursor), fetch, render_owner_page, debounce=False)
+
+        async def refresh_owner_card(property_id: int):
+            """تحديث بطاقة العقار وحدها بعد إضافته أو تعديله أو حذفه بدل إعادة بناء القائمة"""
+            if not owner_list.loaded:
+                # القائمة الأولى لم تعرض بعد: قراءة جديدة تتضمن التغيير
+                await load_owner_properties(changed=True)
+                return
+            p = await async_db.get_owner_property(property_id, user["id"])
+            if p is None:
+                owner_list.remove(property_id)
+            else:
+                owner_list.upsert(p)
+
+        async def delete_property(property_id: int):
+            async with loading(owner_progress):
+                deleted = await async_db.delete_property(property_id, user["id"])
+            show_snack(
+                "تم حذف العقار" if deleted else "العقار غير موجود أو لا تملك صلاحية حذفه",
+                SUCCESS_COLOR if deleted else ERROR_COLOR,
+            )
+            await refresh_owner_card(property_id)
+
+        def confirm_delete(e):
+            property_id = e.control.data
 
-        load_owner_properties()
+            def on_confirm(ev):
+                page.close(dlg)
+                page.run_task(delete_property, property_id)
+
+            dlg = ft.AlertDialog(
+                title=ft.Text("حذف العقار", color=ERROR_COLOR),
+                content=ft.Text("هل تريد حذف هذا العقار نهائياً؟"),
+                actions=[
+                    ft.TextButton("حذف", on_click=on_confirm, style=ft.ButtonStyle(color=ERROR_COLOR)),
+                    ft.TextButton("إلغاء", on_click=lambda ev: page.close(dlg)),
+                ],
+            )
+            page.open(dlg)
+
+        def empty_owner_card():
+            return create_card(
+                ft.Column([
+                    ft.Icon(ft.Icons.HOME, size=40, color=ft.Colors.GREY_400),
+                    ft.Text("لم تقم بإضافة أي عقار بعد.", size=16, color=ft.Colors.GREY_600),
+                    ft.Text("استخدم النموذج أدناه لإضافة عقارك الأول", size=14, color=ft.Colors.GREY_500),
+                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER),
+                color=BACKGROUND_COLOR,
+            )
+
+        # بطاقات عقارات المالك مفهرسة بالمعرف: كل تغيير يبني بطاقة واحدة ويحدث العمود وحده
+        owner_list = cards.KeyedCardList(
+            cards.OwnerCardTemplate(
+                lambda e: page.run_task(edit_property, e.control.data),
+                confirm_delete,
+                primary=PRIMARY_COLOR, success=SUCCESS_COLOR, error=ERROR_COLOR, surface=SURFACE_COLOR,
+            ).build,
+            empty=empty_owner_card,
+        )
+
+        owner_more_btn = create_touch_button(
+            "عرض المزيد",
+            ft.Icons.EXPAND_MORE,
+            on_click=lambda e: page.run_task(load_more_owner_properties),
+            bgcolor=SECONDARY_COLOR,
+        )
+        owner_more_btn.visible = False
+
+        page.run_task(load_owner_properties)
 
         # واجهة المالك كعمود واحد للجوال
         layout = ft.Column(
@@ -1323,16 +1560,7 @@ def main(page: ft.Page):
                         city_dropdown,
                         area_dropdown,
                         area_field,
-                        ft.Container(
-                            content=ft.Text(
-                                "ملاحظة: لمدينة دمشق، يمكنك فقط إضافة عقارات في المناطق المفعلة (المزة، كفرسوسة، الميدان)", 
-                                size=12, 
-                                color=WARNING_COLOR
-                            ),
-                            bgcolor=ft.Colors.ORANGE_50,
-                            padding=10,
-                            border_radius=8,
-                        ),
+                        area_note,
                     ])
                 ),
                 create_card(
@@ -1365,10 +1593,15 @@ def main(page: ft.Page):
                 ),
                 
                 create_section_header("عقاراتي", ft.Icons.REAL_ESTATE_AGENT),
+                owner_progress,
                 ft.Container(
-                    content=ft.Column([properties_list_column], scroll=ft.ScrollMode.ADAPTIVE),
+                    content=ft.Column([owner_list.view], scroll=ft.ScrollMode.ADAPTIVE),
                     expand=True,
                 ),
+                ft.Container(
+                    content=ft.Row([owner_more_btn], alignment=ft.MainAxisAlignment.CENTER),
+                    padding=10,
+                ),
             ],
             scroll=ft.ScrollMode.ADAPTIVE,
             expand=True,
@@ -1414,13 +1647,12 @@ def main(page: ft.Page):
 
 
 if __name__ == "__main__":
+    db.configure_logging()
+    # قبل فتح النافذة حتى لا تدفع أول جلسة كلفة التهيئة
+    db.bootstrap()
     # تشغيل التطبيق على الأندرويد مع الحفاظ على جميع الميزات
     ft.app(
         target=main,
         view=ft.AppView.FLET_APP,
         assets_dir="assets"
-<<<<<<< HEAD
-)
-=======
 )
->>>>>>> a1d0cd9d871b34fe15847374e5b89751b62300eb
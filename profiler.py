@@ -0,0 +1,252 @@
+"""محلل أداء الاستعلامات: زمن كل عبارة SQL وعدد صفوفها وسجل الاستعلامات البطيئة
+
+يفعل عبر CITY_MOVER_PROFILE=1 (أو db.enable_profiling())؛ عندها تفتح اتصالات المجمع
+بمؤشرات تقيس كل تنفيذ من execute حتى آخر صف مقروء. عند التعطيل لا يتغير أي شيء
+في مسار التنفيذ.
+
+التقرير:
+    python profiler.py report profile.json [--limit 20]
+
+(يحفظ الملف تلقائياً عند الخروج إذا حدد CITY_MOVER_PROFILE_OUT)
+"""
+import argparse
+import bisect
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("city_mover.profiler")
+slow_logger = logging.getLogger("city_mover.slow")
+
+# حدود فئات المدرج التكراري بالميلي ثانية (الفئة الأخيرة لما فوق 1000)
+BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+DEFAULT_SLOW_MS = 50.0
+
+
+def bucket_labels():
+    labels = [f"<{b}" for b in BUCKETS_MS]
+    labels.append(f">={BUCKETS_MS[-1]}")
+    return labels
+
+
+class StatementStats:
+    """إحصائيات عبارة SQL واحدة (بعد توحيد المسافات)"""
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+        self.plan = None
+
+    def add(self, elapsed_ms: float, rows: int):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += max(rows, 0)
+        self.histogram[bisect.bisect_right(BUCKETS_MS, elapsed_ms)] += 1
+
+    def to_dict(self):
+        return {
+            "sql": self.sql,
+            "calls": self.calls,
+            "total_ms": round(self.total_ms, 3),
+            "mean_ms": round(self.total_ms / self.calls, 4) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "rows": self.rows,
+            "slow": self.slow,
+            "histogram": dict(zip(bucket_labels(), self.histogram)),
+            "plan": self.plan,
+        }
+
+
+def explain(conn, sql: str, params=()):
+    """خطة التنفيذ (EXPLAIN QUERY PLAN) كقائمة أسطر، أو None إذا تعذر الحصول عليها"""
+    try:
+        # مؤشر عادي حتى لا يقاس استعلام الخطة نفسه
+        cur = sqlite3.Cursor(conn)
+        return [row[-1] for row in cur.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    except (sqlite3.Error, ValueError):
+        try:
+            cur = sqlite3.Cursor(conn)
+            return [row[-1] for row in cur.execute("EXPLAIN QUERY PLAN " + sql, (None,) * sql.count("?"))]
+        except (sqlite3.Error, ValueError):
+            return None
+
+
+class Profiler:
+    """تجميع الإحصائيات من كل الاتصالات والخيوط"""
+
+    def __init__(self, slow_ms: float = DEFAULT_SLOW_MS):
+        self.slow_ms = slow_ms
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._statements = {}
+
+    def record(self, sql: str, elapsed_ms: float, rows: int, conn=None, params=()):
+        key = " ".join(sql.split())
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                stats = self._statements[key] = StatementStats(key)
+            stats.add(elapsed_ms, rows)
+            is_slow = elapsed_ms >= self.slow_ms
+            if is_slow:
+                stats.slow += 1
+            need_plan = is_slow and stats.plan is None
+
+        if not is_slow:
+            return
+        if need_plan and conn is not None:
+            plan = explain(conn, sql, params)
+            with self._lock:
+                stats.plan = plan
+        slow_logger.warning(
+            "🐢 Slow query %.1f ms (%d rows): %s\n    plan: %s",
+            elapsed_ms, rows, key, " | ".join(stats.plan or ["-"]),
+        )
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self.started = time.time()
+
+    def snapshot(self):
+        """كل العبارات مرتبة حسب الزمن الكلي"""
+        with self._lock:
+            statements = [s.to_dict() for s in self._statements.values()]
+        statements.sort(key=lambda s: s["total_ms"], reverse=True)
+        return {
+            "started": self.started,
+            "seconds": round(time.time() - self.started, 1),
+            "slow_ms": self.slow_ms,
+            "statements": statements,
+        }
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        logger.info("💾 Profile saved to %s", path)
+
+    def report(self, limit: int = 20):
+        return format_report(self.snapshot(), limit)
+
+
+def format_report(snapshot: dict, limit: int = 20):
+    """تقرير نصي: أكثر العبارات استهلاكاً للوقت مع المدرج التكراري والخطة للبطيئة منها"""
+    statements = snapshot["statements"]
+    total = sum(s["total_ms"] for s in statements) or 1.0
+    lines = [
+        f"Profile: {len(statements)} statements over {snapshot['seconds']}s "
+        f"(slow >= {snapshot['slow_ms']} ms)",
+        f"{'total ms':>10} {'%':>5} {'calls':>7} {'mean ms':>9} {'max ms':>9} {'rows':>8} {'slow':>5}  sql",
+    ]
+    for s in statements[:limit]:
+        lines.append(
+            f"{s['total_ms']:>10.1f} {s['total_ms'] / total:>5.0%} {s['calls']:>7} {s['mean_ms']:>9.3f} "
+            f"{s['max_ms']:>9.1f} {s['rows']:>8} {s['slow']:>5}  {s['sql'][:90]}"
+        )
+        buckets = "  ".join(f"{label}:{n}" for label, n in s["histogram"].items() if n)
+        lines.append(f"{'':>10} ms {buckets}")
+        if s["plan"]:
+            lines.append(f"{'':>10} plan: {' | '.join(s['plan'])}")
+    return "\n".join(lines)
+
+
+class ProfilingCursor(sqlite3.Cursor):
+    """مؤشر يقيس زمن العبارة من execute حتى انتهاء قراءة صفوفها"""
+
+    _pending = None
+
+    def _flush(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            sql, params, elapsed, rows = pending
+            self.connection.query_profiler.record(sql, elapsed * 1000, rows, self.connection, params)
+
+    def _run(self, method, sql, params, many=False):
+        self._flush()
+        start = time.perf_counter()
+        method(sql, params)
+        elapsed = time.perf_counter() - start
+        if self.description is None:
+            # عبارة لا تعيد صفوفاً: تسجل فوراً
+            self._pending = (sql, () if many else params, elapsed, self.rowcount)
+            self._flush()
+        else:
+            self._pending = [sql, params, elapsed, 0]
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters, many=True)
+
+    def _fetched(self, start, rows, done):
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - start
+            self._pending[3] += rows
+            if done:
+                self._flush()
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(start, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows), True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0, True)
+            raise
+        self._fetched(start, 1, False)
+        return row
+
+    def close(self):
+        self._flush()
+        super().close()
+
+    def __del__(self):
+        # مؤشر قرئ صفه الأول فقط (fetchone) ثم ترك
+        try:
+            self._flush()
+        except Exception:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="City Mover query profile report")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("report", help="print a saved profile")
+    report.add_argument("path")
+    report.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        print(format_report(json.load(f), args.limit))
+
+
+if __name__ == "__main__":
+    main()
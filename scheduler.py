@@ -0,0 +1,113 @@
+"""جدولة طلبات البيانات لكل جلسة: تأخير التغييرات السريعة، الأحدث يفوز، ودمج الطلبات المتطابقة
+
+لكل قناة (قائمة العقارات، المناطق، الخريطة...) طلب أخير واحد فقط ترسم نتيجته:
+
+    await scheduler.request("list", (city_id, area), fetch, render)
+
+- التأخير (debounce): الطلب ينتظر debounce_ms، وإذا وصل طلب أحدث في نفس القناة خلالها
+  لا ينفذ استعلامه أصلاً.
+- الأحدث يفوز: نتيجة طلب تجاوزه طلب أحدث أثناء التنفيذ تهمل ولا ترسم.
+- الدمج: طلب مطابق (نفس القناة والمفتاح) لطلب جار ينتظر نفس النتيجة بدل استعلام جديد.
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger("city_mover.scheduler")
+
+DEFAULT_DEBOUNCE_MS = 150
+
+COUNTERS = ("requested", "debounced", "coalesced", "executed", "discarded", "rendered", "wasted_queries")
+
+
+class _Inflight:
+    """استعلام جار ومن ينتظر نتيجته"""
+
+    __slots__ = ("task", "waiters", "rendered")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+        self.rendered = False
+
+
+class RequestScheduler:
+    """مجدول طلبات جلسة واحدة (يستخدم من حلقة أحداث الجلسة فقط)"""
+
+    def __init__(self, debounce_ms: float = DEFAULT_DEBOUNCE_MS):
+        self.debounce_ms = debounce_ms
+        self._latest = {}
+        self._inflight = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def _next_token(self, channel: str):
+        token = self._latest.get(channel, 0) + 1
+        self._latest[channel] = token
+        return token
+
+    def is_latest(self, channel: str, token: int):
+        return self._latest.get(channel) == token
+
+    def cancel(self, channel: str):
+        """إبطال الطلبات المعلقة والجارية في القناة (لن ترسم نتائجها)"""
+        self._next_token(channel)
+
+    async def request(self, channel: str, key, fetch, render, debounce: bool = True):
+        """تنفيذ fetch() (دالة async) ثم render(result) إذا بقي هذا الطلب الأحدث في قناته
+
+        يعيد True إذا رسمت النتيجة، و False إذا تجاوزه طلب أحدث.
+        """
+        self.counters["requested"] += 1
+        token = self._next_token(channel)
+        if debounce and self.debounce_ms:
+            await asyncio.sleep(self.debounce_ms / 1000)
+            if not self.is_latest(channel, token):
+                self.counters["debounced"] += 1
+                return False
+
+        inflight_key = (channel, key)
+        entry = self._inflight.get(inflight_key)
+        if entry is None:
+            self.counters["executed"] += 1
+            entry = _Inflight(asyncio.ensure_future(fetch()))
+            self._inflight[inflight_key] = entry
+        else:
+            self.counters["coalesced"] += 1
+        entry.waiters += 1
+
+        try:
+            # shield: إلغاء أحد المنتظرين لا يلغي الاستعلام على الآخرين
+            result = await asyncio.shield(entry.task)
+            if not self.is_latest(channel, token):
+                self.counters["discarded"] += 1
+                return False
+            render(result)
+            entry.rendered = True
+            self.counters["rendered"] += 1
+            return True
+        except Exception:
+            if not self.is_latest(channel, token):
+                self.counters["discarded"] += 1
+                return False
+            raise
+        finally:
+            entry.waiters -= 1
+            if entry.waiters == 0:
+                if self._inflight.get(inflight_key) is entry:
+                    del self._inflight[inflight_key]
+                if not entry.rendered:
+                    self.counters["wasted_queries"] += 1
+
+    def stats(self):
+        """العدادات مع الاستعلامات وعمليات الرسم التي تم تجنبها"""
+        stats = dict(self.counters)
+        stats["queries_avoided"] = stats["debounced"] + stats["coalesced"]
+        stats["renders_avoided"] = stats["debounced"] + stats["discarded"]
+        return stats
+
+    def summary(self):
+        s = self.stats()
+        return (
+            f"{s['requested']} requests: {s['executed']} queries run, {s['queries_avoided']} avoided "
+            f"({s['debounced']} debounced, {s['coalesced']} coalesced), {s['wasted_queries']} wasted; "
+            f"{s['rendered']} renders, {s['renders_avoided']} avoided"
+        )
@@ -0,0 +1,147 @@
+"""تشغيل التطبيق كخادم ويب متعدد الجلسات (Flet web فوق FastAPI وuvicorn)
+
+    python server.py [--host 0.0.0.0] [--port 8550] [--session-timeout 300] [--watch-ms 250] [--public-stats]
+
+يتطلب مكتبات وضع الخادم: pip install -r requirements-server.txt. كل الجلسات تعمل في هذه
+العملية وتتشارك: مجمع اتصالات db ومجمع خيوط async_db، ذاكرتي المدن والمناطق في db،
+وذواكر shared (فهارس الخريطة والصفحة الأولى لكل منطقة). ما يبقى لكل جلسة هو عناصر
+واجهتها ومجدول طلباتها فقط.
+
+الخادم يستطلع جدول data_changes (db.watch_changes) فيبطل ذواكره عند أي تعديل من عملية
+أخرى: عمال supervisor.py الآخرين أو أدوات الاستيراد. --watch-ms 0 يعطل ذلك.
+
+GET /stats يعيد عدد الجلسات وذاكرة العملية وإحصائيات الذواكر (يستخدمه loadtest.py). يجيب
+طلبات الجهاز نفسه فقط (127.0.0.1 / ::1) إلا مع --public-stats، فلا تظهر تفاصيل العملية
+لزوار المنفذ العام. خلف supervisor.py كل الطلبات تأتي من الموزع على 127.0.0.1، فيمرر المشرف
+للعمال CITY_MOVER_STATS_TOKEN: عندها لا يجيب /stats إلا طلباً يحمل الرأس X-City-Mover-Stats
+بنفس القيمة (يرسله المشرف وحده) مهما كان عنوان المرسل.
+"""
+import argparse
+import hmac
+import logging
+import os
+import sys
+import threading
+import weakref
+from pathlib import Path
+
+import async_db
+import db
+import main as app
+import shared
+
+logger = logging.getLogger("city_mover.server")
+
+DEFAULT_PORT = 8550
+# Flet يحتفظ بالجلسة المنقطعة ساعة كاملة افتراضياً، وكل جلسة تحجز شجرة عناصر واجهتها
+DEFAULT_SESSION_TIMEOUT = 300
+LOCAL_HOSTS = ("127.0.0.1", "::1")
+# رمز /stats للعمال خلف supervisor.py (عنوان المرسل هناك دائماً عنوان الموزع)
+STATS_TOKEN_ENV = "CITY_MOVER_STATS_TOKEN"
+STATS_TOKEN_HEADER = "X-City-Mover-Stats"
+
+_sessions = weakref.WeakSet()
+_sessions_lock = threading.Lock()
+_started = 0
+_watcher = None
+
+
+def session(page):
+    """نقطة دخول كل جلسة ويب: تسجيلها في الإحصائيات ثم main.main"""
+    global _started
+    with _sessions_lock:
+        _sessions.add(page)
+        _started += 1
+    app.main(page)
+
+
+def rss_bytes():
+    """الذاكرة المقيمة للعملية (بالبايت)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # ru_maxrss هي القيمة القصوى: بالكيلوبايت على لينكس وبالبايت على macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == "darwin" else rss * 1024
+
+
+def stats():
+    """الجلسات الحية (لم تغلق أو تنته صلاحيتها) وذاكرة العملية والذواكر المشتركة"""
+    with _sessions_lock:
+        live = sum(1 for page in list(_sessions) if page.connection is not None)
+        started = _started
+    return {
+        "sessions": live,
+        "sessions_started": started,
+        "rss_bytes": rss_bytes(),
+        "db_connections": db.get_pool().opened,
+        "db_workers": async_db.DB_WORKERS,
+        "writes": db.write_stats(),
+        "caches": shared.stats(),
+        "changes": _watcher.stats() if _watcher is not None else None,
+        "pid": os.getpid(),
+    }
+
+
+def create_app(session_timeout: int = DEFAULT_SESSION_TIMEOUT, watch_ms: float = db.CHANGE_POLL_MS,
+               public_stats: bool = False):
+    """تطبيق ASGI يخدم واجهة الويب ومسار /stats (يمكن تمريره لأي خادم ASGI)"""
+    import flet_web.fastapi as flet_fastapi
+    from fastapi import HTTPException, Request
+
+    token = os.environ.get(STATS_TOKEN_ENV)
+
+    def stats_route(request: Request):
+        if token:
+            # خلف الموزع: الرمز وحده يثبت أن الطلب من المشرف
+            allowed = hmac.compare_digest(request.headers.get(STATS_TOKEN_HEADER, ""), token)
+        else:
+            # /stats للجهاز نفسه فقط إلا مع public_stats
+            allowed = public_stats or (request.client is not None and request.client.host in LOCAL_HOSTS)
+        if not allowed:
+            raise HTTPException(status_code=404)
+        return stats()
+
+    global _watcher
+    db.bootstrap()
+    if watch_ms > 0:
+        _watcher = db.watch_changes(watch_ms)
+    assets = Path(__file__).parent / "assets"
+    server = flet_fastapi.app(
+        session,
+        assets_dir=str(assets) if assets.is_dir() else None,
+        session_timeout_seconds=session_timeout,
+    )
+    server.add_api_route("/stats", stats_route, methods=["GET"])
+    # الملفات الثابتة مركبة على "/" وتلتقط كل المسارات، فيجب أن يسبقها /stats
+    server.router.routes.insert(0, server.router.routes.pop())
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="City Mover multi-session web server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--session-timeout", type=int, default=DEFAULT_SESSION_TIMEOUT,
+                        help="seconds a disconnected session is kept")
+    parser.add_argument("--watch-ms", type=float, default=db.CHANGE_POLL_MS,
+                        help="poll interval for changes made by other processes (0 disables)")
+    parser.add_argument("--public-stats", action="store_true",
+                        help="serve /stats to remote clients too (default: localhost only)")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    db.configure_logging()
+    # وسيط البلاطات يستمع على 127.0.0.1 في جهاز الخادم، والمتصفحات لا تصل إليه
+    os.environ.setdefault("CITY_MOVER_TILE_PROXY", "0")
+    server = create_app(args.session_timeout, args.watch_ms, args.public_stats)
+    logger.info("🌐 Serving on http://%s:%d (pid %d, db workers: %d)",
+                args.host, args.port, os.getpid(), async_db.DB_WORKERS)
+    uvicorn.run(server, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
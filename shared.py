@@ -0,0 +1,136 @@
+"""ذواكر قراءة مشتركة بين كل جلسات العملية (مهمة خاصة في وضع الخادم متعدد الجلسات)
+
+مئات الجلسات تتصفح نفس المدن والمناطق؛ بدل أن تبني كل جلسة فهرس تجميع الخريطة لنفس
+المدينة وتقرأ نفس الصفحة الأولى من نفس المنطقة، تحفظ النتيجة هنا مرة واحدة:
+
+    index = shared.get_map_index(city_id, area_id)     # cluster.ClusterIndex
+    props, cursor = shared.get_first_page(area_id)
+
+كل قيمة مرتبطة برقم db.data_version() وقت بنائها، فأي تعديل على العقارات يجعلها قديمة
+وتبنى من جديد عند الطلب التالي. الطلبات المتزامنة لنفس المفتاح تنتظر بناءً واحداً بدل أن
+يبني كل منها نسخته. الدوال متزامنة (تستدعى عبر async_db.run من معالجات الواجهة) والقيم
+المعادة مشتركة، فلا يجوز تعديلها.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import cluster
+import db
+
+logger = logging.getLogger("city_mover.shared")
+
+MAP_INDEX_ENTRIES = int(os.environ.get("CITY_MOVER_MAP_INDEX_ENTRIES", 256))
+FIRST_PAGE_ENTRIES = int(os.environ.get("CITY_MOVER_FIRST_PAGE_ENTRIES", 1024))
+
+
+class _Build:
+    """بناء جار لمفتاح واحد ومن ينتظر نتيجته"""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class VersionedCache:
+    """ذاكرة LRU محدودة قيمها صالحة ما دام db.data_version() لم يتغير منذ بنائها"""
+
+    def __init__(self, name: str, max_entries: int):
+        self.name = name
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._building = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key, build):
+        """القيمة المخزنة للمفتاح، أو build() مرة واحدة مهما كان عدد الطالبين في نفس الوقت"""
+        version = db.data_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            pending = self._building.get((key, version))
+            if pending is None:
+                pending = self._building[(key, version)] = _Build()
+                self.misses += 1
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = build()
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._building[(key, version)]
+                # لا نخزن نتيجة قديمة إذا تغيرت البيانات أثناء البناء
+                if pending.error is None and version == db.data_version():
+                    self._entries[key] = (version, pending.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            pending.done.set()
+        return pending.value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+
+map_indexes = VersionedCache("map_index", MAP_INDEX_ENTRIES)
+first_pages = VersionedCache("first_page", FIRST_PAGE_ENTRIES)
+
+
+def get_map_index(city_id: int, area_id: int = None):
+    """فهرس تجميع علامات الخريطة لكل عقارات المدينة (أو المنطقة)"""
+    return map_indexes.get(
+        (city_id, area_id), lambda: cluster.ClusterIndex(db.get_property_points(city_id, area_id))
+    )
+
+
+def get_first_page(area_id: int):
+    """الصفحة الأولى من عقارات المنطقة (العقارات, مؤشر الصفحة التالية)"""
+    return first_pages.get(area_id, lambda: db.get_properties_page_by_area(area_id))
+
+
+def clear():
+    """تفريغ كل الذواكر المشتركة (مثلاً بعد تغيير قاعدة البيانات)"""
+    map_indexes.clear()
+    first_pages.clear()
+
+
+def stats():
+    """إحصائيات كل الذواكر المشتركة في العملية، مع ذاكرتي المدن والمناطق في db"""
+    return {
+        "map_index": map_indexes.stats(),
+        "first_page": first_pages.stats(),
+        "cities": db.city_cache_stats(),
+        "area_facets": db.area_facet_stats(),
+    }
@@ -0,0 +1,310 @@
+"""تشغيل عدة عمليات خادم ويب (server.py) خلف موزع حمل محلي يثبت كل متصفح على عامله
+
+    python supervisor.py [--workers 4] [--host 0.0.0.0] [--port 8550] [--session-timeout 300] [--public-stats]
+
+عملية Python واحدة لا تستخدم إلا نواة واحدة (GIL)، فيشغل المشرف --workers عملية
+server.py على المنافذ التالية لـ --port (على 127.0.0.1)، كلها على نفس ملف قاعدة البيانات
+في وضع WAL (قراء متزامنون وكاتب واحد في كل لحظة)، ويستمع هو على --port:
+
+- الموزع يمرر اتصالات TCP كما هي (HTTP وwebsocket) بعد قراءة رأس الطلب الأول فقط. جلسة
+  Flet تعيش على اتصال websocket واحد فتبقى على عامل واحد، والكعكة city_mover_worker تعيد
+  نفس المتصفح إلى نفس العامل عند إعادة الاتصال (حيث جلسته محفوظة).
+- متصفح بلا كعكة يذهب إلى العامل الأقل اتصالات.
+- GET /stats يجمع /stats كل العمال (الجلسات والذاكرة مجموعة، والتفاصيل في "workers")، لطلبات
+  الجهاز نفسه فقط إلا مع --public-stats. العمال لا يجيبون /stats إلا بالرمز العشوائي الذي
+  يمررهم له المشرف (server.STATS_TOKEN_ENV)، فأي طلب /stats يمر عبر الموزع إلى عامل (بصيغة
+  مسار أخرى أو كطلب ثانٍ على نفس الاتصال) يرفض.
+- عامل ينهار يعاد تشغيله على نفس المنفذ (جلساته تضيع ويفتح المتصفح جلسة جديدة).
+
+كل عامل يبطل ذواكره عند تعديلات العمال الآخرين عبر جدول data_changes (db.watch_changes).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import posixpath
+import re
+import secrets
+import signal
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+import db
+import server
+
+logger = logging.getLogger("city_mover.supervisor")
+
+HERE = Path(__file__).parent
+COOKIE = "city_mover_worker"
+PIPE_CHUNK = 64 * 1024
+# حقول /stats التي تجمع عبر العمال
+SUMMED_STATS = ("sessions", "sessions_started", "rss_bytes", "db_connections", "db_workers")
+
+
+class Worker:
+    """عملية server.py واحدة على منفذ داخلي"""
+
+    def __init__(self, number: int, port: int, args, stats_token: str):
+        self.number = number
+        self.port = port
+        self.args = args
+        self.stats_token = stats_token
+        self.process = None
+        self.connections = 0
+        self.restarts = 0
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, str(HERE / "server.py"), "--host", "127.0.0.1", "--port", str(self.port),
+             "--session-timeout", str(self.args.session_timeout), "--watch-ms", str(self.args.watch_ms)],
+            cwd=HERE,
+            env={**os.environ, server.STATS_TOKEN_ENV: self.stats_token},
+        )
+        logger.info("👷 Worker %d started on port %d (pid %d)", self.number, self.port, self.process.pid)
+
+    def stop(self):
+        if self.alive:
+            self.process.terminate()
+        if self.process is not None:
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def fetch_stats(self, timeout: float = 10.0):
+        request = urllib.request.Request(
+            f"{self.base_url}/stats", headers={server.STATS_TOKEN_HEADER: self.stats_token}
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+
+    def wait_ready(self, timeout: float = 60.0):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if not self.alive:
+                raise RuntimeError(f"worker {self.number} exited with code {self.process.returncode}")
+            try:
+                return self.fetch_stats()
+            except OSError:
+                time.sleep(0.2)
+        raise TimeoutError(f"worker {self.number} not ready after {timeout}s")
+
+
+def sticky_worker(head: bytes):
+    """رقم العامل من كعكة city_mover_worker في رأس الطلب، أو None"""
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        if name.strip().lower() != b"cookie":
+            continue
+        for cookie in value.decode("latin-1").split(";"):
+            key, _, number = cookie.strip().partition("=")
+            if key == COOKIE and number.isdigit():
+                return int(number)
+    return None
+
+
+def request_path(head: bytes):
+    """(الطريقة, المسار الموحد) من سطر الطلب: دون الاستعلام، والشرطات المكررة و./.. مطوية"""
+    method, _, rest = head.split(b"\r\n", 1)[0].partition(b" ")
+    target = rest.rpartition(b" ")[0] or rest
+    target = target.decode("latin-1")
+    # "//stats" مسار لا عنوان شبكة، فيقص الاستعلام يدوياً؛ الصيغة المطلقة http://host/... تحلل
+    if target.startswith("/"):
+        path = target.partition("?")[0].partition("#")[0]
+    else:
+        path = urllib.parse.urlsplit(target).path
+    path = urllib.parse.unquote(path)
+    path = posixpath.normpath(re.sub("/+", "/", path or "/"))
+    return method.decode("latin-1"), path
+
+
+def merge_stats(stats):
+    """/stats واحد لكل العمال: العدادات مجموعة والإصدارات أكبرها"""
+    merged = {key: sum(s.get(key) or 0 for s in stats) for key in SUMMED_STATS}
+    caches = {}
+    for s in stats:
+        for name, cache in s.get("caches", {}).items():
+            total = caches.setdefault(name, {})
+            for key, value in cache.items():
+                if key == "version":
+                    total[key] = max(total.get(key, 0), value)
+                else:
+                    total[key] = total.get(key, 0) + value
+    merged["caches"] = caches
+    return merged
+
+
+class Balancer:
+    """موزع TCP: يقرأ رأس الطلب الأول في كل اتصال ليختار العامل ثم يمرر البايتات كما هي"""
+
+    def __init__(self, workers, public_stats: bool = False):
+        self.workers = workers
+        self.public_stats = public_stats
+
+    def pick(self, head: bytes):
+        """(العامل, هل يحتاج المتصفح كعكة جديدة)"""
+        number = sticky_worker(head)
+        if number is not None and 0 <= number < len(self.workers) and self.workers[number].alive:
+            return self.workers[number], False
+        alive = [w for w in self.workers if w.alive] or self.workers
+        return min(alive, key=lambda w: w.connections), True
+
+    async def handle(self, client_reader, client_writer):
+        upstream_writer = None
+        try:
+            head = await client_reader.readuntil(b"\r\n\r\n")
+            if request_path(head) == ("GET", "/stats"):
+                # العمال يرون الموزع على 127.0.0.1، فيفحص عنوان المتصفح هنا
+                peer = client_writer.get_extra_info("peername")
+                if self.public_stats or (peer and peer[0] in server.LOCAL_HOSTS):
+                    await self._send_stats(client_writer)
+                else:
+                    client_writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    await client_writer.drain()
+                return
+            worker, set_cookie = self.pick(head)
+            worker.connections += 1
+            try:
+                upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", worker.port)
+                upstream_writer.write(head)
+                cookie = worker.number if set_cookie else None
+                await asyncio.gather(
+                    self._pipe(client_reader, upstream_writer),
+                    self._pipe(upstream_reader, client_writer, cookie),
+                )
+            finally:
+                worker.connections -= 1
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            for writer in (client_writer, upstream_writer):
+                if writer is not None:
+                    writer.close()
+
+    async def _pipe(self, reader, writer, cookie: int = None):
+        """نسخ البايتات حتى نهاية الاتصال؛ مع cookie تضاف الكعكة إلى رأس أول رد"""
+        try:
+            if cookie is not None:
+                head = await reader.readuntil(b"\r\n\r\n")
+                writer.write(head[:-2] + f"Set-Cookie: {COOKIE}={cookie}; Path=/; SameSite=Lax\r\n\r\n".encode())
+            while data := await reader.read(PIPE_CHUNK):
+                writer.write(data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def stats(self):
+        loop = asyncio.get_running_loop()
+        alive = [w for w in self.workers if w.alive]
+        results = await asyncio.gather(
+            *(loop.run_in_executor(None, w.fetch_stats) for w in alive), return_exceptions=True
+        )
+        stats, workers = [], []
+        for worker, result in zip(alive, results):
+            entry = {"worker": worker.number, "port": worker.port, "connections": worker.connections,
+                     "restarts": worker.restarts}
+            if isinstance(result, Exception):
+                entry["error"] = repr(result)
+            else:
+                stats.append(result)
+                entry.update(result)
+            workers.append(entry)
+        return {**merge_stats(stats), "workers": workers}
+
+    async def _send_stats(self, writer):
+        body = json.dumps(await self.stats(), ensure_ascii=False).encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+
+async def monitor(workers, stopping: asyncio.Event, interval: float = 1.0):
+    """إعادة تشغيل أي عامل انتهى دون طلب"""
+    loop = asyncio.get_running_loop()
+    while not stopping.is_set():
+        try:
+            await asyncio.wait_for(stopping.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+        for worker in workers:
+            if not stopping.is_set() and not worker.alive:
+                logger.warning("💥 Worker %d exited with code %s, restarting",
+                               worker.number, worker.process.returncode)
+                worker.restarts += 1
+                worker.start()
+                try:
+                    await loop.run_in_executor(None, worker.wait_ready)
+                except (RuntimeError, TimeoutError) as e:
+                    logger.error("❌ Worker %d restart failed: %s", worker.number, e)
+
+
+async def serve(args, workers):
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: KeyboardInterrupt يوقف الحلقة
+
+    balancer = Balancer(workers, args.public_stats)
+    listener = await asyncio.start_server(balancer.handle, args.host, args.port)
+    logger.info("⚖️  Balancing %d workers on http://%s:%d", len(workers), args.host, args.port)
+    async with listener:
+        await monitor(workers, stopping)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="City Mover multi-process web server")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=server.DEFAULT_PORT,
+                        help="public port; workers use the following ports")
+    parser.add_argument("--session-timeout", type=int, default=server.DEFAULT_SESSION_TIMEOUT)
+    parser.add_argument("--watch-ms", type=float, default=db.CHANGE_POLL_MS,
+                        help="how often workers poll for each other's writes")
+    parser.add_argument("--public-stats", action="store_true",
+                        help="serve /stats to remote clients too (default: localhost only)")
+    args = parser.parse_args()
+
+    db.configure_logging()
+    # الترحيلات ووضع WAL مرة واحدة قبل العمال، حتى لا يرحل عدة عمال نفس الملف معاً
+    db.bootstrap()
+    db.close_pool()
+
+    stats_token = secrets.token_urlsafe(24)
+    workers = [Worker(i, args.port + 1 + i, args, stats_token) for i in range(args.workers)]
+    try:
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.wait_ready()
+        asyncio.run(serve(args, workers))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.stop()
+        logger.info("🛑 Supervisor stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,512 @@
+"""وسيط محلي لمربعات الخريطة مع ذاكرة مؤقتة على القرص وملف MBTiles للعمل دون اتصال
+
+طبقات الخريطة في main.py تطلب المربعات من خادم HTTP محلي بدلاً من OpenStreetMap مباشرة:
+
+    map.TileLayer(url_template=tiles.url_template())
+
+كل مربع يبحث عنه أولاً في ملف MBTiles المحمل مسبقاً، ثم في الذاكرة المؤقتة (LRU على
+القرص بحجم أقصى)، وعند عدم وجوده يجلب من الخادم الأصلي ويحفظ. الطلبات المتزامنة لنفس
+المربع تنتظر جلباً واحداً.
+
+الإعدادات (متغيرات البيئة):
+    CITY_MOVER_TILE_PROXY=0        تعطيل الوسيط والطلب من الخادم الأصلي مباشرة
+    CITY_MOVER_TILE_CACHE_MB       الحجم الأقصى للذاكرة المؤقتة (الافتراضي 200)
+    CITY_MOVER_TILE_DIR            مجلد الذاكرة المؤقتة (الافتراضي tiles بجانب قاعدة البيانات)
+    CITY_MOVER_MBTILES             ملف MBTiles للعمل دون اتصال (الافتراضي tiles/offline.mbtiles)
+    CITY_MOVER_TILE_UPSTREAM       قالب رابط الخادم الأصلي
+    CITY_MOVER_TILE_PORT           منفذ الوسيط (الافتراضي 0 = أي منفذ متاح)
+    CITY_MOVER_TILE_CONTACT        رابط أو بريد للتواصل يضاف إلى User-Agent (تشترطه سياسة OSM)
+
+التحميل المسبق لمدينة أو أكثر من خادم مربعات يسمح بالتحميل الجماعي (سياسة استخدام
+tile.openstreetmap.org تمنعه، فيرفض الأمر خوادم openstreetmap.org):
+    python tiles.py prefetch --upstream https://tiles.example/{z}/{x}/{y}.png [--city دمشق ...]
+                             [--zooms 12 14] [--radius-km 8] [--out offline.mbtiles]
+    python tiles.py serve [--port 8765]
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import geo
+from areas import CITY_CENTERS
+
+logger = logging.getLogger("city_mover.tiles")
+
+UPSTREAM_URL = "https://tile.openstreetmap.org/{z}/{x}/{y}.png"
+# خوادم لا تسمح سياستها بالتحميل الجماعي (prefetch)
+NO_BULK_HOSTS = ("openstreetmap.org",)
+# سياسة استخدام خوادم OpenStreetMap تشترط تعريف التطبيق ووسيلة للتواصل
+TILE_CONTACT = os.environ.get("CITY_MOVER_TILE_CONTACT", "")
+USER_AGENT = f"CityMover/1.0 (tile cache; +{TILE_CONTACT})" if TILE_CONTACT else "CityMover/1.0 (tile cache)"
+DEFAULT_CACHE_MB = 200
+DEFAULT_RADIUS_KM = 8.0
+DEFAULT_ZOOMS = (12, 14)
+DEFAULT_PREFETCH_CITY = "دمشق"
+FETCH_TIMEOUT = 10
+# أخطاء الجلب من الخادم الأصلي: الشبكة وHTTP، والاتصال المقطوع أثناء القراءة (IncompleteRead)
+FETCH_ERRORS = (OSError, urllib.error.URLError, http.client.HTTPException)
+
+_TILE_PATH = re.compile(r"^/(\d+)/(\d+)/(\d+)\.png$")
+
+
+def default_tile_dir():
+    """مجلد المربعات بجانب قاعدة البيانات (أو CITY_MOVER_TILE_DIR)"""
+    custom = os.environ.get("CITY_MOVER_TILE_DIR")
+    if custom:
+        return custom
+    import db
+    return str(Path(db.resolve_db_path()).parent / "tiles")
+
+
+def allows_bulk(upstream: str):
+    """هل يسمح الخادم الأصلي بالتحميل المسبق الجماعي (ليس من خوادم NO_BULK_HOSTS)"""
+    host = urllib.parse.urlsplit(upstream.format(z=0, x=0, y=0)).hostname or ""
+    return not any(host == h or host.endswith("." + h) for h in NO_BULK_HOSTS)
+
+
+def fetch_tile(upstream: str, z: int, x: int, y: int, timeout: float = FETCH_TIMEOUT):
+    """جلب مربع واحد من الخادم الأصلي"""
+    request = urllib.request.Request(upstream.format(z=z, x=x, y=y), headers={"User-Agent": USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+class TileCache:
+    """ذاكرة مؤقتة LRU على القرص: ملف لكل مربع z/x/y.png وحجم كلي أقصى
+
+    ترتيب الاستخدام يحفظ في زمن تعديل الملفات، فيبقى بعد إعادة التشغيل.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+        self._load()
+
+    def _path(self, z: int, x: int, y: int):
+        return self.directory / str(z) / str(x) / f"{y}.png"
+
+    def _load(self):
+        """بناء الفهرس من الملفات الموجودة، الأقدم استخداماً أولاً"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        found = []
+        for path in self.directory.glob("*/*/*.png"):
+            try:
+                stat = path.stat()
+                key = (int(path.parent.parent.name), int(path.parent.name), int(path.stem))
+            except (OSError, ValueError):
+                continue
+            found.append((stat.st_mtime, key, stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.size += size
+        self._evict()
+        if found:
+            logger.info("🗺️  Tile cache: %d tiles, %.1f MB in %s", len(self._entries), self.size / 1e6, self.directory)
+
+    def get(self, z: int, x: int, y: int):
+        key = (z, x, y)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(z, x, y)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+            return data
+        except OSError:
+            # حذف الملف من خارج التطبيق
+            with self._lock:
+                size = self._entries.pop(key, None)
+                if size is not None:
+                    self.size -= size
+            return None
+
+    def put(self, z: int, x: int, y: int, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(z, x, y)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            old = self._entries.pop((z, x, y), None)
+            if old is not None:
+                self.size -= old
+            self._entries[(z, x, y)] = len(data)
+            self.size += len(data)
+            self._evict()
+
+    def _evict(self):
+        """حذف الأقدم استخداماً حتى يعود الحجم تحت الحد (يستدعى مع القفل)"""
+        while self.size > self.max_bytes and self._entries:
+            (z, x, y), size = self._entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+            try:
+                self._path(z, x, y).unlink()
+            except OSError:
+                pass
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class MBTiles:
+    """ملف MBTiles (قاعدة SQLite بمربعات PNG، الصفوف بترقيم TMS)"""
+
+    def __init__(self, path: str, readonly: bool = True):
+        self.path = path
+        if readonly:
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+                CREATE TABLE IF NOT EXISTS tiles (
+                    zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB,
+                    PRIMARY KEY (zoom_level, tile_column, tile_row)
+                ) WITHOUT ROWID;
+                """
+            )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _row(z: int, y: int):
+        return (1 << z) - 1 - y
+
+    def get(self, z: int, x: int, y: int):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, self._row(z, y)),
+            ).fetchone()
+        return row[0] if row else None
+
+    def has(self, z: int, x: int, y: int):
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                (z, x, self._row(z, y)),
+            ).fetchone() is not None
+
+    def put_many(self, tiles):
+        """حفظ دفعة [(z, x, y, data)] بمعاملة واحدة"""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)",
+                [(z, x, self._row(z, y), data) for z, x, y, data in tiles],
+            )
+
+    def set_metadata(self, **values):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)",
+                [(name, str(value)) for name, value in values.items()],
+            )
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM tiles").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+class TileProxy:
+    """خادم HTTP محلي للمربعات: MBTiles ثم الذاكرة المؤقتة ثم الخادم الأصلي"""
+
+    COUNTERS = ("requests", "offline", "hits", "misses", "coalesced", "upstream_errors")
+
+    def __init__(self, cache: TileCache, upstream: str = UPSTREAM_URL, offline: MBTiles = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.cache = cache
+        self.upstream = upstream
+        self.offline = offline
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def url_template(self):
+        return f"http://{self._server.server_address[0]}:{self.port}/{{z}}/{{x}}/{{y}}.png"
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get_tile(self, z: int, x: int, y: int):
+        """بيانات المربع ومصدره ("offline" أو "cache" أو "upstream")"""
+        self._count("requests")
+        if self.offline is not None:
+            data = self.offline.get(z, x, y)
+            if data is not None:
+                self._count("offline")
+                return data, "offline"
+        data = self.cache.get(z, x, y)
+        if data is not None:
+            self._count("hits")
+            return data, "cache"
+
+        key = (z, x, y)
+        with self._lock:
+            pending = self._inflight.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._inflight[key] = {"event": threading.Event(), "data": None}
+                self.counters["misses"] += 1
+            else:
+                self.counters["coalesced"] += 1
+        if not owner:
+            pending["event"].wait(FETCH_TIMEOUT * 2)
+            return pending["data"], "upstream"
+
+        try:
+            data = fetch_tile(self.upstream, z, x, y)
+            self.cache.put(z, x, y, data)
+            pending["data"] = data
+        except FETCH_ERRORS as e:
+            self._count("upstream_errors")
+            logger.warning("⚠️  Tile %d/%d/%d unavailable: %s", z, x, y, e)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            pending["event"].set()
+        return pending["data"], "upstream"
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        served = stats["offline"] + stats["hits"]
+        stats["hit_rate"] = round(served / stats["requests"], 4) if stats["requests"] else 0.0
+        stats["cached_tiles"] = len(self.cache)
+        stats["cache_bytes"] = self.cache.size
+        stats["evictions"] = self.cache.evictions
+        return stats
+
+    def _handler_class(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    return self._send(200, json.dumps(proxy.stats()).encode(), "application/json")
+                match = _TILE_PATH.match(self.path.split("?", 1)[0])
+                if not match:
+                    return self._send(404, b"", "text/plain")
+                z, x, y = (int(v) for v in match.groups())
+                if x >= 1 << z or y >= 1 << z:
+                    return self._send(404, b"", "text/plain")
+                data, source = proxy.get_tile(z, x, y)
+                if data is None:
+                    return self._send(502, b"", "text/plain")
+                self._send(200, data, "image/png", source)
+
+            def _send(self, status, body, content_type, source=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if source:
+                    self.send_header("Cache-Control", "max-age=86400")
+                    self.send_header("X-Tile-Source", source)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("🗺️  " + format, *args)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="tile-proxy", daemon=True)
+        self._thread.start()
+        logger.info("🗺️  Tile proxy on %s -> %s", self.url_template, self.upstream)
+        if not TILE_CONTACT and not allows_bulk(self.upstream):
+            logger.warning("⚠️  CITY_MOVER_TILE_CONTACT is not set; the OSM tile policy asks for contact info "
+                           "in the User-Agent")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self.offline is not None:
+            self.offline.close()
+
+
+def open_offline(path: str = None):
+    """ملف MBTiles المحمل مسبقاً إن وجد"""
+    path = path or os.environ.get("CITY_MOVER_MBTILES") or str(Path(default_tile_dir()) / "offline.mbtiles")
+    if not os.path.exists(path):
+        return None
+    logger.info("📦 Offline tiles: %s", path)
+    return MBTiles(path)
+
+
+def create_proxy(port: int = None):
+    """وسيط بإعدادات متغيرات البيئة (غير مشغل)"""
+    tile_dir = default_tile_dir()
+    max_bytes = int(float(os.environ.get("CITY_MOVER_TILE_CACHE_MB", DEFAULT_CACHE_MB)) * 1024 * 1024)
+    if port is None:
+        port = int(os.environ.get("CITY_MOVER_TILE_PORT", 0))
+    return TileProxy(
+        TileCache(os.path.join(tile_dir, "cache"), max_bytes),
+        upstream=os.environ.get("CITY_MOVER_TILE_UPSTREAM", UPSTREAM_URL),
+        offline=open_offline(),
+        port=port,
+    )
+
+
+_proxy = None
+_proxy_lock = threading.Lock()
+
+
+def get_proxy():
+    """الوسيط المشترك بين كل جلسات العملية (يشغل عند أول استخدام)"""
+    global _proxy
+    if _proxy is None:
+        with _proxy_lock:
+            if _proxy is None:
+                _proxy = create_proxy().start()
+    return _proxy
+
+
+def url_template():
+    """قالب رابط المربعات لـ TileLayer: الوسيط المحلي، أو الخادم الأصلي إذا عطل أو تعذر تشغيله"""
+    if os.environ.get("CITY_MOVER_TILE_PROXY", "1") == "0":
+        return os.environ.get("CITY_MOVER_TILE_UPSTREAM", UPSTREAM_URL)
+    try:
+        return get_proxy().url_template
+    except OSError as e:
+        logger.warning("⚠️  Tile proxy unavailable, using upstream directly: %s", e)
+        return os.environ.get("CITY_MOVER_TILE_UPSTREAM", UPSTREAM_URL)
+
+
+def city_tiles(cities, zooms=DEFAULT_ZOOMS, radius_km: float = DEFAULT_RADIUS_KM):
+    """كل المربعات (z, x, y) التي تغطي مستطيل كل مدينة بمستويات التكبير المحددة"""
+    seen = set()
+    for city in cities:
+        lat, lon = CITY_CENTERS[city]
+        bounds = geo.bbox_around(lat, lon, radius_km)
+        for z in range(zooms[0], zooms[1] + 1):
+            for x, y in geo.tiles_in_bounds(*bounds, z):
+                if (z, x, y) not in seen:
+                    seen.add((z, x, y))
+                    yield z, x, y
+
+
+def prefetch(out: str, cities, upstream: str, zooms=DEFAULT_ZOOMS, radius_km: float = DEFAULT_RADIUS_KM,
+             delay: float = 0.0, batch_size: int = 200, progress=None):
+    """تحميل مربعات المدن إلى ملف MBTiles؛ المربعات الموجودة مسبقاً تتخطى فيمكن الاستئناف"""
+    if not allows_bulk(upstream):
+        raise ValueError(f"bulk prefetch is not allowed from {upstream} (tile usage policy)")
+    mbtiles = MBTiles(out, readonly=False)
+    mbtiles.set_metadata(
+        name="City Mover " + "، ".join(cities), format="png", type="baselayer",
+        minzoom=zooms[0], maxzoom=zooms[1], attribution="© OpenStreetMap contributors",
+    )
+    fetched = skipped = failed = 0
+    batch = []
+    start = time.perf_counter()
+    try:
+        for z, x, y in city_tiles(cities, zooms, radius_km):
+            if mbtiles.has(z, x, y):
+                skipped += 1
+                continue
+            try:
+                batch.append((z, x, y, fetch_tile(upstream, z, x, y)))
+                fetched += 1
+            except FETCH_ERRORS as e:
+                failed += 1
+                logger.warning("⚠️  Tile %d/%d/%d failed: %s", z, x, y, e)
+            if len(batch) >= batch_size:
+                mbtiles.put_many(batch)
+                batch = []
+                if progress:
+                    progress(fetched, skipped, failed)
+            if delay:
+                time.sleep(delay)
+        mbtiles.put_many(batch)
+        total = mbtiles.count()
+    finally:
+        mbtiles.close()
+    seconds = time.perf_counter() - start
+    logger.info("📦 Prefetched %d tiles (%d already present, %d failed) in %.1fs -> %s (%d tiles)",
+                fetched, skipped, failed, seconds, out, total)
+    return {"fetched": fetched, "skipped": skipped, "failed": failed, "tiles": total, "seconds": seconds}
+
+
+def main():
+    import db
+
+    parser = argparse.ArgumentParser(description="City Mover map tile cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="run the tile proxy in the foreground")
+    serve.add_argument("--port", type=int, default=8765)
+
+    pre = sub.add_parser("prefetch", help="download city tiles into an MBTiles file")
+    pre.add_argument("--city", nargs="+", default=[DEFAULT_PREFETCH_CITY], choices=list(CITY_CENTERS))
+    pre.add_argument("--zooms", type=int, nargs=2, default=list(DEFAULT_ZOOMS), metavar=("MIN", "MAX"))
+    pre.add_argument("--radius-km", type=float, default=DEFAULT_RADIUS_KM)
+    pre.add_argument("--out", help="MBTiles path (default: the offline file the proxy reads)")
+    pre.add_argument("--upstream", default=os.environ.get("CITY_MOVER_TILE_UPSTREAM"),
+                     help="tile server that permits bulk downloads, e.g. https://tiles.example/{z}/{x}/{y}.png")
+    pre.add_argument("--delay", type=float, default=0.5, help="seconds between upstream requests")
+    pre.add_argument("--dry-run", action="store_true", help="only count the tiles")
+    args = parser.parse_args()
+
+    db.configure_logging()
+    if args.command == "serve":
+        proxy = create_proxy(args.port).start()
+        try:
+            while True:
+                time.sleep(60)
+                logger.info("📊 %s", proxy.stats())
+        except KeyboardInterrupt:
+            proxy.stop()
+        return
+
+    if args.dry_run:
+        count = sum(1 for _ in city_tiles(args.city, args.zooms, args.radius_km))
+        print(f"{count} tiles for {', '.join(args.city)} at zoom {args.zooms[0]}-{args.zooms[1]}")
+        return
+    if not args.upstream:
+        parser.error("prefetch needs --upstream (or CITY_MOVER_TILE_UPSTREAM): a tile server that permits bulk downloads")
+    if not allows_bulk(args.upstream):
+        parser.error(f"refusing to prefetch from {args.upstream}: the OpenStreetMap tile usage policy "
+                     "forbids bulk downloads; use a tile provider or your own tile server")
+    out = args.out or os.environ.get("CITY_MOVER_MBTILES") or str(Path(default_tile_dir()) / "offline.mbtiles")
+    Path(out).parent.mkdir(parents=True, exist_ok=True)
+    prefetch(out, args.city, args.upstream, args.zooms, args.radius_km, args.delay,
+             progress=lambda f, s, e: print(f"  {f} fetched, {s} present, {e} failed", flush=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""تشخيص تحديثات واجهة Flet: حجم وزمن كل update() والعناصر التي أعاد إرسالها
+
+يفعل عبر CITY_MOVER_UI_PROFILE=1؛ عندها يسجل كل تحديث سطراً مثل:
+
+    🔄 UI update TextField,TextField,MarkerLayer,Text: 6 commands, 0.9 KB in 1.8 ms
+
+حتى يظهر مثلاً أن الضغط على خريطة المالك لا يعيد إرسال النموذج كله. عند التعطيل لا
+يستورد main.py هذه الوحدة أصلاً، فلا يتغير أي شيء في مسار التحديث.
+
+تعتمد على واجهات Flet الداخلية (flet.core.protocol وPage.__prepare_update) المكتوبة لإصدار
+flet المثبت في requirements.txt.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from flet.core.protocol import CommandEncoder
+
+logger = logging.getLogger("city_mover.ui")
+
+
+def enabled():
+    return os.environ.get("CITY_MOVER_UI_PROFILE", "0") == "1"
+
+
+def payload_size(commands):
+    """حجم الأوامر كما ترسل للعميل (JSON)"""
+    return len(json.dumps(commands, cls=CommandEncoder, separators=(",", ":")).encode())
+
+
+class UpdateStats:
+    """إحصائيات تحديثات جلسة واحدة"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.updates = []
+
+    def record(self, targets, commands: int, size: int, elapsed_ms: float):
+        with self._lock:
+            self.updates.append({"targets": targets, "commands": commands, "bytes": size, "ms": elapsed_ms})
+
+    def reset(self):
+        with self._lock:
+            self.updates.clear()
+
+    def summary(self):
+        with self._lock:
+            updates = list(self.updates)
+        return {
+            "updates": len(updates),
+            "commands": sum(u["commands"] for u in updates),
+            "bytes": sum(u["bytes"] for u in updates),
+            "ms": round(sum(u["ms"] for u in updates), 3),
+            "max_bytes": max((u["bytes"] for u in updates), default=0),
+        }
+
+
+def instrument(page):
+    """قياس كل page.update() / control.update() في الجلسة؛ يعيد UpdateStats الخاص بها"""
+    stats = UpdateStats()
+    pending = threading.local()
+    prepare = page._Page__prepare_update
+    update = page.update
+
+    def measured_prepare(*controls):
+        commands, added, removed = prepare(*controls)
+        pending.commands = len(commands)
+        pending.size = payload_size(commands)
+        return commands, added, removed
+
+    def measured_update(*controls):
+        pending.commands = pending.size = 0
+        start = time.perf_counter()
+        update(*controls)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        targets = ",".join(type(c).__name__ for c in controls) or "Page"
+        stats.record(targets, pending.commands, pending.size, elapsed_ms)
+        logger.info("🔄 UI update %s: %d commands, %.1f KB in %.1f ms",
+                    targets, pending.commands, pending.size / 1024, elapsed_ms)
+
+    page._Page__prepare_update = measured_prepare
+    page.update = measured_update
+    return stats